@@ -3,6 +3,8 @@ from .api import (
     ArcsecondAPIEndpoint,
     ArcsecondConfig,
     ArcsecondTargetListsResource,
+    AsyncArcsecondAPI,
+    AsyncArcsecondAPIEndpoint,
 )
 from .cloud.uploader import (
     AllSkyCameraImageFileUploader,
@@ -23,6 +25,8 @@ __all__ = [
     "ArcsecondAPIEndpoint",
     "ArcsecondTargetListsResource",
     "ArcsecondTargetPayloadPlan",
+    "AsyncArcsecondAPI",
+    "AsyncArcsecondAPIEndpoint",
     "DatasetUploadContext",
     "DatasetFileUploader",
     "AllSkyCameraImageFileUploader",
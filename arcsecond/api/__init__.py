@@ -1,11 +1,21 @@
+from .async_endpoint import AsyncArcsecondAPIEndpoint
+from .async_main import AsyncArcsecondAPI
 from .config import ArcsecondConfig
 from .endpoint import ArcsecondAPIEndpoint
 from .main import ArcsecondAPI
 from .resources import ArcsecondTargetListsResource
+from .retry import RetryPolicy, set_default_retry_policy
+from .transport import close_http_clients, configure_http_clients
 
 __all__ = [
     "ArcsecondAPI",
     "ArcsecondConfig",
     "ArcsecondAPIEndpoint",
     "ArcsecondTargetListsResource",
+    "AsyncArcsecondAPI",
+    "AsyncArcsecondAPIEndpoint",
+    "RetryPolicy",
+    "close_http_clients",
+    "configure_http_clients",
+    "set_default_retry_policy",
 ]
@@ -0,0 +1,220 @@
+import asyncio
+
+import httpx
+
+from arcsecond.api.endpoint import BaseArcsecondAPIEndpoint
+from arcsecond.api.multipart import MultipartBody
+from arcsecond.api.ratelimit import get_request_size
+from arcsecond.api.retry import get_circuit_breaker
+from arcsecond.api.transport import get_async_http_client
+from arcsecond.errors import ArcsecondError
+
+
+class AsyncArcsecondAPIEndpoint(BaseArcsecondAPIEndpoint):
+    """
+    Asyncio twin of `ArcsecondAPIEndpoint`.
+
+    Same CRUD contract and same `(result, error)` tuples, but every method is a
+    coroutine sending its request through the pooled `httpx.AsyncClient` of the
+    running event loop.
+    """
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """The pooled async client shared by all endpoints of the same API server."""
+        return get_async_http_client(self._get_base_url())
+
+    async def list(self, **filters):
+        return await self._perform_request(self._list_url(**filters), "get")
+
+    async def list_all(self, parallel=1, **filters):
+        """Return the results of all pages of a list query, in order.
+
+        When the first page tells the total `count`, at most `parallel` of the
+        remaining pages are requested at the same time. Otherwise, `next` links
+        are followed sequentially.
+        """
+        response, error = await self.list(**filters)
+        if error:
+            return None, error
+
+        results = self._extract_results(response)
+        next_url = self._extract_next_url(response)
+        page_urls = None
+        if next_url and parallel > 1:
+            page_urls = self._remaining_page_urls(response, next_url)
+
+        if page_urls is not None:
+            semaphore = asyncio.Semaphore(parallel)
+
+            async def _fetch(url):
+                async with semaphore:
+                    return await self._perform_request(url, "get")
+
+            responses = await asyncio.gather(*(_fetch(url) for url in page_urls))
+            for page_response, error in responses:
+                if error:
+                    return None, error
+                results.extend(self._extract_results(page_response))
+            return results, None
+
+        while next_url:
+            response, error = await self._perform_request(next_url, "get")
+            if error:
+                return None, error
+            results.extend(self._extract_results(response))
+            next_url = self._extract_next_url(response)
+        return results, None
+
+    async def iter_all(self, **filters):
+        """Yield every result of a list query, following pagination lazily.
+
+        The next page is fetched in a background task while the current one is
+        being consumed. Errors are raised as `ArcsecondError`.
+        """
+        task = asyncio.ensure_future(
+            self._perform_request(self._list_url(**filters), "get")
+        )
+        try:
+            while task is not None:
+                response, error = await task
+                if error:
+                    raise error
+                next_url = self._extract_next_url(response)
+                task = None
+                if next_url:
+                    task = asyncio.ensure_future(self._perform_request(next_url, "get"))
+                for result in self._extract_results(response):
+                    yield result
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def read(self, id_name_uuid, headers=None):
+        return await self._perform_request(
+            self._detail_url(id_name_uuid), "get", headers=headers
+        )
+
+    async def create(self, json=None, files=None, headers=None, **fields):
+        return await self._perform_request(
+            self._list_url(),
+            "post",
+            json=self._build_payload(json=json, **fields),
+            files=files,
+            headers=headers,
+        )
+
+    async def update(self, id_name_uuid, json=None, files=None, headers=None, **fields):
+        return await self._perform_request(
+            self._detail_url(id_name_uuid),
+            "patch",
+            json=self._build_payload(json=json, **fields),
+            files=files,
+            headers=headers,
+        )
+
+    async def delete(self, id_name_uuid):
+        return await self._perform_request(self._detail_url(id_name_uuid), "delete")
+
+    async def find_one(self, **filters):
+        response, error = await self.list(**filters)
+        if error:
+            return None, error
+        return self._select_one(response, filters)
+
+    async def upsert(self, match_field="name", json=None, **fields):
+        payload = self._build_payload(json=json, **fields)
+        if payload is None:
+            return None, ArcsecondError("Cannot upsert an empty payload.")
+
+        match_value = payload.get(match_field)
+        if match_value in (None, ""):
+            return await self.create(json=payload)
+
+        existing, error = await self.find_one(**{match_field: match_value})
+        if error:
+            return None, error
+        if existing is None:
+            return await self.create(json=payload)
+
+        identifier = self._extract_identifier(existing)
+        if identifier is None:
+            return None, ArcsecondError(
+                f"Could not find an identifier for '{match_value}'."
+            )
+
+        return await self.update(identifier, json=payload)
+
+    async def _perform_request(
+        self, url, method_name, json=None, files=None, headers=None
+    ):
+        cache = self.cache
+        if cache is not None and method_name.lower() == "get":
+            return await self._perform_cached_get(cache, url, headers)
+
+        response, error = await self._send(url, method_name, json, files, headers)
+        if cache is not None:
+            # Any write makes the cached reads of this resource path stale.
+            await asyncio.to_thread(cache.invalidate, self._list_url())
+        if error:
+            return None, error
+        return self._parse_response(response)
+
+    async def _perform_cached_get(self, cache, url, headers=None):
+        key = self._cache_key(url)
+        body = cache.get_fresh(key)
+        if body is not None:
+            return body, None
+        return await cache.acoalesce(
+            key, lambda: self._revalidate(cache, key, url, headers)
+        )
+
+    async def _revalidate(self, cache, key, url, headers=None):
+        # The on-disk tier is read and written in a thread, off the event loop.
+        stored = await asyncio.to_thread(cache.get_stored, self._list_url(), key)
+        headers = self._conditional_headers(stored, headers)
+        response, error = await self._send(url, "get", headers=headers)
+        if error:
+            return None, error
+        return await asyncio.to_thread(
+            self._store_revalidated, cache, key, stored, response
+        )
+
+    async def _send(self, url, method_name, json=None, files=None, headers=None):
+        kwargs = self._build_request_kwargs(url, method_name, json, files, headers)
+        if isinstance(kwargs.get("content"), MultipartBody):
+            kwargs["content"] = kwargs["content"].async_stream()
+        breaker = get_circuit_breaker(url)
+        limiter = self.rate_limiter
+
+        attempt = 0
+        while True:
+            pause = breaker.acquire()
+            if pause:
+                await asyncio.sleep(pause)
+                continue
+
+            if limiter is not None:
+                delay = limiter.reserve(nbytes=get_request_size(files))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            attempt += 1
+            response, exception = None, None
+            try:
+                response = await self.http_client.request(
+                    method_name.upper(), url, **kwargs
+                )
+            except httpx.RequestError as exc:
+                exception = exc
+
+            delay = self._retry_delay(method_name, attempt, response, exception)
+            if delay is None:
+                break
+            self._rewind_files(files)
+            await asyncio.sleep(delay)
+
+        # Only final outcomes count, so that one flaky request cannot open the circuit.
+        breaker.record(response, exception)
+        if exception is not None:
+            return None, ArcsecondError(str(exception), 400)
+        return response, None
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import click
+
+from .async_endpoint import AsyncArcsecondAPIEndpoint
+from .config import ArcsecondConfig
+from .constants import API_AUTH_PATH_VERIFY
+from .transport import close_async_http_clients, get_async_http_client
+
+__all__ = [
+    "AsyncArcsecondAPI",
+]
+
+
+class AsyncArcsecondAPI(object):
+    """Asyncio twin of `ArcsecondAPI`, exposing `AsyncArcsecondAPIEndpoint`s.
+
+    The target list helpers of `ArcsecondTargetListsResource` are synchronous
+    only: `targetlists` here offers the generic CRUD contract.
+
+    Use it as an async context manager to close the pooled connections of the
+    event loop when done:
+
+        async with AsyncArcsecondAPI(config) as api:
+            dataset, error = await api.datasets.read(uuid)
+    """
+
+    def __init__(self, config: ArcsecondConfig, subdomain: str = "", cache=None):
+
+        self.config = config
+        self.subdomain = subdomain
+        self.cache = cache
+
+        self.profiles = AsyncArcsecondAPIEndpoint(
+            self.config, "profiles", self.subdomain, self.cache
+        )
+
+        self.organisations = AsyncArcsecondAPIEndpoint(
+            self.config, "organisations", cache=self.cache
+        )  # never subdomain here
+        self.members = AsyncArcsecondAPIEndpoint(
+            self.config, "members", self.subdomain, self.cache
+        )
+
+        self.observingsites = AsyncArcsecondAPIEndpoint(
+            self.config, "observingsites", self.subdomain, self.cache
+        )
+        self.telescopes = AsyncArcsecondAPIEndpoint(
+            self.config, "telescopes", self.subdomain, self.cache
+        )
+        self.nightlogs = AsyncArcsecondAPIEndpoint(
+            self.config, "nightlogs", self.subdomain, self.cache
+        )
+        self.observations = AsyncArcsecondAPIEndpoint(
+            self.config, "observations", self.subdomain, self.cache
+        )
+        self.calibrations = AsyncArcsecondAPIEndpoint(
+            self.config, "calibrations", self.subdomain, self.cache
+        )
+        self.targets = AsyncArcsecondAPIEndpoint(
+            self.config, "targets", self.subdomain, self.cache
+        )
+        self.targetlists = AsyncArcsecondAPIEndpoint(
+            self.config, "targetlists", self.subdomain, self.cache
+        )
+
+        self.datapackages = AsyncArcsecondAPIEndpoint(
+            self.config, "datapackages", self.subdomain, self.cache
+        )
+        self.datasets = AsyncArcsecondAPIEndpoint(
+            self.config, "datasets", self.subdomain, self.cache
+        )
+        self.datafiles = AsyncArcsecondAPIEndpoint(
+            self.config, "datafiles", self.subdomain, self.cache
+        )
+
+        self.allskycameras = AsyncArcsecondAPIEndpoint(
+            self.config, "allskycameras", self.subdomain, self.cache
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        await close_async_http_clients()
+
+    @property
+    def http_client(self):
+        """The pooled async HTTP client shared by every endpoint of this API server."""
+        return get_async_http_client(self.profiles._get_base_url())
+
+    async def login(self, username, access_key=None, upload_key=None):
+        assert access_key or upload_key
+        assert not (access_key and upload_key)
+
+        endpoint = AsyncArcsecondAPIEndpoint(self.config, API_AUTH_PATH_VERIFY)
+        _, error = await endpoint.create(
+            json={"username": username, "key": access_key or upload_key}
+        )
+        if error:
+            click.echo(click.style(error, fg="red"))
+            return None, error
+
+        key_name = "access_key" if access_key else "upload_key"
+        key_value = access_key if access_key else upload_key
+        self.config.save(**{key_name: key_value, "username": username})
+
+        if self.config.verbose:
+            click.echo("Login successful (Access Key has been saved).")
+
+        return True, None
+
+    async def fetch_full_profile(self):
+        return await self.profiles.read(self.config.username)
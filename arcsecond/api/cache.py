@@ -0,0 +1,181 @@
+"""
+Two-tier cache for GET responses of API endpoints.
+
+The first tier is a bounded in-process LRU whose entries expire after a TTL.
+The second tier is an on-disk store of responses carrying an ``ETag`` or a
+``Last-Modified`` header: they are revalidated with a conditional request
+(``If-None-Match`` / ``If-Modified-Since``), so the body is only downloaded
+again when the server says it has changed.
+
+Entries are grouped by resource path (the list URL of an endpoint). Any write
+to a resource invalidates its whole group, in memory and on disk.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Optional
+
+from .config import ArcsecondConfig
+
+DEFAULT_CACHE_TTL = 300  # seconds
+DEFAULT_CACHE_MAX_ENTRIES = 512
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(object):
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+    ):
+        self._directory = Path(directory) if directory else None
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (group, expires_at, body)
+        self._inflight = {}  # key -> Future
+        self._async_inflight = {}  # (event loop, key) -> Task
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(url: str, auth_header: str = "") -> str:
+        # Responses depend on who is asking: never share them between keys.
+        return _digest(auth_header + " " + url)
+
+    def get_fresh(self, key: str):
+        """Return a copy of the in-memory body if it has not expired, None otherwise."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            _, expires_at, body = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(body)
+
+    def get_stored(self, group: str, key: str) -> Optional[dict]:
+        """Return the on-disk entry (body and validators), if any."""
+        path = self._entry_path(group, key)
+        if path is None or not path.exists():
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, group: str, key: str, body, etag=None, last_modified=None):
+        body = copy.deepcopy(body)
+        with self._lock:
+            self._entries[key] = (group, time.monotonic() + self._ttl, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+        path = self._entry_path(group, key)
+        if path is None or not (etag or last_modified):
+            return
+        entry = {"etag": etag, "last_modified": last_modified, "body": body}
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            tmp_path.replace(path)
+        except OSError:
+            pass
+
+    def invalidate(self, group: str):
+        """Forget every entry of a resource path."""
+        with self._lock:
+            for key in [k for k, v in self._entries.items() if v[0] == group]:
+                del self._entries[key]
+        if self._directory is not None:
+            shutil.rmtree(self._directory / _digest(group), ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+    def coalesce(self, key: str, fetch):
+        """Run `fetch()` once for concurrent identical requests and share its result."""
+        with self._lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_owner:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def acoalesce(self, key: str, fetch):
+        """Asyncio twin of `coalesce`: await `fetch()` once for identical requests of a loop.
+
+        The fetch runs in its own task, so that cancelling one of the callers
+        does not cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        inflight_key = (loop, key)
+
+        def _forget(_):
+            with self._lock:
+                self._async_inflight.pop(inflight_key, None)
+
+        with self._lock:
+            task = self._async_inflight.get(inflight_key)
+            is_owner = task is None
+            if is_owner:
+                task = loop.create_task(fetch())
+                self._async_inflight[inflight_key] = task
+                task.add_done_callback(_forget)
+
+        result = await asyncio.shield(task)
+        return result if is_owner else copy.deepcopy(result)
+
+    def _entry_path(self, group: str, key: str) -> Optional[Path]:
+        if self._directory is None:
+            return None
+        return self._directory / _digest(group) / f"{key}.json"
+
+
+_caches: dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(api_server: str) -> ResponseCache:
+    """Return the shared cache of an API server, stored in the config folder."""
+    with _caches_lock:
+        cache = _caches.get(api_server)
+        if cache is None:
+            directory = ArcsecondConfig.dir_path() / "cache" / _digest(api_server)[:16]
+            cache = ResponseCache(directory)
+            _caches[api_server] = cache
+        return cache
@@ -121,6 +121,14 @@ class ArcsecondConfig(object):
     def upload_key(self) -> str:
         return self.__read_key("upload_key")
 
+    @property
+    def rate_limit_requests(self) -> str:
+        return self.__read_key("rate_limit_requests")
+
+    @property
+    def rate_limit_bytes(self) -> str:
+        return self.__read_key("rate_limit_bytes")
+
     def read_key(self, key_name: str) -> str:
         return self.__section[key_name] if key_name in self.__section else None
 
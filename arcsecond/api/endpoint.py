@@ -1,22 +1,62 @@
-from urllib.parse import urlencode
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
 
 import click
 import httpx
 
+from arcsecond.api.cache import ResponseCache, get_response_cache
 from arcsecond.api.config import ArcsecondConfig
 from arcsecond.api.constants import API_AUTH_PATH_VERIFY, API_AUTH_PATH_VERIFY_PORTAL
+from arcsecond.api.multipart import MultipartBody, has_streamable_files
+from arcsecond.api.ratelimit import RateLimiter, get_rate_limiter, get_request_size
+from arcsecond.api.retry import (
+    RetryPolicy,
+    get_circuit_breaker,
+    get_default_retry_policy,
+)
+from arcsecond.api.transport import DEFAULT_TIMEOUT, get_http_client
 from arcsecond.errors import ArcsecondError
 
 SAFE_METHODS = ["GET", "OPTIONS"]
 WRITABLE_MEMBERSHIPS = ["superadmin", "admin", "member"]
 
+DEFAULT_BULK_CONCURRENCY = 4
 
-class ArcsecondAPIEndpoint(object):
+
+def _map_in_order(func, items, concurrency):
+    """Yield `func(item)` for every item, in input order, with `concurrency` calls in flight.
+
+    Items are consumed lazily: only a small window of them is submitted ahead of
+    the results being yielded, so iterables of any size can be processed.
     """
-    Generic REST endpoint wrapper for Arcsecond resources.
+    executor = ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="arcsecond-bulk"
+    )
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * concurrency:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+class BaseArcsecondAPIEndpoint(object):
+    """
+    Transport-agnostic part of an Arcsecond REST endpoint.
 
-    It owns transport-level CRUD plus resource-agnostic conveniences such as
-    payload merging, `find_one()`, and `upsert()`.
+    It builds URLs, payloads, authentication headers and `(result, error)`
+    tuples. Subclasses send the requests, either synchronously
+    (`ArcsecondAPIEndpoint`) or with asyncio (`AsyncArcsecondAPIEndpoint`).
     """
 
     def __init__(
@@ -24,15 +64,56 @@ class ArcsecondAPIEndpoint(object):
         config: ArcsecondConfig,
         path: str,
         subdomain: str = "",
+        cache=None,
+        retry_policy: Optional[RetryPolicy] = None,
     ):
         self.__config = config
         self.__path = path
         self.__subdomain = subdomain
+        # Either a ResponseCache, or True to use the shared cache of the API server.
+        self.__cache = cache
+        self.__retry_policy = retry_policy
 
     @property
     def path(self):
         return self.__path
 
+    @property
+    def config(self):
+        return self.__config
+
+    @property
+    def subdomain(self):
+        return self.__subdomain
+
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        if self.__cache is True:
+            self.__cache = get_response_cache(self._get_base_url())
+        return self.__cache or None
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self.__retry_policy or get_default_retry_policy()
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return get_rate_limiter(self.__config)
+
+    def _cache_key(self, url):
+        auth_header = self._check_and_set_auth_key({}, url)
+        return ResponseCache.make_key(
+            url, auth_header.get("X-Arcsecond-API-Authorization", "")
+        )
+
+    def _conditional_headers(self, stored, headers=None):
+        headers = dict(headers or {})
+        if stored and stored.get("etag"):
+            headers["If-None-Match"] = stored["etag"]
+        if stored and stored.get("last_modified"):
+            headers["If-Modified-Since"] = stored["last_modified"]
+        return headers
+
     def _get_base_url(self):
         if not self.__config.api_server:
             raise ArcsecondError(
@@ -83,6 +164,43 @@ class ArcsecondAPIEndpoint(object):
             return response
         return []
 
+    def _extract_next_url(self, response):
+        if isinstance(response, dict):
+            return response.get("next") or None
+        return None
+
+    def _remaining_page_urls(self, response, next_url):
+        """URLs of all pages after the first one, if they can be computed up front.
+
+        Works for DRF-style responses with a `count`, whose `next` link uses either
+        page-number (`page=`) or limit/offset (`offset=`) pagination. Returns None
+        otherwise, in which case `next` links must be followed one by one.
+        """
+        count = response.get("count") if isinstance(response, dict) else None
+        page_size = len(self._extract_results(response))
+        if not isinstance(count, int) or page_size == 0:
+            return None
+
+        parts = urlsplit(next_url)
+        query = parse_qs(parts.query, keep_blank_values=True)
+
+        def _url_with(**params):
+            page_query = dict(query, **{k: [str(v)] for k, v in params.items()})
+            return urlunsplit(parts._replace(query=urlencode(page_query, doseq=True)))
+
+        try:
+            if "page" in query:
+                page_count = math.ceil(count / page_size)
+                first_page = int(query["page"][0])
+                return [_url_with(page=p) for p in range(first_page, page_count + 1)]
+            if "offset" in query:
+                limit = int(query.get("limit", [page_size])[0])
+                first_offset = int(query["offset"][0])
+                return [_url_with(offset=o) for o in range(first_offset, count, limit)]
+        except ValueError:
+            pass
+        return None
+
     def _extract_identifier(self, resource, identifier_fields=("uuid", "id", "pk")):
         for key in identifier_fields:
             value = resource.get(key)
@@ -90,9 +208,200 @@ class ArcsecondAPIEndpoint(object):
                 return value
         return None
 
+    def _select_one(self, response, filters):
+        results = self._extract_results(response)
+        if len(results) == 0:
+            return None, None
+        if len(results) > 1:
+            return (
+                None,
+                ArcsecondError(
+                    f"Expected one '{self.path}' match for filters {filters}, got {len(results)}."
+                ),
+            )
+        return results[0], None
+
+    def _store_revalidated(self, cache, key, stored, response):
+        if response.status_code == 304 and stored is not None:
+            body = stored.get("body")
+        else:
+            body, error = self._parse_response(response)
+            if error:
+                return None, error
+        cache.store(
+            self._list_url(),
+            key,
+            body,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return body, None
+
+    def _build_request_kwargs(
+        self, url, method_name, json=None, files=None, headers=None
+    ):
+        if self.__config.verbose:
+            click.echo(f"Sending {method_name} request to {url}")
+
+        headers = self._check_and_set_auth_key(headers or {}, url)
+
+        kwargs = {"headers": headers, "timeout": DEFAULT_TIMEOUT}
+        if files and json and has_streamable_files(files):
+            # Streamed by large blocks, with a known length.
+            body = MultipartBody(json, files)
+            headers.update(body.headers)
+            kwargs.update(content=body)
+        elif files and json:
+            # Do NOT set json=json, keep data=json, to avoid overriding Content-Type with `application/json`.
+            kwargs.update(files=files, data=json)
+        elif json and not files:
+            kwargs.update(json=json)
+        elif files and not json:
+            raise ArcsecondError("Files but no json?")
+        return kwargs
+
+    def _retry_delay(self, method_name, attempt, response=None, exc=None):
+        """Return the delay before the next attempt of a request, or None to give up."""
+        if not self.retry_policy.should_retry(method_name, attempt, response, exc):
+            return None
+        return self.retry_policy.get_delay(attempt, response)
+
+    def _rewind_files(self, files):
+        # A retried upload must send its files again from their beginning.
+        for value in (files or {}).values():
+            file = value[1] if isinstance(value, tuple) else value
+            if hasattr(file, "seek"):
+                file.seek(0)
+
+    def _parse_response(self, response):
+        if isinstance(response, dict):
+            # Responses of standard JSON payload requests are dict
+            return response, None
+        elif response is not None:
+            if 200 <= response.status_code < 300:
+                return response.json() if response.text else {}, None
+            else:
+                return None, ArcsecondError(response.text, response.status_code)
+        else:
+            return None, ArcsecondError("Response is None", -1)
+
+    def _check_and_set_auth_key(self, headers, url):
+        # No token header for login and register
+        if (
+            API_AUTH_PATH_VERIFY in url
+            or API_AUTH_PATH_VERIFY_PORTAL in url
+            or "Authorization" in headers.keys()
+        ):
+            return headers
+
+        if self.__config.verbose:
+            click.echo("Checking local API|Upload key... ", nl=False)
+
+        # Choose the strongest key first
+        auth_key = self.__config.access_key or self.__config.upload_key
+
+        if not auth_key:
+            raise ArcsecondError(
+                "Missing auth keys (API or Upload). You must login first: $ arcsecond login"
+            )
+
+        headers["X-Arcsecond-API-Authorization"] = "Key " + auth_key
+
+        if self.__config.verbose:
+            key_str = auth_key[:3] + 9 * "*"
+            click.echo(f"'X-Arcsecond-API-Authorization' = 'Key {key_str}'")
+
+        return headers
+
+
+class ArcsecondAPIEndpoint(BaseArcsecondAPIEndpoint):
+    """
+    Generic REST endpoint wrapper for Arcsecond resources.
+
+    It owns transport-level CRUD plus resource-agnostic conveniences such as
+    payload merging, `find_one()`, `upsert()` and the bulk `*_many()` helpers.
+    """
+
+    # Bulk actions the server can perform in a single request, on `<path>/batch/`.
+    # Until the server offers them, `*_many()` helpers send one request per item.
+    native_batch_actions = frozenset()
+    native_batch_path = "batch"
+    native_batch_size = 100
+
+    @property
+    def http_client(self) -> httpx.Client:
+        """The pooled client shared by all endpoints of the same API server."""
+        return get_http_client(self._get_base_url())
+
     def list(self, **filters):
         return self._perform_request(self._list_url(**filters), "get")
 
+    def list_all(self, parallel=1, **filters):
+        """Return the results of all pages of a list query, in order.
+
+        When the first page tells the total `count`, the remaining pages are
+        fetched concurrently by `parallel` workers over the pooled client.
+        Otherwise, `next` links are followed sequentially.
+        """
+        response, error = self.list(**filters)
+        if error:
+            return None, error
+
+        results = self._extract_results(response)
+        next_url = self._extract_next_url(response)
+        page_urls = None
+        if next_url and parallel > 1:
+            page_urls = self._remaining_page_urls(response, next_url)
+
+        if page_urls is not None:
+            with ThreadPoolExecutor(
+                max_workers=parallel, thread_name_prefix="arcsecond-pages"
+            ) as executor:
+                responses = executor.map(
+                    lambda url: self._perform_request(url, "get"), page_urls
+                )
+                for page_response, error in responses:
+                    if error:
+                        return None, error
+                    results.extend(self._extract_results(page_response))
+            return results, None
+
+        while next_url:
+            response, error = self._perform_request(next_url, "get")
+            if error:
+                return None, error
+            results.extend(self._extract_results(response))
+            next_url = self._extract_next_url(response)
+        return results, None
+
+    def iter_all(self, **filters):
+        """Yield every result of a list query, following pagination lazily.
+
+        The next page is fetched in the background while the current one is
+        being consumed. Breaking out of the loop stops the pagination. Errors
+        are raised as `ArcsecondError`.
+        """
+        executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="arcsecond-pages"
+        )
+        future = executor.submit(
+            self._perform_request, self._list_url(**filters), "get"
+        )
+        try:
+            while future is not None:
+                response, error = future.result()
+                if error:
+                    raise error
+                next_url = self._extract_next_url(response)
+                future = None
+                if next_url:
+                    future = executor.submit(self._perform_request, next_url, "get")
+                yield from self._extract_results(response)
+        finally:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
     def read(self, id_name_uuid, headers=None):
         return self._perform_request(
             self._detail_url(id_name_uuid), "get", headers=headers
@@ -119,22 +428,41 @@ class ArcsecondAPIEndpoint(object):
     def delete(self, id_name_uuid):
         return self._perform_request(self._detail_url(id_name_uuid), "delete")
 
+    def create_many(self, payloads, concurrency=DEFAULT_BULK_CONCURRENCY):
+        """Create one resource per payload.
+
+        Returns a generator of `(result, error)` tuples, in the order of `payloads`.
+        """
+        return self._bulk(
+            "create", payloads, lambda payload: self.create(json=payload), concurrency
+        )
+
+    def read_many(self, ids_names_uuids, concurrency=DEFAULT_BULK_CONCURRENCY):
+        """Read resources. Returns a generator of `(result, error)` tuples, in input order."""
+        return self._bulk("read", ids_names_uuids, self.read, concurrency)
+
+    def update_many(self, items, concurrency=DEFAULT_BULK_CONCURRENCY):
+        """Update resources, given as `(id_name_uuid, payload)` pairs or as payloads
+        including their `uuid`/`id`.
+
+        Returns a generator of `(result, error)` tuples, in input order.
+        """
+        return self._bulk(
+            "update",
+            map(self._split_update_item, items),
+            self._update_item,
+            concurrency,
+        )
+
+    def delete_many(self, ids_names_uuids, concurrency=DEFAULT_BULK_CONCURRENCY):
+        """Delete resources. Returns a generator of `(result, error)` tuples, in input order."""
+        return self._bulk("delete", ids_names_uuids, self.delete, concurrency)
+
     def find_one(self, **filters):
         response, error = self.list(**filters)
         if error:
             return None, error
-
-        results = self._extract_results(response)
-        if len(results) == 0:
-            return None, None
-        if len(results) > 1:
-            return (
-                None,
-                ArcsecondError(
-                    f"Expected one '{self.path}' match for filters {filters}, got {len(results)}."
-                ),
-            )
-        return results[0], None
+        return self._select_one(response, filters)
 
     def upsert(self, match_field="name", json=None, **fields):
         payload = self._build_payload(json=json, **fields)
@@ -159,62 +487,236 @@ class ArcsecondAPIEndpoint(object):
 
         return self.update(identifier, json=payload)
 
-    def _perform_request(self, url, method_name, json=None, files=None, headers=None):
-        if self.__config.verbose:
-            click.echo(f"Sending {method_name} request to {url}")
-
-        headers = self._check_and_set_auth_key(headers or {}, url)
-        method = getattr(httpx, method_name.lower())
-
-        kwargs = {"headers": headers, "timeout": 60}
-        if files and json:
-            # Do NOT set json=json, keep data=json, to avoid overriding Content-Type with `application/json`.
-            kwargs.update(files=files, data=json)
-        elif json and not files:
-            kwargs.update(json=json)
-        elif files and not json:
-            raise ArcsecondError("Files but no json?")
-
-        try:
-            response = method(url, **kwargs)
-        except httpx.RequestError as exc:
-            return None, ArcsecondError(str(exc), 400)
+    def upsert_many(
+        self,
+        records,
+        match_field="name",
+        concurrency=DEFAULT_BULK_CONCURRENCY,
+        lookup_chunk_size=None,
+    ):
+        """Create or update many records, with a single lookup of the existing ones.
+
+        Existing resources are listed once (or, with `lookup_chunk_size`, by
+        chunks of `<match_field>__in` filters) and indexed by `match_field`. Only
+        the needed creates and updates are then sent, `concurrency` at a time.
+
+        Returns a generator of `(result, error)` tuples, in the order of `records`.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        payloads = [self._upsert_payload(record) for record in records]
+
+        # Records sharing a match value are applied one after the other.
+        groups = {}
+        for index, payload in enumerate(payloads):
+            value = (payload or {}).get(match_field)
+            key = str(value) if value not in (None, "") else (index,)
+            groups.setdefault(key, []).append(index)
+
+        values = [key for key in groups if isinstance(key, str)]
+        existing, error = self._index_existing(
+            match_field, values, concurrency, lookup_chunk_size
+        )
+        if error:
+            return iter([(None, error)] * len(payloads))
+        return self._iter_upserts(payloads, groups, existing, concurrency)
+
+    def _upsert_payload(self, record):
+        return self._build_payload(json=record)
+
+    def _index_existing(self, match_field, values, concurrency, chunk_size=None):
+        if not values:
+            return {}, None
+        if chunk_size:
+            chunks = [
+                values[i : i + chunk_size] for i in range(0, len(values), chunk_size)
+            ]
+            lookups = _map_in_order(
+                lambda chunk: self.list_all(**{f"{match_field}__in": ",".join(chunk)}),
+                chunks,
+                concurrency,
+            )
+            resources = []
+            for results, error in list(lookups):
+                if error:
+                    return None, error
+                resources.extend(results)
         else:
-            if isinstance(response, dict):
-                # Responses of standard JSON payload requests are dict
-                return response, None
-            elif response is not None:
-                if 200 <= response.status_code < 300:
-                    return response.json() if response.text else {}, None
-                else:
-                    return None, ArcsecondError(response.text, response.status_code)
+            resources, error = self.list_all(parallel=concurrency)
+            if error:
+                return None, error
+
+        index = {}
+        for resource in resources:
+            matches = index.setdefault(str(resource.get(match_field)), {})
+            # Keyed by identifier: overlapping lookups must not look like duplicates.
+            matches[self._extract_identifier(resource) or id(resource)] = resource
+        return {key: list(matches.values()) for key, matches in index.items()}, None
+
+    def _iter_upserts(self, payloads, groups, existing, concurrency):
+        def perform_group(group):
+            key, indexes = group
+            try:
+                return self._upsert_group(payloads, key, indexes, existing)
+            except ArcsecondError as e:
+                return [(index, (None, e)) for index in indexes]
+
+        done = {}
+        next_index = 0
+        for results in _map_in_order(perform_group, groups.items(), concurrency):
+            done.update(results)
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+
+    def _upsert_group(self, payloads, key, indexes, existing):
+        matches = existing.get(key, []) if isinstance(key, str) else []
+        if len(matches) > 1:
+            error = ArcsecondError(
+                f"Expected one '{self.path}' match for '{key}', got {len(matches)}."
+            )
+            return [(index, (None, error)) for index in indexes]
+
+        identifier = self._extract_identifier(matches[0]) if matches else None
+        if matches and identifier is None:
+            error = ArcsecondError(f"Could not find an identifier for '{key}'.")
+            return [(index, (None, error)) for index in indexes]
+
+        results = []
+        for index in indexes:
+            payload = payloads[index]
+            if payload is None:
+                result = None, ArcsecondError("Cannot upsert an empty payload.")
+            elif identifier is None:
+                result = self.create(json=payload)
+                if result[0]:
+                    identifier = self._extract_identifier(result[0])
             else:
-                return None, ArcsecondError("Response is None", -1)
-
-    def _check_and_set_auth_key(self, headers, url):
-        # No token header for login and register
-        if (
-            API_AUTH_PATH_VERIFY in url
-            or API_AUTH_PATH_VERIFY_PORTAL in url
-            or "Authorization" in headers.keys()
-        ):
-            return headers
-
-        if self.__config.verbose:
-            click.echo("Checking local API|Upload key... ", nl=False)
-
-        # Choose the strongest key first
-        auth_key = self.__config.access_key or self.__config.upload_key
+                result = self.update(identifier, json=payload)
+            results.append((index, result))
+        return results
+
+    def _split_update_item(self, item):
+        if isinstance(item, dict):
+            return self._extract_identifier(item), item
+        identifier, payload = item
+        return identifier, payload
+
+    def _update_item(self, item):
+        identifier, payload = item
+        if identifier is None:
+            return None, ArcsecondError(
+                f"Could not find an identifier in '{self.path}' payload {payload}."
+            )
+        return self.update(identifier, json=payload)
 
-        if not auth_key:
-            raise ArcsecondError(
-                "Missing auth keys (API or Upload). You must login first: $ arcsecond login"
+    def _bulk(self, action, items, perform, concurrency):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        if action in self.native_batch_actions:
+            return self._iter_native_batches(action, items)
+
+        def perform_one(item):
+            try:
+                return perform(item)
+            except ArcsecondError as e:
+                return None, e
+
+        return _map_in_order(perform_one, items, concurrency)
+
+    def _iter_native_batches(self, action, items):
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == self.native_batch_size:
+                yield from self._perform_native_batch(action, chunk)
+                chunk = []
+        if chunk:
+            yield from self._perform_native_batch(action, chunk)
+
+    def _perform_native_batch(self, action, items):
+        """Send a chunk of items in one request.
+
+        The server receives `{"action": ..., "items": [...]}`, with payloads for
+        `create`, identifiers for `read` and `delete`, and `{"identifier", "payload"}`
+        objects for `update`. It answers with the list of results, in order.
+        """
+        if action == "update":
+            items = [{"identifier": i, "payload": p} for i, p in items]
+        url = self._build_url(self.path, self.native_batch_path)
+        response, error = self._perform_request(
+            url, "post", json={"action": action, "items": list(items)}
+        )
+        results = self._extract_results(response) if not error else []
+        if not error and len(results) != len(items):
+            error = ArcsecondError(
+                f"Batch {action} of {len(items)} '{self.path}' returned {len(results)} results."
             )
+        if error:
+            return [(None, error)] * len(items)
+        return [(result, None) for result in results]
 
-        headers["X-Arcsecond-API-Authorization"] = "Key " + auth_key
+    def _perform_request(self, url, method_name, json=None, files=None, headers=None):
+        cache = self.cache
+        if cache is not None and method_name.lower() == "get":
+            return self._perform_cached_get(cache, url, headers)
+
+        response, error = self._send(url, method_name, json, files, headers)
+        if cache is not None:
+            # Any write makes the cached reads of this resource path stale.
+            cache.invalidate(self._list_url())
+        if error:
+            return None, error
+        return self._parse_response(response)
 
-        if self.__config.verbose:
-            key_str = auth_key[:3] + 9 * "*"
-            click.echo(f"'X-Arcsecond-API-Authorization' = 'Key {key_str}'")
+    def _perform_cached_get(self, cache, url, headers=None):
+        key = self._cache_key(url)
+        body = cache.get_fresh(key)
+        if body is not None:
+            return body, None
+        return cache.coalesce(key, lambda: self._revalidate(cache, key, url, headers))
 
-        return headers
+    def _revalidate(self, cache, key, url, headers=None):
+        group = self._list_url()
+        stored = cache.get_stored(group, key)
+        headers = self._conditional_headers(stored, headers)
+
+        response, error = self._send(url, "get", headers=headers)
+        if error:
+            return None, error
+        return self._store_revalidated(cache, key, stored, response)
+
+    def _send(self, url, method_name, json=None, files=None, headers=None):
+        kwargs = self._build_request_kwargs(url, method_name, json, files, headers)
+        method = getattr(self.http_client, method_name.lower())
+        breaker = get_circuit_breaker(url)
+        limiter = self.rate_limiter
+
+        attempt = 0
+        while True:
+            pause = breaker.acquire()
+            if pause:
+                # The API looks down: wait with all other workers for the next probe.
+                time.sleep(pause)
+                continue
+
+            if limiter is not None:
+                limiter.acquire(nbytes=get_request_size(files))
+            attempt += 1
+            response, exception = None, None
+            try:
+                response = method(url, **kwargs)
+            except httpx.RequestError as exc:
+                exception = exc
+
+            delay = self._retry_delay(method_name, attempt, response, exception)
+            if delay is None:
+                break
+            self._rewind_files(files)
+            time.sleep(delay)
+
+        # Only final outcomes count, so that one flaky request cannot open the circuit.
+        breaker.record(response, exception)
+        if exception is not None:
+            return None, ArcsecondError(str(exception), 400)
+        return response, None
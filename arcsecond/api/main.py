@@ -9,6 +9,7 @@ from .config import ArcsecondConfig
 from .constants import API_AUTH_PATH_VERIFY
 from .endpoint import ArcsecondAPIEndpoint
 from .resources import ArcsecondTargetListsResource
+from .transport import get_http_client
 
 __all__ = [
     "ArcsecondAPI",
@@ -16,46 +17,64 @@ __all__ = [
 
 
 class ArcsecondAPI(object):
-    def __init__(self, config: ArcsecondConfig, subdomain: str = ""):
+    def __init__(self, config: ArcsecondConfig, subdomain: str = "", cache=None):
 
         self.config = config
         self.subdomain = subdomain
+        self.cache = cache
 
-        self.profiles = ArcsecondAPIEndpoint(self.config, "profiles", self.subdomain)
+        self.profiles = ArcsecondAPIEndpoint(
+            self.config, "profiles", self.subdomain, self.cache
+        )
 
         self.organisations = ArcsecondAPIEndpoint(
-            self.config, "organisations"
+            self.config, "organisations", cache=self.cache
         )  # never subdomain here
-        self.members = ArcsecondAPIEndpoint(self.config, "members", self.subdomain)
+        self.members = ArcsecondAPIEndpoint(
+            self.config, "members", self.subdomain, self.cache
+        )
 
         self.observingsites = ArcsecondAPIEndpoint(
-            self.config, "observingsites", self.subdomain
+            self.config, "observingsites", self.subdomain, self.cache
         )
         self.telescopes = ArcsecondAPIEndpoint(
-            self.config, "telescopes", self.subdomain
+            self.config, "telescopes", self.subdomain, self.cache
+        )
+        self.nightlogs = ArcsecondAPIEndpoint(
+            self.config, "nightlogs", self.subdomain, self.cache
         )
-        self.nightlogs = ArcsecondAPIEndpoint(self.config, "nightlogs", self.subdomain)
         self.observations = ArcsecondAPIEndpoint(
-            self.config, "observations", self.subdomain
+            self.config, "observations", self.subdomain, self.cache
         )
         self.calibrations = ArcsecondAPIEndpoint(
-            self.config, "calibrations", self.subdomain
+            self.config, "calibrations", self.subdomain, self.cache
+        )
+        self.targets = ArcsecondAPIEndpoint(
+            self.config, "targets", self.subdomain, self.cache
         )
-        self.targets = ArcsecondAPIEndpoint(self.config, "targets", self.subdomain)
         self.targetlists = ArcsecondTargetListsResource(
-            self.config, "targetlists", self.subdomain
+            self.config, "targetlists", self.subdomain, self.cache
         )
 
         self.datapackages = ArcsecondAPIEndpoint(
-            self.config, "datapackages", self.subdomain
+            self.config, "datapackages", self.subdomain, self.cache
+        )
+        self.datasets = ArcsecondAPIEndpoint(
+            self.config, "datasets", self.subdomain, self.cache
+        )
+        self.datafiles = ArcsecondAPIEndpoint(
+            self.config, "datafiles", self.subdomain, self.cache
         )
-        self.datasets = ArcsecondAPIEndpoint(self.config, "datasets", self.subdomain)
-        self.datafiles = ArcsecondAPIEndpoint(self.config, "datafiles", self.subdomain)
 
         self.allskycameras = ArcsecondAPIEndpoint(
-            self.config, "allskycameras", self.subdomain
+            self.config, "allskycameras", self.subdomain, self.cache
         )
 
+    @property
+    def http_client(self):
+        """The pooled HTTP client shared by every endpoint of this API server."""
+        return get_http_client(self.profiles._get_base_url())
+
     def login(self, username, access_key=None, upload_key=None):
         assert access_key or upload_key
         assert not (access_key and upload_key)
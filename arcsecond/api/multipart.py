@@ -0,0 +1,137 @@
+"""
+Streamed multipart request bodies, for uploads.
+
+httpx encodes multipart files by reading them 64 KiB at a time. Files with an
+`iter_blocks()` method (see `UploadFileWithProgress`) are rather sent through a
+`MultipartBody`, which yields their blocks as they are, whatever their size.
+The length of the body is computed beforehand from the sizes of the files, so
+that requests have a `Content-Length` and are never buffered nor chunked.
+
+For async clients, blocks are read in a thread, and files with a bandwidth
+`limiter` are throttled with its `athrottle()`, so that neither the reads nor
+the waits block the event loop.
+"""
+
+import asyncio
+import os
+
+_QUOTED_CHARS = {ord('"'): "%22", ord("\\"): "\\\\"}
+
+
+def is_streamable(file) -> bool:
+    return hasattr(file, "iter_blocks") and hasattr(file, "size")
+
+
+def has_streamable_files(files) -> bool:
+    return any(
+        is_streamable(value[1] if isinstance(value, tuple) else value)
+        for value in (files or {}).values()
+    )
+
+
+def _to_str(value) -> str:
+    # Same conversions as httpx form fields.
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value is None:
+        return ""
+    return str(value)
+
+
+def _format_param(name: str, value: str) -> str:
+    return f'{name}="{value.translate(_QUOTED_CHARS)}"'
+
+
+class MultipartBody(object):
+    """multipart/form-data body of form fields and streamed files, with a precomputed length."""
+
+    def __init__(self, data: dict, files: dict, boundary: bytes = None):
+        self._boundary = boundary or os.urandom(16).hex().encode("ascii")
+        self._parts = []  # bytes, or files to stream
+        for name, value in (data or {}).items():
+            for item in value if isinstance(value, (list, tuple)) else [value]:
+                self._parts.append(
+                    self._render_headers(name) + _to_str(item).encode("utf-8") + b"\r\n"
+                )
+        for name, value in files.items():
+            filename, file, content_type = self._split_file_value(name, value)
+            self._parts.append(self._render_headers(name, filename, content_type))
+            self._parts.append(file)
+            self._parts.append(b"\r\n")
+        self._parts.append(b"--%s--\r\n" % self._boundary)
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self._boundary.decode('ascii')}"
+
+    @property
+    def content_length(self) -> int:
+        return sum(
+            len(part) if isinstance(part, bytes) else part.size for part in self._parts
+        )
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "Content-Type": self.content_type,
+            "Content-Length": str(self.content_length),
+        }
+
+    @property
+    def parts(self) -> list:
+        """Bytes of the headers and fields, and files to stream."""
+        return self._parts
+
+    def __iter__(self):
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                yield from part.iter_blocks()
+
+    def async_stream(self) -> "AsyncMultipartBody":
+        return AsyncMultipartBody(self)
+
+    def _render_headers(self, name, filename=None, content_type=None) -> bytes:
+        headers = f"--{self._boundary.decode('ascii')}\r\n"
+        headers += f"Content-Disposition: form-data; {_format_param('name', name)}"
+        if filename:
+            headers += f"; {_format_param('filename', filename)}"
+        if content_type:
+            headers += f"\r\nContent-Type: {content_type}"
+        return (headers + "\r\n\r\n").encode("utf-8")
+
+    @staticmethod
+    def _split_file_value(name, value):
+        if not isinstance(value, tuple):
+            filename = os.path.basename(str(getattr(value, "name", name)))
+            return filename, value, "application/octet-stream"
+        filename, file = value[0], value[1]
+        content_type = value[2] if len(value) > 2 else "application/octet-stream"
+        return filename, file, content_type
+
+
+class AsyncMultipartBody(object):
+    """The same body, for async clients. It can be iterated again when a request is retried."""
+
+    def __init__(self, body: MultipartBody):
+        self._body = body
+
+    async def __aiter__(self):
+        for part in self._body.parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            limiter = getattr(part, "limiter", None)
+            blocks = part.iter_blocks(throttle=False) if limiter else part.iter_blocks()
+            while True:
+                block = await asyncio.to_thread(next, blocks, None)
+                if block is None:
+                    break
+                if limiter is None:
+                    yield block
+                    continue
+                async for piece in limiter.athrottle(block):
+                    yield piece
@@ -0,0 +1,169 @@
+"""
+Client-side rate limiter shared by all processes talking to the same API.
+
+Two token buckets, one for requests and one for uploaded bytes, are stored in a
+small JSON file under the config folder (one file per API name). The file is
+locked while a process takes its tokens, so that concurrent uploads and scripts
+share the same quota instead of each one tripping the server throttling.
+
+Limits are read from the API section of the config file, in units per second:
+
+    [cloud]
+    rate_limit_requests = 10
+    rate_limit_bytes = 5000000
+
+A missing or zero value means no limit.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from .config import ArcsecondConfig
+
+# Seconds of traffic allowed in a single burst after a quiet period.
+BURST_SECONDS = 2.0
+
+
+def _parse_rate(value) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    try:
+        rate = float(value)
+    except ValueError:
+        return None
+    return rate if rate > 0 else None
+
+
+class RateLimiter(object):
+    def __init__(
+        self,
+        path: Path,
+        requests_per_second: Optional[float] = None,
+        bytes_per_second: Optional[float] = None,
+        burst_seconds: float = BURST_SECONDS,
+    ):
+        self._path = Path(path)
+        self._rates = {"requests": requests_per_second, "bytes": bytes_per_second}
+        self._burst_seconds = burst_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def reserve(self, requests: int = 1, nbytes: int = 0) -> float:
+        """Take tokens for a request and return the seconds to wait before sending it.
+
+        Tokens are taken even when they are not available yet: the bucket goes in
+        debt, and the next callers wait for longer. That way waiting requests are
+        served in order and big uploads are not starved by small requests.
+        """
+        costs = {"requests": requests, "bytes": nbytes}
+        wait = 0.0
+        with self._locked_state() as state:
+            now = time.time()
+            for name, rate in self._rates.items():
+                if rate is None or not costs[name]:
+                    continue
+                burst = max(rate * self._burst_seconds, 1)
+                bucket = state.get(name) or {"tokens": burst, "updated": now}
+                elapsed = max(0.0, now - bucket["updated"])
+                tokens = min(burst, bucket["tokens"] + elapsed * rate) - costs[name]
+                state[name] = {"tokens": tokens, "updated": now}
+                if tokens < 0:
+                    wait = max(wait, -tokens / rate)
+        return wait
+
+    def acquire(self, requests: int = 1, nbytes: int = 0) -> None:
+        delay = self.reserve(requests, nbytes)
+        if delay > 0:
+            time.sleep(delay)
+
+    @contextmanager
+    def _locked_state(self):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self._path, "a+") as f:
+            _lock_file(f)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                _unlock_file(f)
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+_limiters: dict[tuple, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(config: ArcsecondConfig) -> Optional[RateLimiter]:
+    """Return the limiter of the API of `config`, or None if it has no limits."""
+    api_name = config.api_name
+    if not isinstance(api_name, str):
+        return None
+    requests_rate = _parse_rate(config.rate_limit_requests)
+    bytes_rate = _parse_rate(config.rate_limit_bytes)
+    if requests_rate is None and bytes_rate is None:
+        return None
+
+    key = (api_name, requests_rate, bytes_rate)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            filename = re.sub(r"[^\w.-]", "_", api_name) + ".json"
+            path = ArcsecondConfig.dir_path() / "ratelimit" / filename
+            limiter = RateLimiter(path, requests_rate, bytes_rate)
+            _limiters[key] = limiter
+        return limiter
+
+
+def get_request_size(files=None) -> int:
+    """Return the number of bytes of the files of a request (its body is negligible otherwise)."""
+    size = 0
+    for value in (files or {}).values():
+        file = value[1] if isinstance(value, tuple) else value
+        if isinstance(file, (bytes, str)):
+            size += len(file)
+        elif isinstance(getattr(file, "size", None), int):
+            size += file.size  # Streamed files (see `arcsecond.api.multipart`)
+        elif hasattr(file, "fileno"):
+            try:
+                size += os.fstat(file.fileno()).st_size
+            except (OSError, ValueError):
+                pass
+    return size
@@ -98,6 +98,12 @@ class ArcsecondTargetListsResource(ArcsecondAPIEndpoint):
         )
         return super().upsert(match_field=match_field, json=payload)
 
+    def _upsert_payload(self, record):
+        # Target references of each record are normalised like in `upsert()`.
+        record = dict(record or {})
+        targets = record.pop(self.target_relation_key, None)
+        return self._build_payload(json=record, targets=targets)
+
     def _read_target_refs(self, target_list, target_key=None):
         key = target_key or self.target_relation_key
         raw_targets = (target_list or {}).get(key, [])
@@ -0,0 +1,195 @@
+"""
+Retry policy and circuit breaker for requests to the Arcsecond API.
+
+A `RetryPolicy` decides whether a failed request is sent again, and how long to
+wait before doing so: exponential backoff with full jitter, or the delay asked
+by the server in a ``Retry-After`` header. Only failures that are safe to
+repeat are retried: a non-idempotent request (POST, PATCH) is retried only when
+the server has certainly not processed it (connection never established, 429
+or 503 responses).
+
+A `CircuitBreaker` is shared by all requests to the same host. After a number
+of consecutive failures it opens, and every worker pauses until a single probe
+request is allowed through to check whether the API is back.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+IDEMPOTENT_METHODS = frozenset({"get", "head", "options", "put", "delete"})
+
+# Statuses worth trying again, and the ones meaning the request was not processed.
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+UNPROCESSED_STATUSES = frozenset({429, 503})
+
+# Client errors that will fail again whatever the number of attempts.
+NON_RETRYABLE_STATUSES = frozenset({401, 403, 404, 405, 409, 413, 415, 422})
+
+# Transport errors raised before the request could reach the server.
+UNSENT_REQUEST_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RetryPolicy(object):
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+        jitter: bool = True,
+        retry_non_idempotent: bool = False,
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1.")
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_non_idempotent = retry_non_idempotent
+
+    def is_idempotent(self, method_name: str) -> bool:
+        return self.retry_non_idempotent or method_name.lower() in IDEMPOTENT_METHODS
+
+    def should_retry(self, method_name, attempt, response=None, exception=None):
+        """Tell whether the request can be sent again after its `attempt`-th failure."""
+        if attempt >= self.max_attempts:
+            return False
+        if exception is not None:
+            if isinstance(exception, UNSENT_REQUEST_ERRORS):
+                return True
+            return isinstance(exception, httpx.TransportError) and self.is_idempotent(
+                method_name
+            )
+        if response is None or response.status_code not in RETRYABLE_STATUSES:
+            return False
+        return response.status_code in UNPROCESSED_STATUSES or self.is_idempotent(
+            method_name
+        )
+
+    def should_retry_error(self, error, attempt) -> bool:
+        """Tell whether a failed operation reported as an ArcsecondError can be tried again."""
+        if attempt >= self.max_attempts:
+            return False
+        return getattr(error, "status", None) not in NON_RETRYABLE_STATUSES
+
+    def get_delay(self, attempt, response=None) -> float:
+        """Return the number of seconds to wait after the `attempt`-th failure."""
+        retry_after = self._parse_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.backoff_factor * (2 ** (attempt - 1)), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    @staticmethod
+    def _parse_retry_after(response) -> Optional[float]:
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, retry_date.timestamp() - time.time())
+
+
+class CircuitBreaker(object):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        return self._state
+
+    def acquire(self) -> float:
+        """Return 0 if a request may be sent now, or the seconds to wait before asking again."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return 0
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            # Let one probe through, the other workers keep waiting for its outcome.
+            self._state = self.HALF_OPEN
+            self._paused_until = now + self.reset_timeout
+            return 0
+
+    def record(self, response=None, exception=None):
+        if exception is not None or (response is not None and is_server_down(response)):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._paused_until = time.monotonic() + self.reset_timeout
+
+    def reset(self):
+        self.record_success()
+
+
+def is_server_down(response) -> bool:
+    return response.status_code in (502, 503, 504)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+_default_policy = DEFAULT_RETRY_POLICY
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_default_retry_policy() -> RetryPolicy:
+    return _default_policy
+
+
+def set_default_retry_policy(policy: Optional[RetryPolicy]) -> None:
+    """Change the policy of endpoints created without one. None restores the default."""
+    global _default_policy
+    _default_policy = policy or DEFAULT_RETRY_POLICY
+
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+    """Return the circuit breaker shared by all requests to the host of `url`."""
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker()
+            _breakers[host] = breaker
+        return breaker
+
+
+def reset_circuit_breakers() -> None:
+    with _breakers_lock:
+        _breakers.clear()
@@ -0,0 +1,153 @@
+"""
+Shared HTTP transport for Arcsecond API endpoints.
+
+Every endpoint talking to the same API server goes through one long-lived
+``httpx.Client``, so connections (and TLS sessions) are kept alive and reused
+across requests instead of being re-established for every call. The clients
+are thread-safe and can be shared by parallel upload workers. Async endpoints
+get one ``httpx.AsyncClient`` per API server and per event loop.
+
+HTTP/2 is enabled automatically when the optional ``h2`` package is installed
+(``pip install 'httpx[http2]'``).
+"""
+
+import asyncio
+import atexit
+import importlib.util
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+
+DEFAULT_TIMEOUT = 60
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+_clients: dict[str, httpx.Client] = {}
+_clients_lock = threading.Lock()
+# Async clients are bound to the event loop that created them: loop -> {server: client}
+_async_clients = weakref.WeakKeyDictionary()
+_pool_options = {
+    "max_connections": DEFAULT_MAX_CONNECTIONS,
+    "max_keepalive_connections": DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+    "keepalive_expiry": DEFAULT_KEEPALIVE_EXPIRY,
+    "http2": None,  # None means "enabled if h2 is installed"
+}
+
+
+def is_http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _use_http2() -> bool:
+    http2 = _pool_options["http2"]
+    if http2 is None:
+        return is_http2_available()
+    return bool(http2)
+
+
+def get_pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_pool_options["max_connections"],
+        max_keepalive_connections=_pool_options["max_keepalive_connections"],
+        keepalive_expiry=_pool_options["keepalive_expiry"],
+    )
+
+
+def configure_http_clients(
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
+    http2: Optional[bool] = None,
+) -> None:
+    """Change the connection pool options of the shared clients.
+
+    Only the provided values are changed. Existing clients are closed and will
+    be re-created with the new options on their next use.
+    """
+    options = {
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "keepalive_expiry": keepalive_expiry,
+        "http2": http2,
+    }
+    changes = {k: v for k, v in options.items() if v is not None}
+    if http2 and not is_http2_available():
+        raise ImportError(
+            "HTTP/2 support requires the 'h2' package. Run: pip install 'httpx[http2]'"
+        )
+    with _clients_lock:
+        if all(_pool_options[k] == v for k, v in changes.items()):
+            return
+        _pool_options.update(changes)
+        _close_all_locked()
+
+
+def ensure_http_connections(count: int) -> None:
+    """Make sure the pools can hold at least `count` concurrent connections."""
+    if count > _pool_options["max_connections"]:
+        configure_http_clients(
+            max_connections=count,
+            max_keepalive_connections=max(
+                count, _pool_options["max_keepalive_connections"]
+            ),
+        )
+
+
+def get_http_client(api_server: str) -> httpx.Client:
+    """Return the shared client for a given API server address."""
+    client = _clients.get(api_server)
+    if client is not None and not client.is_closed:
+        return client
+    with _clients_lock:
+        client = _clients.get(api_server)
+        if client is None or client.is_closed:
+            client = httpx.Client(
+                http2=_use_http2(),
+                limits=get_pool_limits(),
+                timeout=DEFAULT_TIMEOUT,
+            )
+            _clients[api_server] = client
+        return client
+
+
+def get_async_http_client(api_server: str) -> httpx.AsyncClient:
+    """Return the shared async client of the running event loop for an API server."""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(api_server)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=_use_http2(),
+                limits=get_pool_limits(),
+                timeout=DEFAULT_TIMEOUT,
+            )
+            clients[api_server] = client
+        return client
+
+
+async def close_async_http_clients() -> None:
+    """Close the shared async clients of the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = list(_async_clients.pop(loop, {}).values())
+    for client in clients:
+        await client.aclose()
+
+
+def _close_all_locked() -> None:
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
+
+
+def close_http_clients() -> None:
+    """Close all shared clients and their pooled connections."""
+    with _clients_lock:
+        _close_all_locked()
+
+
+atexit.register(close_http_clients)
@@ -110,9 +110,8 @@ def me(state):
     if not username:
         msg = f"Invalid/missing username: {username}. Make sure to login first: $ arcsecond login"
         raise ArcsecondError(msg)
-    response, error = ArcsecondAPI(ArcsecondConfig.from_state(state)).profiles.read(
-        username
-    )
+    api = ArcsecondAPI(ArcsecondConfig.from_state(state), cache=True)
+    response, error = api.profiles.read(username)
     if error:
         click.echo(str(error))
     else:
@@ -1,7 +1,6 @@
 import click
 
 from arcsecond.api import ArcsecondAPI, ArcsecondConfig
-from arcsecond.errors import ArcsecondError
 from arcsecond.options import State, basic_options
 
 pass_state = click.make_pass_decorator(State, ensure=True)
@@ -24,14 +23,12 @@ def datasets(state, portal=None):
     else:
         click.echo(" • Fetching datasets...")
 
-    dataset_list, error = ArcsecondAPI(
-        ArcsecondConfig.from_state(state), org_subdomain
-    ).datasets.list()
-    if error is not None:
-        raise ArcsecondError(str(error))
-
-    if isinstance(dataset_list, dict) and "results" in dataset_list.keys():
-        dataset_list = dataset_list["results"]
+    # Follow the pagination to display all of them, not only the first page.
+    dataset_list = list(
+        ArcsecondAPI(
+            ArcsecondConfig.from_state(state), org_subdomain, cache=True
+        ).datasets.iter_all()
+    )
 
     click.echo(
         f" • Found {len(dataset_list)} dataset{'s' if len(dataset_list) > 1 else ''}."
@@ -61,14 +58,12 @@ def telescopes(state, portal=None):
     else:
         click.echo(" • Fetching telescopes...")
 
-    telescope_list, error = ArcsecondAPI(
-        ArcsecondConfig.from_state(state), org_subdomain
-    ).telescopes.list()
-    if error is not None:
-        raise ArcsecondError(str(error))
-
-    if isinstance(telescope_list, dict) and "results" in telescope_list.keys():
-        telescope_list = telescope_list["results"]
+    # Follow the pagination to display all of them, not only the first page.
+    telescope_list = list(
+        ArcsecondAPI(
+            ArcsecondConfig.from_state(state), org_subdomain, cache=True
+        ).telescopes.iter_all()
+    )
 
     click.echo(
         f" • Found {len(telescope_list)} telescope{'s' if len(telescope_list) > 1 else ''}."
@@ -97,14 +92,12 @@ def allskycameras(state, portal=None):
     else:
         click.echo(" • Fetching allskycameras...")
 
-    cameras_list, error = ArcsecondAPI(
-        ArcsecondConfig.from_state(state), org_subdomain
-    ).allskycameras.list()
-    if error is not None:
-        raise ArcsecondError(str(error))
-
-    if isinstance(cameras_list, dict) and "results" in cameras_list.keys():
-        cameras_list = cameras_list["results"]
+    # Follow the pagination to display all of them, not only the first page.
+    cameras_list = list(
+        ArcsecondAPI(
+            ArcsecondConfig.from_state(state), org_subdomain, cache=True
+        ).allskycameras.iter_all()
+    )
 
     click.echo(
         f" • Found {len(cameras_list)} all-sky camera{'s' if len(cameras_list) > 1 else ''}."
@@ -38,7 +38,9 @@ class AllSkyCameraImageUploadContext(BaseUploadContext):
     def _validate_input_camera_uuid(self):
         """Validate the camera UUID exists"""
         click.echo(f" • Looking for a camera with UUID {self._input_camera_uuid}...")
-        endpoint = ArcsecondAPIEndpoint(self.config, "allskycameras", self.subdomain)
+        endpoint = ArcsecondAPIEndpoint(
+            self.config, "allskycameras", self.subdomain, cache=True
+        )
         self._camera, error = endpoint.read(self._input_camera_uuid)
 
         if error is not None:
@@ -49,6 +51,10 @@ class AllSkyCameraImageUploadContext(BaseUploadContext):
             else:
                 raise InvalidCameraError(str(self._input_camera_uuid), str(error))
 
+    @property
+    def journal_target(self):
+        return f"allskycamera:{self.camera_uuid}"
+
     @property
     def camera_uuid(self):
         return self._camera.get("uuid", "") if self._camera else self._input_camera_uuid
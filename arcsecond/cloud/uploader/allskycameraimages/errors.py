@@ -17,3 +17,8 @@ class MissingTimestampError(ArcsecondError):
     def __init__(self, filename):
         msg = f"Missing UTC timestamp for camera image {filename}."
         super().__init__(msg)
+
+
+class InvalidTimestampPatternError(ArcsecondError):
+    def __init__(self, pattern, message):
+        super().__init__(f"Invalid timestamp pattern {pattern!r}: {message}")
@@ -0,0 +1,105 @@
+"""
+Upload the images of an all-sky camera as they are written.
+
+The image path (a fixed "latest image" file, or a glob) is followed with the
+`FileWatchSource` of the live-image proxy: every new image is read once, its
+timestamp is extracted, and it is uploaded from memory to the images of the
+camera. When the proxy runs in the same process (`arcsecond allsky upload
+--serve`), both share the bytes of the images read.
+
+The image already there when the follower starts is not uploaded.
+"""
+
+import asyncio
+from pathlib import Path
+from typing import Optional
+
+from arcsecond.cloud.uploader.logger import get_logger
+from arcsecond.imagesources.sources.filewatch import FileWatchSource
+
+from .context import AllSkyCameraImageUploadContext
+from .timestamps import TimestampExtractor
+from .uploader import AllSkyCameraImageFileUploader
+
+
+class AllSkyImageFollower(object):
+    """Uploads the new images of an all-sky camera, found at a path or glob."""
+
+    def __init__(
+        self,
+        context: AllSkyCameraImageUploadContext,
+        path: str,
+        extractor: TimestampExtractor = None,
+        uploader_class=AllSkyCameraImageFileUploader,
+        poll_interval: Optional[float] = None,
+    ):
+        self._context = context
+        self._source = FileWatchSource(f"allsky:{context.camera_uuid}", str(path))
+        if poll_interval is not None:
+            self._source.poll_interval = poll_interval
+        self._extractor = extractor or TimestampExtractor()
+        self._uploader_class = uploader_class
+        self._logger = get_logger()
+        self.counts = {"succeeded": 0, "skipped": 0, "failed": 0}
+
+    @property
+    def path(self) -> str:
+        return self._source.path
+
+    async def run(self, stop: asyncio.Event = None, duration: float = None):
+        """Upload new images until `stop` is set, for `duration` seconds, or until cancelled."""
+        stop = stop or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        end = None if duration is None else loop.time() + duration
+        await self._source.open()
+        try:
+            # The current image may have been uploaded already, by a previous run.
+            await self._read()
+            while not stop.is_set():
+                timeout = self._source.poll_interval
+                if end is not None:
+                    timeout = min(timeout, end - loop.time())
+                    if timeout <= 0:
+                        break
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                data = await self._read()
+                if data is not None:
+                    await self.upload(self._source.last_path, data)
+        finally:
+            await self._source.close()
+
+    async def _read(self) -> Optional[bytes]:
+        try:
+            return await self._source.read()
+        except OSError as e:
+            # Replaced while being read: it is read again at the next poll.
+            self._logger.info(f"[AllSky] Cannot read {self.path}: {e}")
+            return None
+
+    async def upload(self, file_path: Path, data: bytes):
+        """Upload an image whose content is already read. Return its status, substatus and error.
+
+        Failures are logged and counted: the follower goes on with the next images."""
+        try:
+            timestamp = await asyncio.to_thread(
+                self._extractor.extract, file_path, data
+            )
+            if timestamp is None:
+                self._logger.warning(
+                    f"[AllSky] No timestamp found for {file_path.name}, image skipped."
+                )
+                self.counts["skipped"] += 1
+                return None
+            uploader = self._uploader_class(self._context, file_path, data=data)
+            result = await uploader.upload_file_async(utc_timestamp=timestamp)
+        except Exception as e:
+            # E.g. the image was removed by the camera software in the meantime,
+            # or the upload failed after being retried by the uploader.
+            self._logger.error(f"[AllSky] Upload of {file_path.name} failed: {e}")
+            self.counts["failed"] += 1
+            return None
+        self.counts["succeeded"] += 1
+        return result
@@ -0,0 +1,293 @@
+"""
+UTC timestamps of all-sky camera images.
+
+Every image uploaded to a camera needs the time it was taken. It is looked for,
+in that order:
+
+- in the file name, with the patterns given by the user, written like `strftime`
+  formats, with `*` and `?` wildcards (e.g. `image-%Y%m%d%H%M%S.jpg`). `%s` stands
+  for a Unix timestamp;
+- in the FITS header of FITS images (`DATE-OBS`, or else `MJD-OBS`), which is in
+  UTC;
+- in the EXIF data of JPEG images (`DateTimeOriginal`, or else `DateTime`), with
+  its UTC offset if the camera wrote one;
+- optionally, in the modification time of the file.
+
+Dates without a time zone (EXIF, file names) are in the local time of this
+computer, unless another time zone is given. Only the first bytes of the image
+are needed, and no imaging library is.
+"""
+
+import os
+import re
+import struct
+from datetime import datetime, timedelta, timezone, tzinfo
+from pathlib import Path
+from typing import Optional
+
+from arcsecond.cloud.uploader.metadata import (
+    is_fits_file,
+    parse_fits_header,
+    read_header,
+)
+
+from .errors import InvalidTimestampPatternError
+
+# EXIF data is in the first segments of a JPEG file, and is at most 64 KiB long.
+EXIF_READ_SIZE = 128 * 1024
+
+FITS_SIGNATURE = b"SIMPLE  ="
+JPEG_SIGNATURE = b"\xff\xd8"
+JPEG_APP1 = 0xE1
+JPEG_SOS = 0xDA
+EXIF_SIGNATURE = b"Exif\x00\x00"
+EXIF_ASCII = 2
+EXIF_LONG = 4
+EXIF_TAG_DATETIME = 0x0132
+EXIF_TAG_EXIF_IFD = 0x8769
+EXIF_TAG_DATETIME_ORIGINAL = 0x9003
+EXIF_TAG_OFFSET_TIME_ORIGINAL = 0x9011
+EXIF_DATETIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+MJD_EPOCH = datetime(1858, 11, 17, tzinfo=timezone.utc)
+
+# Regular expressions of the strftime directives allowed in file name patterns.
+PATTERN_DIRECTIVES = {
+    "Y": r"\d{4}",
+    "y": r"\d{2}",
+    "m": r"\d{1,2}",
+    "d": r"\d{1,2}",
+    "j": r"\d{1,3}",
+    "H": r"\d{1,2}",
+    "M": r"\d{1,2}",
+    "S": r"\d{1,2}",
+    "f": r"\d{1,6}",
+    "z": r"Z|[+-]\d{2}:?\d{2}",
+    "b": r"[A-Za-z]{3}",
+    "s": r"\d{9,11}(?:\.\d+)?",
+}
+
+
+class FilenamePattern(object):
+    """A `strftime`-like pattern of file names giving the time an image was taken."""
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self._directives = []
+        regex = ""
+        index = 0
+        while index < len(pattern):
+            char = pattern[index]
+            if char == "%":
+                directive = pattern[index + 1 : index + 2]
+                if directive == "%":
+                    regex += "%"
+                elif directive in PATTERN_DIRECTIVES:
+                    regex += f"({PATTERN_DIRECTIVES[directive]})"
+                    self._directives.append(directive)
+                else:
+                    raise InvalidTimestampPatternError(
+                        pattern, f"unsupported directive %{directive}"
+                    )
+                index += 2
+                continue
+            if char == "*":
+                regex += "[^/]*"
+            elif char == "?":
+                regex += "[^/]"
+            else:
+                regex += re.escape(char)
+            index += 1
+
+        if not self._directives:
+            raise InvalidTimestampPatternError(pattern, "it has no date directive")
+        if "s" in self._directives and len(self._directives) > 1:
+            raise InvalidTimestampPatternError(
+                pattern, "%s cannot be mixed with other directives"
+            )
+        self._regex = re.compile(regex)
+        # Patterns with folders are matched against as many trailing parts of paths.
+        self._parts_count = pattern.count("/") + 1
+
+    def match(self, file_path) -> Optional[datetime]:
+        """Return the date found in the path, or None. It has no time zone, unless given by %z or %s."""
+        parts = Path(file_path).parts[-self._parts_count :]
+        match = self._regex.fullmatch("/".join(parts))
+        if match is None:
+            return None
+        values = match.groups()
+        if self._directives == ["s"]:
+            return datetime.fromtimestamp(float(values[0]), timezone.utc)
+        try:
+            return datetime.strptime(
+                "|".join(values), "|".join(f"%{d}" for d in self._directives)
+            )
+        except ValueError:
+            return None
+
+
+def parse_exif_datetime(data: bytes) -> Optional[datetime]:
+    """Return the date an image was taken, from the EXIF data of JPEG content, or None."""
+    tiff = _find_exif_tiff(data)
+    if tiff is None:
+        return None
+    try:
+        byte_order = {b"II": "<", b"MM": ">"}[tiff[:2]]
+        (ifd_offset,) = struct.unpack(byte_order + "I", tiff[4:8])
+        ifd0 = _read_ifd(tiff, byte_order, ifd_offset)
+        values = {}
+        if EXIF_TAG_EXIF_IFD in ifd0:
+            values = _read_ifd(tiff, byte_order, ifd0[EXIF_TAG_EXIF_IFD])
+    except (KeyError, struct.error):
+        return None
+
+    for tag, source in (
+        (EXIF_TAG_DATETIME_ORIGINAL, values),
+        (EXIF_TAG_DATETIME, ifd0),
+    ):
+        try:
+            date = datetime.strptime(source.get(tag, ""), EXIF_DATETIME_FORMAT)
+        except (TypeError, ValueError):
+            continue
+        offset = values.get(EXIF_TAG_OFFSET_TIME_ORIGINAL)
+        if tag == EXIF_TAG_DATETIME_ORIGINAL and isinstance(offset, str):
+            try:
+                date = date.replace(tzinfo=datetime.strptime(offset, "%z").tzinfo)
+            except ValueError:
+                pass
+        return date
+    return None
+
+
+def _find_exif_tiff(data: bytes) -> Optional[bytes]:
+    """Return the TIFF structure of the EXIF segment of JPEG content, or None."""
+    if not data.startswith(JPEG_SIGNATURE):
+        return None
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == JPEG_SOS:
+            return None
+        (length,) = struct.unpack(">H", data[offset + 2 : offset + 4])
+        segment = data[offset + 4 : offset + 2 + length]
+        if marker == JPEG_APP1 and segment.startswith(EXIF_SIGNATURE):
+            return segment[len(EXIF_SIGNATURE) :]
+        offset += 2 + length
+    return None
+
+
+def _read_ifd(tiff: bytes, byte_order: str, offset: int) -> dict:
+    """Return the ASCII and LONG values of an IFD of a TIFF structure, by tag."""
+    values = {}
+    (count,) = struct.unpack_from(byte_order + "H", tiff, offset)
+    for index in range(count):
+        entry = offset + 2 + index * 12
+        tag, kind, length = struct.unpack_from(byte_order + "HHI", tiff, entry)
+        if kind == EXIF_LONG and length == 1:
+            (values[tag],) = struct.unpack_from(byte_order + "I", tiff, entry + 8)
+        elif kind == EXIF_ASCII:
+            start = entry + 8
+            if length > 4:
+                (start,) = struct.unpack_from(byte_order + "I", tiff, entry + 8)
+            raw = tiff[start : start + length]
+            values[tag] = raw.split(b"\x00", 1)[0].decode("ascii", "replace").strip()
+    return values
+
+
+def get_fits_datetime(header: dict) -> Optional[datetime]:
+    """Return the UTC date an image was taken, from its FITS header, or None."""
+    date_obs = header.get("DATE-OBS")
+    # A DATE-OBS without time (old FITS files) is not precise enough.
+    if isinstance(date_obs, str) and len(date_obs) > 10:
+        try:
+            date = datetime.fromisoformat(date_obs)
+        except ValueError:
+            date = None
+        if date is not None:
+            return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+    mjd = header.get("MJD-OBS")
+    if isinstance(mjd, (int, float)) and not isinstance(mjd, bool):
+        return MJD_EPOCH + timedelta(days=mjd)
+    return None
+
+
+class TimestampExtractor(object):
+    """Finds the UTC timestamp of all-sky camera images (see the module documentation)."""
+
+    def __init__(
+        self,
+        patterns=(),
+        naive_timezone: Optional[tzinfo] = None,
+        use_mtime: bool = False,
+    ):
+        self._patterns = [
+            p if isinstance(p, FilenamePattern) else FilenamePattern(p)
+            for p in patterns
+        ]
+        self._naive_timezone = naive_timezone
+        self._use_mtime = use_mtime
+
+    @property
+    def patterns(self) -> list:
+        return self._patterns
+
+    @property
+    def use_mtime(self) -> bool:
+        return self._use_mtime
+
+    def extract(self, file_path, data: bytes = None) -> Optional[float]:
+        """Return the POSIX timestamp an image was taken, or None if none is found.
+
+        `data` is the content of the image, if already read."""
+        date = self.extract_datetime(file_path, data)
+        return None if date is None else date.timestamp()
+
+    def extract_datetime(self, file_path, data: bytes = None) -> Optional[datetime]:
+        """Return the UTC date an image was taken, or None if none is found."""
+        date = self._find_datetime(file_path, data)
+        if date is None:
+            return None
+        if date.tzinfo is None:
+            # Without a time zone, astimezone() considers the date local.
+            if self._naive_timezone is not None:
+                date = date.replace(tzinfo=self._naive_timezone)
+            else:
+                date = date.astimezone()
+        return date.astimezone(timezone.utc)
+
+    def _find_datetime(self, file_path, data: bytes = None) -> Optional[datetime]:
+        for pattern in self._patterns:
+            date = pattern.match(file_path)
+            if date is not None:
+                return date
+
+        if is_fits_file(file_path):
+            # Compressed images are read again, to decompress their header only.
+            if data is not None and data.startswith(FITS_SIGNATURE):
+                header = parse_fits_header(data)
+            else:
+                header = read_header(file_path)
+            date = get_fits_datetime(header)
+        else:
+            if data is None:
+                data = self._read_start(file_path)
+            date = parse_exif_datetime(data)
+        if date is not None:
+            return date
+
+        if self._use_mtime:
+            try:
+                return datetime.fromtimestamp(os.path.getmtime(file_path), timezone.utc)
+            except OSError:
+                return None
+        return None
+
+    @staticmethod
+    def _read_start(file_path) -> bytes:
+        try:
+            with open(file_path, "rb") as f:
+                return f.read(EXIF_READ_SIZE)
+        except OSError:
+            return b""
@@ -1,18 +1,53 @@
-from arcsecond.cloud.uploader.uploader import BaseFileUploader
-from arcsecond.errors import ArcsecondError
+from arcsecond.api.retry import RetryPolicy
+from arcsecond.cloud.uploader.bandwidth import get_bandwidth_limiter
+from arcsecond.cloud.uploader.uploader import (
+    UPLOAD_RETRY_POLICY,
+    BaseFileUploader,
+    UploadBytes,
+)
 
 from .context import AllSkyCameraImageUploadContext
 from .errors import MissingTimestampError
 
 
 class AllSkyCameraImageFileUploader(BaseFileUploader[AllSkyCameraImageUploadContext]):
-    """Uploader for image files with camera attachment"""
+    """Uploader for image files with camera attachment
+
+    `data` is the content of the image, if already read (e.g. by the live-image
+    proxy): it is sent as is, without reading the file again."""
+
+    def __init__(
+        self,
+        context: AllSkyCameraImageUploadContext,
+        file_path,
+        display_progress=False,
+        retry_policy: RetryPolicy = UPLOAD_RETRY_POLICY,
+        data: bytes = None,
+    ):
+        super().__init__(context, file_path, display_progress, retry_policy)
+        self._data = data
+        if data is not None:
+            self._file_size = len(data)
 
     def _prepare_upload(self):
         """No specific preparation needed for image uploads"""
         # Camera validation was already done in the context
         pass
 
+    async def _prepare_upload_async(self):
+        pass
+
+    def _should_upload_by_parts(self):
+        return self._data is None and super()._should_upload_by_parts()
+
+    def _get_upload_files(self, **kwargs):
+        if self._data is None:
+            return super()._get_upload_files(**kwargs)
+        body = UploadBytes(
+            self._data, block_size=self.block_size, limiter=get_bandwidth_limiter()
+        )
+        return {"file": (self._upload_name, body, "application/octet-stream")}
+
     def _get_upload_data(self, **kwargs):
         # At that point, timestamp must have been provided (with upload_file(ts)).
         fields = {"camera": self._context.camera_uuid}
@@ -27,3 +62,9 @@ class AllSkyCameraImageFileUploader(BaseFileUploader[AllSkyCameraImageUploadCont
             raise MissingTimestampError(self._file_path)
         kwargs.update(utc_timestamp=utc_timestamp)
         return super().upload_file(**kwargs)
+
+    async def upload_file_async(self, utc_timestamp, **kwargs):
+        if utc_timestamp is None:
+            raise MissingTimestampError(self._file_path)
+        kwargs.update(utc_timestamp=utc_timestamp)
+        return await super().upload_file_async(**kwargs)
@@ -2,19 +2,17 @@ import pathlib
 
 import click
 
+from arcsecond.cloud.uploader.index import FileIndex
 from arcsecond.cloud.uploader.utils import (
     __get_formatted_bytes_size,
     __get_formatted_size_times,
-    is_file_hidden,
 )
 
 from .context import AllSkyCameraImageUploadContext
+from .timestamps import TimestampExtractor
 
 
-def display_upload_allskycameraimages_command_summary(
-    context: AllSkyCameraImageUploadContext, folders: list
-):
-    click.echo("\n --- Upload summary --- ")
+def _display_account_and_camera(context: AllSkyCameraImageUploadContext):
     key = (
         f"(Upload key: {context.config.upload_key[:4]}••••)"
         if context.config.upload_key
@@ -33,8 +31,15 @@ def display_upload_allskycameraimages_command_summary(
     click.echo(
         f" • Using API server: '{context.config.api_name}' ({context.config.api_server})"
     )
+
+
+def display_upload_allskycameraimages_command_summary(
+    context: AllSkyCameraImageUploadContext, folders: list, file_indexes: list = None
+):
+    click.echo("\n --- Upload summary --- ")
+    _display_account_and_camera(context)
     click.echo(f" • Folder{'s' if len(folders) > 1 else ''}:")
-    for folder in folders:
+    for i, folder in enumerate(folders):
         folder_path = pathlib.Path(folder).expanduser().resolve()
         click.echo(
             f"   > Path: {str(folder_path.parent if folder_path.is_file() else folder_path)}"
@@ -43,12 +48,22 @@ def display_upload_allskycameraimages_command_summary(
         if folder_path == pathlib.Path.home():
             click.echo("   >>> Warning: This folder is your HOME folder. <<<")
 
-        size = sum(
-            f.stat().st_size
-            for f in folder_path.glob("**/*")
-            if f.is_file() and not is_file_hidden(f)
-        )
+        file_index = file_indexes[i] if file_indexes else FileIndex.build(folder)
+        size = file_index.total_size
         click.echo(
             f"   > Volume: {__get_formatted_bytes_size(size)} in total in this folder."
         )
         click.echo(f"   > Estimated upload time: {__get_formatted_size_times(size)}")
+
+
+def display_follow_allskycameraimages_command_summary(
+    context: AllSkyCameraImageUploadContext, path: str, extractor: TimestampExtractor
+):
+    """Displays a summary of the `arcsecond allsky upload` command."""
+    click.echo("\n --- Upload summary --- ")
+    _display_account_and_camera(context)
+    click.echo(f" • New images will be uploaded from: {path}")
+    sources = [p.pattern for p in extractor.patterns] + ["FITS header", "EXIF data"]
+    if extractor.use_mtime:
+        sources.append("file modification time")
+    click.echo(f" • Timestamps are read from: {', '.join(sources)}.")
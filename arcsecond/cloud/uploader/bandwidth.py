@@ -0,0 +1,312 @@
+"""
+Upload bandwidth caps, by time of the day.
+
+At the observatory, uploads must leave room on the link for remote operations
+during the night. A `BandwidthLimiter` caps the bytes per second sent by all
+the uploads of the process: the bodies of the uploads (`UploadFileWithProgress`,
+parts of chunked uploads) are streamed through it, by small slices, so that the
+link is never saturated, even for a short while.
+
+The cap is given by a `BandwidthSchedule`: rates by time windows (in local time),
+and a default rate otherwise. Schedules are written as comma-separated (or
+line-separated) entries, a window being `HH:MM-HH:MM=RATE` and the default
+rate a `RATE` alone. Rates are in bytes per second, with an optional k, M or G
+suffix (of 1024, as sizes are displayed), and `unlimited` stands for no cap. For instance, 200 kB/s
+from dusk to dawn and no cap by day:
+
+    18:00-07:00=200k
+
+A schedule read from a file is read again whenever the file changes, so that
+the cap can be changed during a long walk without restarting it. The
+throughput is logged every minute against the current cap.
+
+Uploads through the async API are throttled with `athrottle()`, which waits
+with `asyncio.sleep`, so that the event loop is never blocked.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from datetime import datetime
+from datetime import time as clock_time
+from pathlib import Path
+from typing import Optional
+
+from .errors import InvalidBandwidthScheduleError
+from .logger import get_logger
+from .utils import __get_formatted_bytes_size as _format_bytes
+
+# Slices of bodies are sent after waiting for that many seconds of traffic at most.
+SLICE_SECONDS = 0.1
+MIN_SLICE_SIZE = 16 * 1024
+# Traffic allowed at once after a quiet period.
+BURST_SECONDS = 0.5
+REPORT_INTERVAL = 60.0
+# A schedule file is checked for changes at most that often.
+RELOAD_INTERVAL = 5.0
+
+UNLIMITED = ("unlimited", "none", "off", "0")
+RATE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+_RATE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*([kmg]?)(?:b(?:/s)?)?", re.IGNORECASE)
+_WINDOW_PATTERN = re.compile(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})")
+
+
+def parse_rate(value: str, source: str = "--bandwidth") -> Optional[float]:
+    """Return bytes per second from e.g. '200k', '1.5M' or '200kB/s', or None if unlimited."""
+    value = value.strip()
+    if value.lower() in UNLIMITED:
+        return None
+    match = _RATE_PATTERN.fullmatch(value)
+    if match is None or float(match.group(1)) <= 0:
+        raise InvalidBandwidthScheduleError(source, f"Invalid rate {value!r}.")
+    return float(match.group(1)) * RATE_UNITS[match.group(2).lower()]
+
+
+def format_rate(rate: Optional[float]) -> str:
+    return "unlimited" if rate is None else f"{_format_bytes(int(rate))}/s"
+
+
+def _parse_clock_time(hours: str, minutes: str, source: str) -> clock_time:
+    try:
+        return clock_time(int(hours), int(minutes))
+    except ValueError:
+        raise InvalidBandwidthScheduleError(source, f"Invalid time {hours}:{minutes}.")
+
+
+class BandwidthWindow(object):
+    """A rate from a time of the day to another one (possibly the day after)."""
+
+    def __init__(self, start: clock_time, end: clock_time, rate: Optional[float]):
+        self.start = start
+        self.end = end
+        self.rate = rate
+
+    def contains(self, moment: clock_time) -> bool:
+        if self.start <= self.end:
+            return self.start <= moment < self.end
+        return moment >= self.start or moment < self.end
+
+    def __str__(self):
+        return f"{format_rate(self.rate)} from {self.start:%H:%M} to {self.end:%H:%M}"
+
+
+class BandwidthSchedule(object):
+    """Upload rates by time windows of the day, and a default rate."""
+
+    def __init__(self, windows=(), default_rate: Optional[float] = None):
+        self.windows = list(windows)
+        self.default_rate = default_rate
+
+    @classmethod
+    def parse(cls, spec: str, source: str = "--bandwidth") -> "BandwidthSchedule":
+        """Parse entries like '18:00-07:00=200k, 2M' (see the module documentation)."""
+        windows, default_rate = [], None
+        entries = [e.split("#", 1)[0].strip() for e in re.split(r"[,\n]", spec)]
+        for entry in filter(None, entries):
+            window, separator, rate = entry.rpartition("=")
+            if not separator:
+                default_rate = parse_rate(rate, source)
+                continue
+            match = _WINDOW_PATTERN.fullmatch(window.strip())
+            if match is None:
+                raise InvalidBandwidthScheduleError(
+                    source, f"Invalid time window {window.strip()!r}."
+                )
+            start = _parse_clock_time(match.group(1), match.group(2), source)
+            end = _parse_clock_time(match.group(3), match.group(4), source)
+            windows.append(BandwidthWindow(start, end, parse_rate(rate, source)))
+        return cls(windows, default_rate)
+
+    @classmethod
+    def load(cls, path) -> "BandwidthSchedule":
+        try:
+            spec = Path(path).read_text()
+        except (OSError, UnicodeDecodeError) as error:
+            raise InvalidBandwidthScheduleError(str(path), str(error))
+        return cls.parse(spec, str(path))
+
+    def rate_at(self, moment: datetime = None) -> Optional[float]:
+        """The rate at a moment (now by default, in local time). The first matching window wins."""
+        moment = (moment or datetime.now()).time()
+        for window in self.windows:
+            if window.contains(moment):
+                return window.rate
+        return self.default_rate
+
+    def __str__(self):
+        parts = [str(window) for window in self.windows]
+        default = format_rate(self.default_rate)
+        parts.append(f"{default} otherwise" if self.windows else default)
+        return ", ".join(parts)
+
+
+class BandwidthLimiter(object):
+    """Caps the bytes per second sent by all the uploads of the process (thread-safe).
+
+    The cap follows the `schedule`, or the schedule file at `path`, read again
+    when it changes."""
+
+    def __init__(self, schedule: BandwidthSchedule = None, path=None):
+        self._path = Path(path) if path is not None else None
+        self._path_mtime = None
+        self._next_reload = 0.0
+        self._schedule = schedule or BandwidthSchedule()
+        if self._path is not None:
+            self._reload(force=True)
+
+        self._lock = threading.Lock()
+        self._logger = get_logger()
+        self._rate = self._schedule.rate_at()
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+        self._started = self._updated
+        self._sent = 0
+        self._report_started = self._updated
+        self._report_sent = 0
+
+    @property
+    def schedule(self) -> BandwidthSchedule:
+        return self._schedule
+
+    @property
+    def rate(self) -> Optional[float]:
+        """The current cap, in bytes per second, or None."""
+        return self._rate
+
+    @property
+    def sent(self) -> int:
+        return self._sent
+
+    def set_schedule(self, schedule: BandwidthSchedule):
+        """Change the schedule, effective immediately."""
+        with self._lock:
+            self._schedule = schedule
+            self._update_rate(time.monotonic())
+
+    def slice_size(self) -> Optional[int]:
+        """Size of the slices bodies are sent by, or None without cap."""
+        rate = self._rate
+        if rate is None:
+            return None
+        return max(MIN_SLICE_SIZE, int(rate * SLICE_SECONDS))
+
+    def throttle(self, block):
+        """Yield slices of a block of bytes, each one when the cap allows it."""
+        view = memoryview(block)
+        start = 0
+        while start < len(view):
+            size = self.slice_size() or len(view)
+            part = view[start : start + size]
+            self.consume(len(part))
+            yield part
+            start += len(part)
+
+    async def athrottle(self, block):
+        """Same as `throttle()`, waiting without blocking the event loop."""
+        view = memoryview(block)
+        start = 0
+        while start < len(view):
+            size = self.slice_size() or len(view)
+            part = view[start : start + size]
+            wait = self.reserve(len(part))
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield part
+            start += len(part)
+
+    def consume(self, nbytes: int):
+        """Wait until `nbytes` can be sent under the cap."""
+        wait = self.reserve(nbytes)
+        if wait > 0:
+            time.sleep(wait)
+
+    def reserve(self, nbytes: int) -> float:
+        """Count `nbytes` as sent, and return the seconds to wait before sending them.
+
+        As with `arcsecond.api.ratelimit`, the bucket can go in debt: waiting
+        uploads are served in order."""
+        with self._lock:
+            now = time.monotonic()
+            self._update_rate(now)
+            self._sent += nbytes
+            self._report_sent += nbytes
+            if now - self._report_started >= REPORT_INTERVAL:
+                self._report(now)
+
+            rate = self._rate
+            if rate is None:
+                return 0.0
+            burst = rate * BURST_SECONDS
+            elapsed = max(0.0, now - self._updated)
+            self._tokens = min(burst, self._tokens + elapsed * rate) - nbytes
+            self._updated = now
+            return -self._tokens / rate if self._tokens < 0 else 0.0
+
+    def summary(self) -> str:
+        """Bytes sent and average throughput since the start, against the current cap."""
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        return self._describe(self._sent, elapsed)
+
+    def _describe(self, sent: int, elapsed: float) -> str:
+        throughput = sent / elapsed
+        msg = f"{_format_bytes(sent)} sent at {format_rate(throughput)}"
+        if self._rate is None:
+            return msg + " (no cap)"
+        return msg + f" (cap {format_rate(self._rate)}, {throughput / self._rate:.0%})"
+
+    def _report(self, now: float):
+        elapsed = now - self._report_started
+        self._logger.info(
+            f"[Bandwidth] {self._describe(self._report_sent, elapsed)} in the last {elapsed:.0f}s."
+        )
+        self._report_started = now
+        self._report_sent = 0
+
+    def _update_rate(self, now: float):
+        if self._path is not None and now >= self._next_reload:
+            self._next_reload = now + RELOAD_INTERVAL
+            self._reload()
+        rate = self._schedule.rate_at()
+        if rate == self._rate:
+            return
+        self._logger.info(
+            f"[Bandwidth] Upload cap changed from {format_rate(self._rate)} to {format_rate(rate)}."
+        )
+        self._rate = rate
+        # Start again from an empty bucket: no burst, and no debt counted at the former rate.
+        self._tokens = 0.0
+        self._updated = now
+
+    def _reload(self, force: bool = False):
+        try:
+            mtime = self._path.stat().st_mtime
+        except OSError as error:
+            if force:
+                raise InvalidBandwidthScheduleError(str(self._path), str(error))
+            return
+        if mtime == self._path_mtime:
+            return
+        try:
+            self._schedule = BandwidthSchedule.load(self._path)
+        except InvalidBandwidthScheduleError as error:
+            if force:
+                raise
+            # The walk goes on with the former schedule.
+            get_logger().error(f"[Bandwidth] {error}")
+        self._path_mtime = mtime
+
+
+_limiter: Optional[BandwidthLimiter] = None
+
+
+def get_bandwidth_limiter() -> Optional[BandwidthLimiter]:
+    """The limiter shared by all the uploads of the process, if any."""
+    return _limiter
+
+
+def set_bandwidth_limiter(limiter: Optional[BandwidthLimiter]):
+    """Cap all uploads of the process with `limiter` (None to remove the cap)."""
+    global _limiter
+    _limiter = limiter
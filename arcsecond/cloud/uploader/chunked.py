@@ -0,0 +1,186 @@
+"""
+Client of the chunked upload protocol, for large files.
+
+A large file is split in fixed-size parts, sent in parallel and retried one by
+one, so that a dropped connection only costs the parts in flight. Under the
+upload path of the context (e.g. `datafiles/`):
+
+- `POST chunked/` with the file name, size, part size and upload fields,
+  starts an upload and returns its `upload_id` (and the `chunk_size` the
+  server accepts, if it chose another one);
+- `GET chunked/<upload_id>/` returns the numbers of the parts already
+  `received`, to resume an interrupted upload;
+- `PATCH chunked/<upload_id>/parts/<number>/` sends a part, as the multipart
+  `chunk` file with its `offset`;
+- `POST chunked/<upload_id>/complete/` assembles the parts, and returns the
+  uploaded resource, as a single upload would.
+
+The `upload_id` is the resume token of the upload: kept in the upload journal,
+it lets a later run continue from the last received part.
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from arcsecond.api import ArcsecondAPIEndpoint
+from arcsecond.api.retry import RetryPolicy
+from arcsecond.errors import ArcsecondError
+
+# Files from this size on are uploaded by parts, if the server supports it.
+CHUNKED_UPLOAD_THRESHOLD = 256 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_PARALLEL_PARTS = 4
+
+# Statuses telling that the server does not support chunked uploads.
+UNSUPPORTED_STATUSES = (404, 405, 501)
+
+_unsupported_urls = set()
+_unsupported_urls_lock = threading.Lock()
+
+
+class ChunkedUpload(object):
+    def __init__(
+        self,
+        upload_endpoint: ArcsecondAPIEndpoint,
+        file_path: str | Path,
+        retry_policy: RetryPolicy,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        parallel_parts: int = DEFAULT_PARALLEL_PARTS,
+        upload_id=None,
+        on_progress=None,
+        filename=None,
+        part_body=None,
+    ):
+        self._config = upload_endpoint.config
+        self._subdomain = upload_endpoint.subdomain
+        self._path = f"{upload_endpoint.path}/chunked"
+        self._file_path = Path(file_path)
+        self._filename = filename or self._file_path.name
+        self._file_size = self._file_path.stat().st_size
+        self._retry_policy = retry_policy
+        self._chunk_size = chunk_size
+        self._parallel_parts = parallel_parts
+        self._upload_id = upload_id
+        self._received = set()
+        self._on_progress = on_progress
+        # Returns what is sent for the bytes of a part (e.g. a throttled body).
+        self._part_body = part_body
+
+    @property
+    def upload_id(self):
+        return self._upload_id
+
+    @property
+    def part_count(self) -> int:
+        return max(1, math.ceil(self._file_size / self._chunk_size))
+
+    @property
+    def missing_parts(self):
+        return [n for n in range(self.part_count) if n not in self._received]
+
+    def open(self, data: dict):
+        """Resume the upload of `upload_id` if it is still known, or start a new one. Return an error or None."""
+        endpoint = self._get_endpoint()
+        if self._upload_id is not None:
+            status, error = endpoint.read(self._upload_id)
+            if error is None:
+                self._chunk_size = status.get("chunk_size") or self._chunk_size
+                self._received = set(status.get("received") or [])
+                return None
+            if getattr(error, "status", None) != 404:
+                return error
+            # Expired or unknown upload: start over.
+            self._upload_id = None
+
+        payload = {
+            "filename": self._filename,
+            "size": self._file_size,
+            "chunk_size": self._chunk_size,
+        }
+        payload.update(data)
+        upload, error = endpoint.create(json=payload)
+        if error is not None:
+            if getattr(error, "status", None) in UNSUPPORTED_STATUSES:
+                mark_chunked_upload_unsupported(endpoint)
+            return error
+        self._upload_id = upload["upload_id"]
+        self._chunk_size = upload.get("chunk_size") or self._chunk_size
+        self._received = set()
+        return None
+
+    def send_parts(self):
+        """Send the parts not received yet, in parallel. Return the first error, or None."""
+        executor = ThreadPoolExecutor(
+            max_workers=self._parallel_parts, thread_name_prefix="arcsecond-part"
+        )
+        try:
+            futures = [executor.submit(self._send_part, n) for n in self.missing_parts]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                error = future.exception()
+                if isinstance(error, ArcsecondError):
+                    return error
+                if error is not None:
+                    return ArcsecondError(str(error))
+            return None
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def complete(self):
+        endpoint = self._get_endpoint(self._upload_id, "complete")
+        return endpoint.create(json={"parts": self.part_count})
+
+    def _send_part(self, number: int):
+        offset = number * self._chunk_size
+        with open(self._file_path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read(self._chunk_size)
+
+        endpoint = self._get_endpoint(self._upload_id, "parts")
+        attempt = 1
+        while True:
+            body = chunk if self._part_body is None else self._part_body(chunk)
+            files = {"chunk": (self._filename, body, "application/octet-stream")}
+            _, error = endpoint.update(number, json={"offset": offset}, files=files)
+            if error is None:
+                break
+            if not self._retry_policy.should_retry_error(error, attempt):
+                raise error
+            time.sleep(self._retry_policy.get_delay(attempt))
+            attempt += 1
+
+        self._received.add(number)
+        if self._on_progress is not None:
+            self._on_progress(len(chunk))
+
+    def _get_endpoint(self, *fragments) -> ArcsecondAPIEndpoint:
+        path = "/".join([self._path] + [str(f) for f in fragments])
+        return ArcsecondAPIEndpoint(self._config, path, self._subdomain)
+
+
+def _get_unsupported_key(endpoint: ArcsecondAPIEndpoint):
+    return endpoint.config.api_server, endpoint.subdomain, endpoint.path
+
+
+def mark_chunked_upload_unsupported(endpoint: ArcsecondAPIEndpoint):
+    with _unsupported_urls_lock:
+        _unsupported_urls.add(_get_unsupported_key(endpoint))
+
+
+def is_chunked_upload_supported(upload_endpoint: ArcsecondAPIEndpoint) -> bool:
+    """Tell whether chunked uploads were not refused already by the server of an upload endpoint."""
+    endpoint = ArcsecondAPIEndpoint(
+        upload_endpoint.config,
+        f"{upload_endpoint.path}/chunked",
+        upload_endpoint.subdomain,
+    )
+    with _unsupported_urls_lock:
+        return _get_unsupported_key(endpoint) not in _unsupported_urls
+
+
+def reset_chunked_upload_support():
+    with _unsupported_urls_lock:
+        _unsupported_urls.clear()
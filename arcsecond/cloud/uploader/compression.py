@@ -0,0 +1,146 @@
+"""
+Compression of data files before their upload.
+
+Raw FITS frames often shrink 2 to 3 times with gzip, and the API accepts
+`.fits.gz` and `.fits.bz2` files as they are. Files are compressed by a pool of
+processes, ahead of the upload workers, into temporary files (the spool) that
+are deleted once uploaded. Files not worth compressing (already compressed,
+or saving too little) are uploaded as they are.
+
+With the `auto` method, slices of each file are compressed first, and the
+whole file is compressed with gzip only if the sample shrinks enough.
+"""
+
+import bz2
+import gzip
+import os
+import shutil
+import tempfile
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from .constants import DATA_EXTENSIONS, ZIP_EXTENSIONS
+
+COMPRESSION_METHODS = ("gzip", "bz2", "auto")
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "bz2": ".bz2"}
+
+GZIP_LEVEL = 6
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Slices compressed in auto mode, and the ratio below which compression is worth it.
+AUTO_SAMPLE_COUNT = 3
+AUTO_SAMPLE_SIZE = 256 * 1024
+AUTO_MAX_RATIO = 0.85
+
+
+def is_compressible(file_path) -> bool:
+    name = str(file_path).lower()
+    if any(name.endswith(extension) for extension in ZIP_EXTENSIONS):
+        return False
+    return any(name.endswith(extension) for extension in DATA_EXTENSIONS)
+
+
+def get_sample_ratio(file_path) -> float:
+    """Return the size ratio of a sample of the file, once compressed (1 if empty)."""
+    size = os.path.getsize(file_path)
+    sample_size = min(AUTO_SAMPLE_SIZE, size)
+    if sample_size == 0:
+        return 1.0
+    # Slices inside the file, rather than its header only.
+    step = (size - sample_size) / (AUTO_SAMPLE_COUNT + 1)
+    offsets = sorted({int(step * (i + 1)) for i in range(AUTO_SAMPLE_COUNT)})
+    raw_size, compressed_size = 0, 0
+    with open(file_path, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            sample = f.read(sample_size)
+            raw_size += len(sample)
+            compressed_size += len(zlib.compress(sample, 1))
+    return compressed_size / raw_size
+
+
+def _open_compressed(f, method: str):
+    if method == "gzip":
+        # No name nor mtime in the header, so that the same file gives the same bytes.
+        return gzip.GzipFile(
+            filename="", mode="wb", fileobj=f, compresslevel=GZIP_LEVEL, mtime=0
+        )
+    return bz2.BZ2File(f, mode="wb")
+
+
+def compress_file(file_path, method: str, directory) -> Optional[str]:
+    """Compress a file into `directory`. Return the compressed file path, or None if not worth it.
+
+    Runs in the processes of the pool, hence a plain function.
+    """
+    if method == "auto":
+        if get_sample_ratio(file_path) > AUTO_MAX_RATIO:
+            return None
+        method = "gzip"
+
+    name = Path(file_path).name + COMPRESSION_SUFFIXES[method]
+    descriptor, compressed_path = tempfile.mkstemp(dir=directory, suffix="-" + name)
+    os.close(descriptor)
+    try:
+        with open(file_path, "rb") as source, open(compressed_path, "wb") as f:
+            with _open_compressed(f, method) as target:
+                shutil.copyfileobj(source, target, COPY_BLOCK_SIZE)
+    except BaseException:
+        os.remove(compressed_path)
+        raise
+
+    if os.path.getsize(compressed_path) >= os.path.getsize(file_path):
+        os.remove(compressed_path)
+        return None
+    return compressed_path
+
+
+class Compressor(object):
+    """Compresses files in a pool of processes, into a temporary spool folder."""
+
+    def __init__(self, method: str, max_workers: Optional[int] = None):
+        if method not in COMPRESSION_METHODS:
+            raise ValueError(
+                f"Unknown compression method {method}, use one of {', '.join(COMPRESSION_METHODS)}."
+            )
+        self._method = method
+        self._directory = tempfile.mkdtemp(prefix="arcsecond-spool-")
+        self._executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    @property
+    def method(self) -> str:
+        return self._method
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def submit(self, file_path) -> Future:
+        """Start compressing a file. The future result is the compressed file path, or None."""
+        if not is_compressible(file_path):
+            future = Future()
+            future.set_result(None)
+            return future
+        return self._executor.submit(
+            compress_file, str(file_path), self._method, self._directory
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_compressed_name(file_name: str, compressed_path) -> str:
+    """Return the name under which a compressed file is uploaded."""
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if str(compressed_path).endswith(suffix):
+            return file_name + suffix
+    return file_name
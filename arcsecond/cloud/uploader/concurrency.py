@@ -0,0 +1,174 @@
+"""
+Adaptive number of parallel uploads (`--jobs auto`).
+
+The best number of parallel uploads depends on the link: a few on a slow or
+shared one, many more on fibre. The `ConcurrencyController` adapts it while
+uploading, the way TCP adapts its window (AIMD: additive increase,
+multiplicative decrease):
+
+- the uploads are measured: size and time spent in `_perform_upload`, and
+  whether they had to be retried or failed;
+- every round (as many uploads completed as the current limit), the aggregate
+  throughput of the round is compared with the one of the previous round, and
+  its median latency (seconds per MiB, or per request for smaller files) with
+  the lowest seen so far;
+- the limit is raised by one while the throughput keeps improving, and cut by
+  half on errors, retries, or a latency rising well above its lowest value (the
+  link is saturated: requests queue up without any gain).
+
+Every change is logged, with the measures that caused it.
+"""
+
+import statistics
+import threading
+import time
+from typing import Optional
+
+from .logger import get_logger
+from .utils import __get_formatted_bytes_size as _format_bytes
+
+DEFAULT_INITIAL_LIMIT = 2
+DEFAULT_MAX_LIMIT = 16
+# Raise the limit if the throughput of a round improves by more than that.
+THROUGHPUT_GAIN = 0.05
+# Cut the limit if the latency of a round exceeds its lowest value that many times.
+LATENCY_TOLERANCE = 2.0
+DECREASE_FACTOR = 0.5
+# The lowest latency slowly rises, so that a link that got slower for good is not
+# taken as saturated forever.
+BASE_LATENCY_DRIFT = 1.05
+LATENCY_UNIT = 1024 * 1024
+
+
+def _latency(size: int, seconds: float) -> float:
+    """Seconds per MiB, or per request for files under 1 MiB."""
+    return seconds / max(1.0, size / LATENCY_UNIT)
+
+
+class ConcurrencyController(object):
+    """Number of parallel uploads, adapted to the measured throughput and latency (AIMD).
+
+    Workers take a slot with `acquire()` before an upload, and give it back with
+    `release()`, along with the measures of the upload. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = DEFAULT_INITIAL_LIMIT,
+        min_limit: int = 1,
+        max_limit: int = DEFAULT_MAX_LIMIT,
+        throughput_gain: float = THROUGHPUT_GAIN,
+        latency_tolerance: float = LATENCY_TOLERANCE,
+        decrease_factor: float = DECREASE_FACTOR,
+    ):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("limits must satisfy 1 <= min_limit <= max_limit")
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._limit = max(min_limit, min(initial_limit, max_limit))
+        self._throughput_gain = throughput_gain
+        self._latency_tolerance = latency_tolerance
+        self._decrease_factor = decrease_factor
+
+        self._condition = threading.Condition()
+        self._active = 0
+        self._logger = get_logger()
+
+        # Measures of the current round.
+        self._round_started = time.monotonic()
+        self._round_count = 0
+        self._round_bytes = 0
+        self._round_latencies = []
+        self._round_errors = 0
+        self._previous_throughput: Optional[float] = None
+        self._base_latency: Optional[float] = None
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def max_limit(self) -> int:
+        return self._max_limit
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def acquire(self, stop: threading.Event = None) -> bool:
+        """Wait for a free slot. Return False if `stop` was set while waiting."""
+        with self._condition:
+            while self._active >= self._limit:
+                if stop is not None and stop.is_set():
+                    return False
+                self._condition.wait(0.2)
+            self._active += 1
+            return True
+
+    def release(self, size: int = 0, seconds: Optional[float] = None, error=False):
+        """Give back a slot, with the size and time of the upload, and whether it failed or was retried.
+
+        Uploads without time (skipped or not sent) are not measured."""
+        with self._condition:
+            self._active -= 1
+            self._round_count += 1
+            if error:
+                self._round_errors += 1
+            elif seconds is not None and seconds > 0:
+                self._round_bytes += size
+                self._round_latencies.append(_latency(size, seconds))
+            if self._round_errors or self._round_count >= self._limit:
+                self._adjust()
+            self._condition.notify_all()
+
+    def _adjust(self):
+        now = time.monotonic()
+        elapsed = max(now - self._round_started, 1e-6)
+        throughput = self._round_bytes / elapsed
+        latency = (
+            statistics.median(self._round_latencies) if self._round_latencies else None
+        )
+        limit = self._limit
+
+        if self._round_errors:
+            reason = f"{self._round_errors} failed or retried upload(s)"
+            limit = self._decrease(limit)
+        elif None not in (latency, self._base_latency) and latency > (
+            self._base_latency * self._latency_tolerance
+        ):
+            reason = f"latency up from {self._base_latency:.2f}s"
+            limit = self._decrease(limit)
+        elif self._previous_throughput is None:
+            reason = "probing"
+            limit = min(self._max_limit, limit + 1)
+        elif throughput > self._previous_throughput * (1 + self._throughput_gain):
+            reason = "throughput improving"
+            limit = min(self._max_limit, limit + 1)
+        else:
+            reason = "throughput stable"
+
+        if latency is not None:
+            base = latency if self._base_latency is None else self._base_latency
+            self._base_latency = min(latency, base * BASE_LATENCY_DRIFT)
+        if limit >= self._limit:
+            self._previous_throughput = throughput
+        measures = f"throughput {_format_bytes(int(throughput))}/s"
+        if latency is not None:
+            measures += f", latency {latency:.2f}s"
+        message = f"[Concurrency] {measures}, {reason}: "
+        if limit != self._limit:
+            self._logger.info(message + f"{self._limit} -> {limit} parallel upload(s).")
+        else:
+            self._logger.debug(message + f"keeping {limit} parallel upload(s).")
+        self._limit = limit
+
+        self._round_started = now
+        self._round_count = 0
+        self._round_bytes = 0
+        self._round_latencies = []
+        self._round_errors = 0
+
+    def _decrease(self, limit: int) -> int:
+        # The previous throughput was reached with more uploads: it is not a reference anymore.
+        self._previous_throughput = None
+        return max(self._min_limit, int(limit * self._decrease_factor))
@@ -1,7 +1,10 @@
+import threading
 from abc import ABC, abstractmethod
+from pathlib import Path
 
 import click
 
+from arcsecond.api.async_endpoint import AsyncArcsecondAPIEndpoint
 from arcsecond.api.constants import API_AUTH_PATH_VERIFY_PORTAL
 from arcsecond.api.endpoint import ArcsecondAPIEndpoint
 from arcsecond.api.main import ArcsecondAPI
@@ -22,15 +25,28 @@ class BaseUploadContext(ABC):
         self._subdomain = org_subdomain
         self._custom_tags = custom_tags
         self._is_validated = False
+        # Serializes one-off remote preparations (e.g. dataset creation) when
+        # several uploaders share the same context from worker threads.
+        self._lock = threading.RLock()
+        self._journal = None
 
     @property
     def upload_api_endpoint(self):
         raise NotImplementedError()
 
+    @property
+    def async_upload_api_endpoint(self):
+        endpoint = self.upload_api_endpoint
+        return AsyncArcsecondAPIEndpoint(self.config, endpoint.path, endpoint.subdomain)
+
     @property
     def is_validated(self):
         return self._is_validated
 
+    @property
+    def lock(self):
+        return self._lock
+
     @property
     def config(self):
         return self._config
@@ -57,6 +73,28 @@ class BaseUploadContext(ABC):
 
         self._is_validated = True
 
+    def fetch_remote_manifest(self):
+        """Fetch the list of files already uploaded, if the context can tell."""
+        pass
+
+    def is_already_synced(self, file_path: Path) -> bool:
+        """Tell whether a local file is known to be uploaded already, without sending it."""
+        return False
+
+    @property
+    def journal(self):
+        """The upload journal in use, where uploaders keep their resume tokens."""
+        return self._journal
+
+    @journal.setter
+    def journal(self, journal):
+        self._journal = journal
+
+    @property
+    def journal_target(self):
+        """Where files are uploaded to, as recorded in the upload journal. None disables it."""
+        return None
+
     @abstractmethod
     def _validate_context_specific(self):
         """Implement context-specific validations in subclasses"""
@@ -84,9 +122,8 @@ class BaseUploadContext(ABC):
 
     def _validate_remote_organisation(self):
         click.echo(f" • Fetching details of organisation {self._subdomain}...")
-        _, error = ArcsecondAPI(self._config, self._subdomain).organisations.read(
-            self._subdomain
-        )
+        api = ArcsecondAPI(self._config, self._subdomain, cache=True)
+        _, error = api.organisations.read(self._subdomain)
         if error is not None:
             raise UnknownOrganisationError(self._subdomain, str(error))
 
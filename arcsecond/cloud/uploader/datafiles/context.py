@@ -1,9 +1,14 @@
+import os
 import uuid
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
 
 import click
 
 from arcsecond.api import ArcsecondAPIEndpoint
+from arcsecond.cloud.uploader.compression import COMPRESSION_SUFFIXES
 from arcsecond.cloud.uploader.context import BaseUploadContext
+from arcsecond.errors import ArcsecondError
 
 from .errors import (
     InvalidDatasetError,
@@ -37,34 +42,43 @@ class DatasetUploadContext(BaseUploadContext):
         self._is_raw_data = True if is_raw_data is None else is_raw_data
         self._dataset = None
         self._telescope = None
+        # File name -> size (or None if unknown) of the datafiles already in the dataset.
+        self._remote_files = None
 
     @property
     def upload_api_endpoint(self):
         return ArcsecondAPIEndpoint(self.config, "datafiles", self.subdomain)
 
     def _validate_input_dataset_uuid_or_name(self):
-        endpoint = ArcsecondAPIEndpoint(self.config, "datasets", self.subdomain)
+        endpoint = ArcsecondAPIEndpoint(
+            self.config, "datasets", self.subdomain, cache=True
+        )
         try:
             uuid.UUID(self._input_dataset_uuid_or_name)
         except ValueError:
             click.echo(
                 f" • Looking for a dataset with name {self._input_dataset_uuid_or_name}..."
             )
-            datasets_list, error = endpoint.list(
-                **{"name": self._input_dataset_uuid_or_name}
-            )
-            if len(datasets_list) == 0:
-                click.echo(
-                    f" • No dataset with name {self._input_dataset_uuid_or_name} found. It will be created."
-                )
-                self._dataset = {"name": self._input_dataset_uuid_or_name}
-            elif len(datasets_list) == 1:
-                click.echo(
-                    f" • One dataset with name {self._input_dataset_uuid_or_name}. Data will be appended to it."
+            error = None
+            try:
+                datasets_list = list(
+                    endpoint.iter_all(**{"name": self._input_dataset_uuid_or_name})
                 )
-                self._dataset = datasets_list[0]
+            except ArcsecondError as e:
+                error = e
             else:
-                error = f"Multiple datasets with name {self._input_dataset_uuid_or_name} found. Be more specific."
+                if len(datasets_list) == 0:
+                    click.echo(
+                        f" • No dataset with name {self._input_dataset_uuid_or_name} found. It will be created."
+                    )
+                    self._dataset = {"name": self._input_dataset_uuid_or_name}
+                elif len(datasets_list) == 1:
+                    click.echo(
+                        f" • One dataset with name {self._input_dataset_uuid_or_name}. Data will be appended to it."
+                    )
+                    self._dataset = datasets_list[0]
+                else:
+                    error = f"Multiple datasets with name {self._input_dataset_uuid_or_name} found. Be more specific."
         else:
             click.echo(
                 f" • Fetching details of dataset {self._input_dataset_uuid_or_name}..."
@@ -85,7 +99,9 @@ class DatasetUploadContext(BaseUploadContext):
         click.echo(
             f" • Looking for a telescope with UUID {self._input_telescope_uuid}..."
         )
-        endpoint = ArcsecondAPIEndpoint(self.config, "telescopes", self.subdomain)
+        endpoint = ArcsecondAPIEndpoint(
+            self.config, "telescopes", self.subdomain, cache=True
+        )
         self._telescope, error = endpoint.read(self._input_telescope_uuid)
 
         if error is not None:
@@ -149,6 +165,49 @@ class DatasetUploadContext(BaseUploadContext):
         # Forcing Telescope validation and association with Dataset.
         self._validate_telescope_in_dataset()
 
+    def fetch_remote_manifest(self):
+        """Fetch the names and sizes of the datafiles already in the dataset, once."""
+        if self._remote_files is not None:
+            return
+        self._remote_files = {}
+        if not self.dataset_uuid:
+            return  # New dataset, nothing uploaded yet.
+
+        click.echo(f" • Fetching the list of files of dataset {self.dataset_uuid}...")
+        endpoint = ArcsecondAPIEndpoint(self.config, "datafiles", self.subdomain)
+        for datafile in endpoint.iter_all(dataset=self.dataset_uuid):
+            name = _get_datafile_name(datafile)
+            if name:
+                self._remote_files[name] = datafile.get("size") or datafile.get(
+                    "file_size"
+                )
+        click.echo(f" • {len(self._remote_files)} file(s) already in the dataset.")
+
+    def is_already_synced(self, file_path: Path) -> bool:
+        if not self._remote_files:
+            return False
+        if file_path.name not in self._remote_files:
+            # Maybe uploaded compressed, whose size cannot be compared.
+            return any(
+                file_path.name + suffix in self._remote_files
+                for suffix in COMPRESSION_SUFFIXES.values()
+            )
+        remote_size = self._remote_files[file_path.name]
+        if remote_size is None:
+            return True
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            # Removed in the meantime (e.g. while watching): its upload will tell.
+            return False
+        # A same-named file of another size is left to the server to judge.
+        return remote_size == size
+
+    @property
+    def journal_target(self):
+        # The input, rather than the UUID of a dataset that may not exist yet.
+        return f"dataset:{self._input_dataset_uuid_or_name}"
+
     @property
     def dataset_uuid(self):
         return self._dataset.get("uuid", "") if self._dataset else ""
@@ -175,3 +234,10 @@ class DatasetUploadContext(BaseUploadContext):
     @property
     def is_raw_data(self):
         return self._is_raw_data
+
+
+def _get_datafile_name(datafile):
+    name = datafile.get("file_name") or datafile.get("filename")
+    if not name and datafile.get("file"):
+        name = os.path.basename(unquote(urlsplit(datafile["file"]).path))
+    return name or None
@@ -49,3 +49,11 @@ class MissingTelescopeError(ArcsecondError):
         if error_string:
             msg += f"\n{error_string}"
         super().__init__(msg)
+
+
+class InvalidUploadRulesError(ArcsecondError):
+    def __init__(self, source, error_string=""):
+        msg = f"Invalid upload rules in {source}."
+        if error_string:
+            msg += f"\n{error_string}"
+        super().__init__(msg)
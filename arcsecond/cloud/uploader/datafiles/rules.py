@@ -0,0 +1,415 @@
+"""
+Rules giving the tags and the raw flag of each data file, from its header.
+
+Rules are read from a YAML file (if PyYAML is installed) or an INI file. Every
+rule whose conditions all match the header of a file adds its tags to the file
+(on top of the custom tags of the context), and sets its raw flag if it has
+one (the last matching rule wins). A condition lists patterns for a header
+key, and matches if any of them does: case-insensitive globs (`light*`),
+numbers (`300`) or comparisons (`>= 60`, `< -5`). A rule without conditions
+matches every file.
+
+With a `calibration` section, calibration frames are also grouped: frames
+whose IMAGETYP matches a frame type (bias, dark, flat by default) are tagged
+with their type, and with a group tag made of the values of the grouping keys
+(EXPTIME, FILTER, CCD-TEMP by default), such as
+`calib:dark/EXPTIME=300/FILTER=Ha/CCD-TEMP=-10`. Values can be rounded, so
+that frames taken at -10.2 and -9.9 degrees end in the same group.
+
+In YAML:
+
+    calibration:
+      keys: [EXPTIME, FILTER, CCD-TEMP]
+      frames: {bias: ["*bias*", "*zero*"], dark: ["*dark*"], flat: ["*flat*"]}
+      round: {CCD-TEMP: 1}
+    rules:
+      - name: Ha science
+        match: {IMAGETYP: "light*", FILTER: [Ha, H-alpha]}
+        tags: [science, Ha]
+        is_raw: true
+
+In INI, with one `[rule <name>]` section per rule:
+
+    [calibration]
+    keys = EXPTIME, FILTER, CCD-TEMP
+    round.CCD-TEMP = 1
+
+    [rule Ha science]
+    match.IMAGETYP = light*
+    match.FILTER = Ha, H-alpha
+    tags = science, Ha
+    is_raw = true
+
+Rules are applied to a `HeaderTable` column by column: each condition is
+tested once per distinct value of its column, not once per file.
+"""
+
+import configparser
+import fnmatch
+import operator
+import re
+from pathlib import Path
+
+from arcsecond.cloud.uploader.metadata import HeaderTable
+
+from .errors import InvalidUploadRulesError
+
+DEFAULT_GROUP_KEYS = ("EXPTIME", "FILTER", "CCD-TEMP")
+DEFAULT_FRAME_TYPES = {
+    "bias": ["*bias*", "*zero*"],
+    "dark": ["*dark*"],
+    "flat": ["*flat*"],
+}
+DEFAULT_ROUNDING = {"CCD-TEMP": 1.0}
+DEFAULT_GROUP_TAG_PREFIX = "calib"
+
+_COMPARISONS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+_COMPARISON_RE = re.compile(r"^(<=|>=|==|!=|<|>)\s*(\S+)$")
+_TRUE_VALUES = ("true", "yes", "on", "1")
+_FALSE_VALUES = ("false", "no", "off", "0")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _to_float(text: str):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _compile_pattern(pattern):
+    """Return a function telling whether a header value matches a pattern."""
+    if isinstance(pattern, bool):
+        return lambda value: value is pattern
+    if _is_number(pattern):
+        return lambda value: _is_number(value) and value == pattern
+
+    pattern = str(pattern).strip()
+    comparison = _COMPARISON_RE.match(pattern)
+    if comparison:
+        compare = _COMPARISONS[comparison.group(1)]
+        threshold = _to_float(comparison.group(2))
+        if threshold is None:
+            raise ValueError(f"Invalid number in condition {pattern}.")
+        return lambda value: _is_number(value) and compare(value, threshold)
+
+    number = _to_float(pattern)
+    pattern = pattern.lower()
+
+    def _matches(value):
+        if value is None:
+            return False
+        if number is not None and _is_number(value):
+            return value == number
+        return fnmatch.fnmatchcase(str(value).strip().lower(), pattern)
+
+    return _matches
+
+
+def _map_column(function, column: list) -> list:
+    """Apply a function to the values of a column, calling it once per distinct value."""
+    results = {}
+    mapped = []
+    for value in column:
+        # 1, 1.0 and True are equal keys otherwise.
+        key = (type(value), value)
+        if key not in results:
+            results[key] = function(value)
+        mapped.append(results[key])
+    return mapped
+
+
+def _to_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(",") if item.strip()]
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _to_bool(value):
+    if value is None or isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in _TRUE_VALUES:
+        return True
+    if str(value).strip().lower() in _FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid raw flag {value}, use true or false.")
+
+
+def _format_value(value) -> str:
+    if _is_number(value):
+        return f"{value:g}"
+    return str(value).strip()
+
+
+class UploadRule(object):
+    def __init__(self, name: str, match: dict = None, tags=None, is_raw=None):
+        self._name = name
+        self._conditions = []
+        for key, patterns in (match or {}).items():
+            tests = [_compile_pattern(p) for p in _to_list(patterns)]
+            self._conditions.append(
+                (str(key).upper(), lambda v, t=tests: any(test(v) for test in t))
+            )
+        self._tags = [str(t).strip() for t in _to_list(tags)]
+        if any(t.startswith("arcsecond") for t in self._tags):
+            raise ValueError('Tags must not start with "arcsecond".')
+        self._is_raw = _to_bool(is_raw)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def tags(self) -> list:
+        return self._tags
+
+    @property
+    def is_raw(self):
+        return self._is_raw
+
+    def mask(self, headers: HeaderTable) -> list:
+        """Return whether the rule matches, for each file of the table."""
+        mask = [True] * len(headers)
+        for key, matches in self._conditions:
+            column_mask = _map_column(matches, headers.column(key))
+            mask = [a and b for a, b in zip(mask, column_mask)]
+        return mask
+
+
+class CalibrationGrouping(object):
+    def __init__(
+        self,
+        keys=DEFAULT_GROUP_KEYS,
+        frames: dict = None,
+        rounding: dict = None,
+        tag_prefix: str = DEFAULT_GROUP_TAG_PREFIX,
+    ):
+        self._keys = [str(key).upper() for key in _to_list(keys)]
+        self._frames = [
+            (str(frame), [_compile_pattern(p) for p in _to_list(patterns)])
+            for frame, patterns in (frames or DEFAULT_FRAME_TYPES).items()
+        ]
+        rounding = DEFAULT_ROUNDING if rounding is None else rounding
+        self._rounding = {str(k).upper(): float(v) for k, v in rounding.items()}
+        self._tag_prefix = tag_prefix
+
+    def get_tags(self, headers: HeaderTable) -> list:
+        """Return the tags of each file of the table: its frame type and group, if a calibration frame."""
+
+        def _get_frame(value):
+            for frame, tests in self._frames:
+                if any(test(value) for test in tests):
+                    return frame
+            return None
+
+        frames = _map_column(_get_frame, headers.column("IMAGETYP"))
+        columns = [
+            [self._round(key, value) for value in headers.column(key)]
+            for key in self._keys
+        ]
+        tags = []
+        for position, frame in enumerate(frames):
+            if frame is None:
+                tags.append([])
+                continue
+            group = f"{self._tag_prefix}:{frame}"
+            for key, column in zip(self._keys, columns):
+                if column[position] is not None:
+                    group += f"/{key}={_format_value(column[position])}"
+            tags.append([frame, group])
+        return tags
+
+    def _round(self, key: str, value):
+        step = self._rounding.get(key)
+        if not step or not _is_number(value):
+            return value
+        # Adding 0.0 turns -0.0 into 0.0.
+        return round(value / step) * step + 0.0
+
+
+class UploadRules(object):
+    def __init__(self, rules=(), calibration: CalibrationGrouping = None):
+        self._rules = list(rules)
+        self._calibration = calibration
+
+    @classmethod
+    def from_dict(cls, data: dict, source="rules") -> "UploadRules":
+        """Build rules from the content of a rules file, raising InvalidUploadRulesError if invalid."""
+        if not isinstance(data, dict):
+            raise InvalidUploadRulesError(source, "Expected a mapping at the top.")
+        unknown = set(data) - {"rules", "calibration"}
+        if unknown:
+            raise InvalidUploadRulesError(
+                source, f"Unknown entries: {', '.join(sorted(unknown))}."
+            )
+
+        rules = []
+        for index, rule in enumerate(data.get("rules") or [], start=1):
+            if not isinstance(rule, dict):
+                raise InvalidUploadRulesError(source, f"Rule {index} is not a mapping.")
+            name = str(rule.get("name", f"rule {index}"))
+            unknown = set(rule) - {"name", "match", "tags", "is_raw"}
+            if unknown:
+                raise InvalidUploadRulesError(
+                    source, f"Unknown entries in {name}: {', '.join(sorted(unknown))}."
+                )
+            if not isinstance(rule.get("match") or {}, dict):
+                raise InvalidUploadRulesError(
+                    source, f"Conditions of {name} are not a mapping."
+                )
+            try:
+                rules.append(
+                    UploadRule(
+                        name, rule.get("match"), rule.get("tags"), rule.get("is_raw")
+                    )
+                )
+            except ValueError as error:
+                raise InvalidUploadRulesError(source, f"In {name}: {error}")
+
+        calibration = data.get("calibration")
+        if calibration is not None:
+            if not isinstance(calibration, dict):
+                raise InvalidUploadRulesError(source, "Calibration is not a mapping.")
+            unknown = set(calibration) - {"keys", "frames", "round", "tag_prefix"}
+            if unknown:
+                raise InvalidUploadRulesError(
+                    source,
+                    f"Unknown entries in calibration: {', '.join(sorted(unknown))}.",
+                )
+            try:
+                calibration = CalibrationGrouping(
+                    calibration.get("keys", DEFAULT_GROUP_KEYS),
+                    calibration.get("frames"),
+                    calibration.get("round"),
+                    calibration.get("tag_prefix", DEFAULT_GROUP_TAG_PREFIX),
+                )
+            except (ValueError, TypeError, AttributeError) as error:
+                raise InvalidUploadRulesError(source, f"In calibration: {error}")
+
+        return cls(rules, calibration)
+
+    @property
+    def rules(self) -> list:
+        return self._rules
+
+    @property
+    def calibration(self):
+        return self._calibration
+
+    def apply(self, headers: HeaderTable) -> list:
+        """Return the upload arguments of each file of the table (`extra_tags`, `is_raw`), if any."""
+        tags = [[] for _ in range(len(headers))]
+        is_raw = [None] * len(headers)
+        for rule in self._rules:
+            for position, matched in enumerate(rule.mask(headers)):
+                if not matched:
+                    continue
+                tags[position].extend(rule.tags)
+                if rule.is_raw is not None:
+                    is_raw[position] = rule.is_raw
+        if self._calibration is not None:
+            for position, group_tags in enumerate(self._calibration.get_tags(headers)):
+                tags[position].extend(group_tags)
+        return [_get_upload_kwargs(t, r) for t, r in zip(tags, is_raw)]
+
+    def apply_to(self, header: dict) -> dict:
+        """Return the upload arguments of a single file, from its header."""
+        return self.apply(HeaderTable([header]))[0]
+
+    def __len__(self):
+        return len(self._rules)
+
+
+def _get_upload_kwargs(tags: list, is_raw) -> dict:
+    kwargs = {}
+    if tags:
+        kwargs["extra_tags"] = list(dict.fromkeys(tags))
+    if is_raw is not None:
+        kwargs["is_raw"] = str(is_raw)
+    return kwargs
+
+
+def _read_yaml(text: str, source):
+    try:
+        import yaml
+    except ImportError:
+        raise InvalidUploadRulesError(
+            source,
+            "PyYAML is not installed. Run: pip install 'arcsecond[rules]', or use an INI file.",
+        )
+    try:
+        return yaml.safe_load(text) or {}
+    except yaml.YAMLError as error:
+        raise InvalidUploadRulesError(source, str(error))
+
+
+def _get_prefixed(options, prefix: str) -> dict:
+    return {k[len(prefix) :]: v for k, v in options.items() if k.startswith(prefix)}
+
+
+def _read_ini(text: str, source):
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.optionxform = str  # Header keys are case-sensitive.
+    try:
+        parser.read_string(text, source=str(source))
+    except configparser.Error as error:
+        raise InvalidUploadRulesError(source, str(error))
+
+    data = {"rules": []}
+    for section in parser.sections():
+        options = dict(parser[section])
+        if section == "calibration":
+            calibration = {}
+            if "keys" in options:
+                calibration["keys"] = options.pop("keys")
+            if "tag_prefix" in options:
+                calibration["tag_prefix"] = options.pop("tag_prefix")
+            if any(k.startswith("frames.") for k in options):
+                calibration["frames"] = _get_prefixed(options, "frames.")
+            if any(k.startswith("round.") for k in options):
+                calibration["round"] = _get_prefixed(options, "round.")
+            unknown = [k for k in options if not k.startswith(("frames.", "round."))]
+            calibration.update({k: options[k] for k in unknown})
+            data["calibration"] = calibration
+        elif section == "rule" or section.startswith("rule "):
+            rule = {"name": section[5:].strip() or section}
+            if any(k.startswith("match.") for k in options):
+                rule["match"] = _get_prefixed(options, "match.")
+            rule.update(
+                {k: v for k, v in options.items() if not k.startswith("match.")}
+            )
+            data["rules"].append(rule)
+        else:
+            raise InvalidUploadRulesError(source, f"Unknown section [{section}].")
+    return data
+
+
+def load_upload_rules(path) -> UploadRules:
+    """Read upload rules from a .yaml/.yml or .ini file."""
+    path = Path(path)
+    try:
+        text = path.read_text(encoding="utf-8")
+    except OSError as error:
+        raise InvalidUploadRulesError(path, str(error))
+
+    if path.suffix.lower() in (".yaml", ".yml"):
+        data = _read_yaml(text, path)
+    elif path.suffix.lower() in (".ini", ".cfg"):
+        data = _read_ini(text, path)
+    else:
+        raise InvalidUploadRulesError(path, "Use a .yaml, .yml or .ini file.")
+    return UploadRules.from_dict(data, source=path)
@@ -13,7 +13,11 @@ class DatasetFileUploader(BaseFileUploader[DatasetUploadContext]):
         self._logger.info(f"{self.log_prefix} Preparing dataset...")
 
         # If we have a dataset name, check if it exists, if not create it.
-        if not self._context.dataset_uuid:
+        # Parallel uploaders share the context: only the first one creates it.
+        with self._context.lock:
+            if self._context.dataset_uuid:
+                return
+
             dataset_name = self._context.dataset_name
             data = {"name": dataset_name}
             if self._context.telescope_uuid:
@@ -37,6 +41,12 @@ class DatasetFileUploader(BaseFileUploader[DatasetUploadContext]):
                 f"{self.log_prefix} Dataset created with UUID {self._context.dataset_uuid}"
             )
 
+    async def _prepare_upload_async(self):
+        # Avoid a worker thread per file once the dataset exists.
+        if self._context.dataset_uuid:
+            return
+        await super()._prepare_upload_async()
+
     def _get_upload_data(self, **kwargs):
         fields = {
             "dataset": self._context.dataset_uuid,
@@ -57,4 +67,11 @@ class DatasetFileUploader(BaseFileUploader[DatasetUploadContext]):
             # Tags must really be provided only when non-blank/null/empty
             del clean_kwargs["tags"]
         fields.update(**clean_kwargs)
+        # Per-file tags (e.g. from upload rules) come on top of the common ones.
+        extra_tags = [t.strip() for t in kwargs.get("extra_tags") or [] if t.strip()]
+        if extra_tags:
+            tags = fields.get("tags") or []
+            if isinstance(tags, str):
+                tags = [t for t in tags.split(",") if t]
+            fields["tags"] = ",".join(dict.fromkeys(tags + extra_tags))
         return fields
@@ -2,10 +2,10 @@ import pathlib
 
 import click
 
+from arcsecond.cloud.uploader.index import FileIndex
 from arcsecond.cloud.uploader.utils import (
     __get_formatted_bytes_size,
     __get_formatted_size_times,
-    is_file_hidden,
 )
 
 from .context import DatasetUploadContext
@@ -58,6 +58,30 @@ def _display_custom_tags_info(context: DatasetUploadContext):
     click.echo(msg)
 
 
+def _display_rules_info(rules):
+    """Displays the upload rules, if any."""
+    if rules is None:
+        return
+    msg = f" • Tags and raw flag of each file are also given by {len(rules)} upload rule(s)"
+    if rules.calibration is not None:
+        msg += ", and calibration frames are grouped"
+    click.echo(msg + ".")
+
+
+def _display_bandwidth_info(bandwidth):
+    """Displays the upload bandwidth cap, if any."""
+    if bandwidth is None:
+        return
+    click.echo(f" • Upload bandwidth: {bandwidth.schedule}.")
+
+
+def _display_order_info(order):
+    """Displays the upload order, if any."""
+    if order is None:
+        return
+    click.echo(f" • Files are uploaded {order}.")
+
+
 def _display_telescope_info(context: DatasetUploadContext):
     """Displays telescope-related information."""
     if context.telescope:
@@ -75,14 +99,19 @@ def _display_api_server_info(context: DatasetUploadContext):
     )
 
 
-def _display_folders_summary(folders: list):
+def _display_folders_summary(
+    folders: list, file_indexes: list = None, show_volume: bool = True
+):
     """Displays summary information about the folders being uploaded."""
     click.echo(f" • Folder{'s' if len(folders) > 1 else ''}:")
-    for folder in folders:
+    for i, folder in enumerate(folders):
         folder_path = pathlib.Path(folder).expanduser().resolve()
         _display_folder_path(folder_path)
         _display_folder_warning(folder_path)
-        _display_folder_size(folder_path)
+        if not show_volume:
+            continue
+        file_index = file_indexes[i] if file_indexes else FileIndex.build(folder)
+        _display_folder_size(file_index)
 
 
 def _display_folder_path(folder_path: pathlib.Path):
@@ -98,13 +127,9 @@ def _display_folder_warning(folder_path: pathlib.Path):
         click.echo("   >>> Warning: This folder is your HOME folder. <<<")
 
 
-def _display_folder_size(folder_path: pathlib.Path):
-    """Calculates and displays the folder size and estimated upload time."""
-    size = sum(
-        f.stat().st_size
-        for f in folder_path.glob("**/*")
-        if f.is_file() and not is_file_hidden(f)
-    )
+def _display_folder_size(file_index: FileIndex):
+    """Displays the folder size and estimated upload time."""
+    size = file_index.total_size
     click.echo(
         f"   > Volume: {__get_formatted_bytes_size(size)} in total in this folder."
     )
@@ -112,15 +137,29 @@ def _display_folder_size(folder_path: pathlib.Path):
 
 
 def display_upload_datafiles_command_summary(
-    context: DatasetUploadContext, folders: list
+    context: DatasetUploadContext,
+    folders: list,
+    file_indexes: list = None,
+    show_volume: bool = True,
+    rules=None,
+    bandwidth=None,
+    order=None,
 ):
-    """Displays a summary of the upload command."""
+    """Displays a summary of the upload command.
+
+    `file_indexes` are the `FileIndex` of the folders, if already built. Without
+    `show_volume`, folders are not walked to compute their size. `rules` are the
+    upload rules in use, if any, `bandwidth` the `BandwidthLimiter` and `order`
+    the `UploadOrder`."""
     click.echo("\n --- Upload summary --- ")
     _display_user_and_key(context)
     _display_subdomain_info(context)
     _display_dataset_info(context)
     _display_data_type_info(context)
     _display_custom_tags_info(context)
+    _display_rules_info(rules)
+    _display_bandwidth_info(bandwidth)
+    _display_order_info(order)
     _display_telescope_info(context)
     _display_api_server_info(context)
-    _display_folders_summary(folders)
+    _display_folders_summary(folders, file_indexes, show_volume)
@@ -41,3 +41,11 @@ class InvalidOrgMembershipError(ArcsecondError):
         if error_string:
             msg += f"\n{error_string}"
         super().__init__(msg)
+
+
+class InvalidBandwidthScheduleError(ArcsecondError):
+    def __init__(self, source, error_string=""):
+        msg = f"Invalid bandwidth schedule in {source}."
+        if error_string:
+            msg += f"\n{error_string}"
+        super().__init__(msg)
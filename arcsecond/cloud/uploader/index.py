@@ -0,0 +1,246 @@
+import os
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from .constants import Status, Substatus
+from .utils import is_file_hidden
+
+# Names are concatenated by blocks, so that adding files never copies all names.
+NAMES_BLOCK_SIZE = 4096
+
+
+class IndexedFile(object):
+    """View on one file of a `FileIndex`, created on demand."""
+
+    __slots__ = ("_index", "_position")
+
+    def __init__(self, index: "FileIndex", position: int):
+        self._index = index
+        self._position = position
+
+    @property
+    def position(self) -> int:
+        return self._position
+
+    @property
+    def name(self) -> str:
+        return self._index.get_name(self._position)
+
+    @property
+    def path(self) -> Path:
+        return self._index.get_path(self._position)
+
+    @property
+    def size(self) -> int:
+        return self._index.sizes[self._position]
+
+    @property
+    def mtime(self) -> float:
+        return self._index.mtimes[self._position]
+
+    @property
+    def inode(self) -> int:
+        return self._index.inodes[self._position]
+
+    @property
+    def status(self):
+        return self._index.get_status(self._position)
+
+    @property
+    def error(self):
+        return self._index.get_error(self._position)
+
+    def __repr__(self):
+        return f"<IndexedFile {self.path} ({self.size} bytes)>"
+
+
+class FileIndex(object):
+    """
+    The regular files of a folder tree, collected in a single pass.
+
+    The tree is walked with `os.scandir`, whose entries carry their type and
+    stat information, and hidden files and folders are pruned without being
+    descended into. The index is then shared by the upload summary, the
+    duplicate names check and the upload loop.
+
+    Millions of files must fit in memory, so nothing is stored per file as a
+    Python object: folders are interned once, file names are concatenated in
+    blocks of strings, and sizes, mtimes, inodes and upload statuses are kept in
+    typed arrays. `IndexedFile` views are created on demand.
+
+    Files can be added by a discovery thread (see `scan()`) while others read
+    the index and update statuses.
+    """
+
+    def __init__(self, root_path: Path):
+        self._root_path = root_path
+        self._lock = threading.Lock()
+        self._folders = []
+        self._folder_ids = {}
+        self._file_folders = array("L")
+        self._name_blocks = []
+        self._pending_names = []  # Names of the last, incomplete block
+        self._name_offsets = array("Q", [0])
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        self.inodes = array("Q")
+        # Index in `_statuses` of the (Status, Substatus) pair of each file.
+        self._status_codes = array("B")
+        self._statuses = [(Status.NEW, Substatus.PENDING)]
+        self._errors = {}  # Only failed files have one.
+
+    @classmethod
+    def create(cls, folder) -> "FileIndex":
+        """Return an empty index of a folder (or of the folder of a file), to be `scan()`-ed."""
+        root_path = Path(folder).expanduser().resolve()
+        if root_path.is_file():  # Just in case we pass a file...
+            root_path = root_path.parent
+        return cls(root_path)
+
+    @classmethod
+    def build(cls, folder) -> "FileIndex":
+        file_index = cls.create(folder)
+        for _ in file_index.scan():
+            pass
+        return file_index
+
+    @classmethod
+    def from_paths(cls, file_paths, root_path=None) -> "FileIndex":
+        """Index a given list of files."""
+        file_index = cls(Path(root_path) if root_path else None)
+        for file_path in file_paths:
+            file_index.add(file_path)
+        return file_index
+
+    @property
+    def root_path(self) -> Path:
+        return self._root_path
+
+    @property
+    def paths(self):
+        return [self.get_path(position) for position in range(len(self))]
+
+    @property
+    def total_size(self) -> int:
+        return sum(self.sizes)
+
+    def get_name(self, position: int) -> str:
+        block_id, rank = divmod(position, NAMES_BLOCK_SIZE)
+        with self._lock:
+            if block_id == len(self._name_blocks):
+                return self._pending_names[rank]
+            block = self._name_blocks[block_id]
+        base = self._name_offsets[block_id * NAMES_BLOCK_SIZE]
+        start, end = self._name_offsets[position], self._name_offsets[position + 1]
+        return block[start - base : end - base]
+
+    def get_path(self, position: int) -> Path:
+        folder = self._folders[self._file_folders[position]]
+        return Path(folder, self.get_name(position))
+
+    def get_duplicate_names(self):
+        names = Counter(self.get_name(position) for position in range(len(self)))
+        return [name for name, count in names.items() if count > 1]
+
+    def get_status(self, position: int):
+        return self._statuses[self._status_codes[position]]
+
+    def get_error(self, position: int):
+        return self._errors.get(position)
+
+    def set_status(self, position: int, status, substatus, error=None):
+        pair = (status, substatus)
+        with self._lock:
+            if pair not in self._statuses:
+                self._statuses.append(pair)
+            self._status_codes[position] = self._statuses.index(pair)
+            if error is not None:
+                self._errors[position] = error
+            else:
+                self._errors.pop(position, None)
+
+    def count_status(self, status) -> int:
+        codes = [i for i, pair in enumerate(self._statuses) if pair[0] == status]
+        return sum(self._status_codes.count(code) for code in codes)
+
+    def iter_positions(self, status=None):
+        """Yield the positions of the files, optionally only those with a given status."""
+        for position in range(len(self)):
+            if status is None or self.get_status(position)[0] == status:
+                yield position
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __getitem__(self, position: int) -> IndexedFile:
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return IndexedFile(self, position)
+
+    def __iter__(self):
+        return (IndexedFile(self, position) for position in range(len(self)))
+
+    def _add(self, folder: str, name: str, stat) -> int:
+        with self._lock:
+            folder_id = self._folder_ids.get(folder)
+            if folder_id is None:
+                folder_id = len(self._folders)
+                self._folders.append(folder)
+                self._folder_ids[folder] = folder_id
+            self._file_folders.append(folder_id)
+            self._pending_names.append(name)
+            if len(self._pending_names) == NAMES_BLOCK_SIZE:
+                self._name_blocks.append("".join(self._pending_names))
+                self._pending_names = []
+            self._name_offsets.append(self._name_offsets[-1] + len(name))
+            self.mtimes.append(stat.st_mtime)
+            self.inodes.append(stat.st_ino)
+            self._status_codes.append(0)
+            # Last, as it tells the length of the index.
+            self.sizes.append(stat.st_size)
+            return len(self.sizes) - 1
+
+    def add(self, file_path) -> int:
+        """Add a single file (e.g. a new one, found by a watcher). Return its position."""
+        stat = os.stat(file_path)
+        folder, name = os.path.split(str(file_path))
+        return self._add(folder, name, stat)
+
+    def update(self, position: int):
+        """Read again the size and mtime of a file (e.g. found while still being written)."""
+        stat = os.stat(self.get_path(position))
+        with self._lock:
+            self.sizes[position] = stat.st_size
+            self.mtimes[position] = stat.st_mtime
+            self.inodes[position] = stat.st_ino
+
+    def scan(self):
+        """Walk the folder tree, adding its files to the index. Yield their positions."""
+        if is_file_hidden(self._root_path):
+            return
+        # Sorted, depth-first, so that files come in a stable order between runs.
+        stack = [str(self._root_path)]
+        while stack:
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue  # Unreadable folder
+            sub_folders = []
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_folders.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Broken symlink, or file removed in the meantime
+                yield self._add(folder, entry.name, stat)
+            stack.extend(reversed(sub_folders))
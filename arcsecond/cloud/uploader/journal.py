@@ -0,0 +1,207 @@
+"""
+Local journal of uploads, to resume an interrupted upload without starting over.
+
+Each uploaded file is recorded in a small SQLite database under the config
+folder, keyed by (api_name, subdomain, target, path, size, mtime), where the
+target is the dataset (or camera) files are uploaded to. A file modified since
+its upload has another size or mtime, hence another key, and is uploaded again.
+
+Results are written by batches, in a single transaction, and the database uses
+WAL mode, so that parallel upload workers do not wait for the disk. A crash can
+lose the last, unwritten batch: these files are uploaded again on resume, and
+reported as already synced by the server.
+
+The journal also keeps the resume tokens of chunked uploads in progress (see
+`chunked.py`), written immediately as they are few.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from arcsecond.api.config import ArcsecondConfig
+
+from .constants import Status, Substatus
+
+JOURNAL_FILENAME = "uploads.sqlite3"
+
+# Results kept in memory before being written, and for how long at most.
+JOURNAL_BATCH_SIZE = 64
+JOURNAL_FLUSH_INTERVAL = 2.0
+
+# Uploaded files, and files the server already has, need not be uploaded again.
+# Files skipped locally (e.g. without DATE-OBS) are recorded too, but are not
+# completed: a later run whose options do not skip them uploads them.
+SYNCED_RESULT = (Status.SKIPPED, Substatus.ALREADY_SYNCED)
+
+KEY_CONDITION = "api_name = ? AND subdomain = ? AND target = ? AND path = ? AND size = ? AND mtime = ?"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    api_name TEXT NOT NULL,
+    subdomain TEXT NOT NULL,
+    target TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    status TEXT NOT NULL,
+    substatus TEXT NOT NULL,
+    file_id TEXT,
+    error TEXT,
+    started REAL,
+    finished REAL,
+    PRIMARY KEY (api_name, subdomain, target, path, size, mtime)
+);
+CREATE TABLE IF NOT EXISTS resume_tokens (
+    api_name TEXT NOT NULL,
+    subdomain TEXT NOT NULL,
+    target TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    token TEXT NOT NULL,
+    PRIMARY KEY (api_name, subdomain, target, path, size, mtime)
+);
+"""
+
+
+class UploadJournal(object):
+    def __init__(
+        self,
+        path: Path,
+        api_name: str,
+        subdomain: Optional[str],
+        target: str,
+        batch_size: int = JOURNAL_BATCH_SIZE,
+        flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+    ):
+        self._path = Path(path)
+        self._scope = (api_name, subdomain or "", target)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._pending = []
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        # Workers share the connection, access is serialized by the lock.
+        self._connection = sqlite3.connect(
+            str(self._path), timeout=30, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def record(
+        self,
+        file_path,
+        size: int,
+        mtime: float,
+        result,
+        file_id=None,
+        started: Optional[float] = None,
+        finished: Optional[float] = None,
+    ):
+        """Record the result of the upload of a file. It is written with the next batch."""
+        status, substatus, error = result
+        row = self._scope + (
+            str(file_path),
+            size,
+            mtime,
+            status.name,
+            substatus.name,
+            None if file_id is None else str(file_id),
+            None if error is None else str(error),
+            started,
+            finished,
+        )
+        with self._lock:
+            self._pending.append(row)
+            if (
+                len(self._pending) >= self._batch_size
+                or time.monotonic() - self._flushed >= self._flush_interval
+            ):
+                self._flush()
+
+    def get_result(self, file_path, size: int, mtime: float):
+        """Return the last recorded (Status, Substatus) of a file, or None."""
+        query = f"SELECT status, substatus FROM uploads WHERE {KEY_CONDITION}"
+        with self._lock:
+            self._flush()
+            row = self._connection.execute(
+                query, self._scope + (str(file_path), size, mtime)
+            ).fetchone()
+        if row is None:
+            return None
+        return Status[row[0]], Substatus[row[1]]
+
+    def is_completed(self, file_path, size: int, mtime: float) -> bool:
+        result = self.get_result(file_path, size, mtime)
+        return result is not None and (
+            result[0] == Status.OK or result == SYNCED_RESULT
+        )
+
+    def get_resume_token(self, file_path, size: int, mtime: float):
+        query = f"SELECT token FROM resume_tokens WHERE {KEY_CONDITION}"
+        with self._lock:
+            row = self._connection.execute(
+                query, self._scope + (str(file_path), size, mtime)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_resume_token(self, file_path, size: int, mtime: float, token=None):
+        """Store the resume token of a chunked upload, or delete it if None."""
+        key = self._scope + (str(file_path), size, mtime)
+        with self._lock, self._connection:
+            if token is None:
+                query = f"DELETE FROM resume_tokens WHERE {KEY_CONDITION}"
+                self._connection.execute(query, key)
+            else:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO resume_tokens VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    key + (str(token),),
+                )
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._connection.close()
+
+    def _flush(self):
+        self._flushed = time.monotonic()
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._pending,
+            )
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_upload_journal(context, path: Path = None) -> Optional[UploadJournal]:
+    """Open the journal of the uploads of a context, or None if its uploads cannot be journaled."""
+    target = context.journal_target
+    api_name = context.config.api_name
+    if not target or not isinstance(api_name, str):
+        return None
+    if path is None:
+        path = ArcsecondConfig.dir_path() / JOURNAL_FILENAME
+    return UploadJournal(path, api_name, context.subdomain, target)
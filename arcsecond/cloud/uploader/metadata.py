@@ -0,0 +1,376 @@
+"""
+Header-only metadata of FITS and XISF files.
+
+Only the headers are read: the 2880-byte blocks of a FITS file up to its `END`
+card, or the XML header of a XISF file, never the pixel data. Headers of
+compressed files (`.fits.gz`, `.fits.bz2`) are read by decompressing their
+first blocks only. A few keys are kept (see `METADATA_KEYS`), with their usual
+aliases normalised (`IMAGTYP` and `FRAME` give `IMAGETYP`, `EXPOSURE` gives
+`EXPTIME`).
+
+Headers of many files are read by a pool of processes, and kept in a cache
+keyed by (path, size, mtime), so that the next walks of the same folder do not
+even open the files. The headers of a `FileIndex` are returned as a
+`HeaderTable`, with one column per key, to skip, tag or order files before
+anything is sent.
+"""
+
+import bz2
+import gzip
+import io
+import json
+import sqlite3
+import struct
+import threading
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from arcsecond.api.config import ArcsecondConfig
+
+from .constants import get_all_fits_extensions, get_all_xisf_extensions
+from .index import FileIndex
+
+METADATA_KEYS = (
+    "DATE-OBS",
+    "DATE",
+    "MJD-OBS",
+    "OBJECT",
+    "IMAGETYP",
+    "FILTER",
+    "EXPTIME",
+    "CCD-TEMP",
+    "SET-TEMP",
+    "XBINNING",
+    "YBINNING",
+    "GAIN",
+    "OFFSET",
+    "TELESCOP",
+    "INSTRUME",
+    "BITPIX",
+)
+# NAXIS, NAXIS1, NAXIS2... are kept as well.
+METADATA_KEY_PREFIXES = ("NAXIS",)
+KEY_ALIASES = {"IMAGTYP": "IMAGETYP", "FRAME": "IMAGETYP", "EXPOSURE": "EXPTIME"}
+
+FITS_BLOCK_SIZE = 2880
+FITS_CARD_SIZE = 80
+# Headers are not expected to be longer than that (1000 cards).
+FITS_MAX_HEADER_BLOCKS = 28
+
+XISF_SIGNATURE = b"XISF0100"
+XISF_PROPERTIES = {
+    "Observation:Time:Start": "DATE-OBS",
+    "Observation:Object:Name": "OBJECT",
+    "Instrument:Filter:Name": "FILTER",
+    "Instrument:ExposureTime": "EXPTIME",
+    "Instrument:Sensor:Temperature": "CCD-TEMP",
+}
+
+# Under that number of files to read, a pool of processes is not worth it.
+PARALLEL_READ_THRESHOLD = 64
+READ_CHUNK_SIZE = 256
+
+METADATA_CACHE_FILENAME = "metadata.sqlite3"
+METADATA_CACHE_BATCH_SIZE = 512
+
+_FITS_EXTENSIONS = tuple(get_all_fits_extensions())
+_XISF_EXTENSIONS = tuple(get_all_xisf_extensions())
+
+
+def is_fits_file(file_path) -> bool:
+    return str(file_path).lower().endswith(_FITS_EXTENSIONS)
+
+
+def is_xisf_file(file_path) -> bool:
+    return str(file_path).lower().endswith(_XISF_EXTENSIONS)
+
+
+def is_data_file(file_path) -> bool:
+    return is_fits_file(file_path) or is_xisf_file(file_path)
+
+
+def _open(file_path):
+    name = str(file_path).lower()
+    if name.endswith(".gz"):
+        return gzip.open(file_path, "rb")
+    if name.endswith(".bz2"):
+        return bz2.open(file_path, "rb")
+    return open(file_path, "rb")
+
+
+def _is_kept(key: str) -> bool:
+    return key in METADATA_KEYS or key.startswith(METADATA_KEY_PREFIXES)
+
+
+def _keep(metadata: dict, key: str, value):
+    key = KEY_ALIASES.get(key, key)
+    if _is_kept(key) and value is not None:
+        metadata.setdefault(key, value)
+
+
+def parse_fits_value(raw: str):
+    """Return the value of the value/comment part of a FITS card."""
+    raw = raw.strip()
+    if raw.startswith("'"):
+        # Quotes inside strings are doubled.
+        end = 1
+        while True:
+            end = raw.find("'", end)
+            if end == -1 or raw[end + 1 : end + 2] != "'":
+                break
+            end += 2
+        return raw[1:end].replace("''", "'").rstrip() or None
+    raw = raw.split("/", 1)[0].strip()
+    if raw in ("T", "F"):
+        return raw == "T"
+    if not raw:
+        return None
+    for cast in (int, float):
+        try:
+            return cast(raw.replace("D", "E") if cast is float else raw)
+        except ValueError:
+            pass
+    return raw
+
+
+def _read_fits_cards(f) -> dict:
+    metadata = {}
+    for index in range(FITS_MAX_HEADER_BLOCKS):
+        block = f.read(FITS_BLOCK_SIZE)
+        if len(block) < FITS_BLOCK_SIZE:
+            return metadata
+        if index == 0 and not block.startswith(b"SIMPLE  ="):
+            return metadata
+        for start in range(0, FITS_BLOCK_SIZE, FITS_CARD_SIZE):
+            card = block[start : start + FITS_CARD_SIZE].decode("ascii", "replace")
+            key = card[:8].rstrip()
+            if key == "END":
+                return metadata
+            if card[8:10] == "= " and _is_kept(KEY_ALIASES.get(key, key)):
+                _keep(metadata, key, parse_fits_value(card[10:]))
+    return metadata
+
+
+def read_fits_header(file_path) -> dict:
+    """Return the metadata found in the primary header of a FITS file ({} if it is not one)."""
+    with _open(file_path) as f:
+        return _read_fits_cards(f)
+
+
+def parse_fits_header(data: bytes) -> dict:
+    """Return the metadata found in the primary header of FITS content already in memory."""
+    return _read_fits_cards(io.BytesIO(data))
+
+
+def read_xisf_header(file_path) -> dict:
+    """Return the metadata found in the XML header of a XISF file ({} if it is not one)."""
+    metadata = {}
+    with _open(file_path) as f:
+        preamble = f.read(16)
+        if len(preamble) < 16 or not preamble.startswith(XISF_SIGNATURE):
+            return metadata
+        (length,) = struct.unpack("<I", preamble[8:12])
+        root = ElementTree.fromstring(f.read(length))
+
+    for element in root.iter():
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "FITSKeyword":
+            key = element.get("name", "").strip()
+            _keep(metadata, key, parse_fits_value(element.get("value", "")))
+        elif tag == "Property" and element.get("id") in XISF_PROPERTIES:
+            value = parse_fits_value(element.get("value", ""))
+            if isinstance(value, str):
+                value = element.get("value").strip()
+            _keep(metadata, XISF_PROPERTIES[element.get("id")], value)
+        elif tag == "Image" and "NAXIS" not in metadata:
+            geometry = [int(n) for n in element.get("geometry", "").split(":") if n]
+            if geometry:
+                metadata["NAXIS"] = len(geometry)
+                for axis, length in enumerate(geometry, start=1):
+                    metadata[f"NAXIS{axis}"] = length
+    return metadata
+
+
+def read_header(file_path) -> dict:
+    """Return the metadata of a FITS or XISF file, or {} if there is none or it cannot be read."""
+    try:
+        if is_fits_file(file_path):
+            return read_fits_header(file_path)
+        if is_xisf_file(file_path):
+            return read_xisf_header(file_path)
+    except (OSError, EOFError, ValueError, ElementTree.ParseError):
+        pass
+    return {}
+
+
+def read_headers(file_paths) -> list:
+    """Read the headers of a chunk of files. Runs in the processes of the pool."""
+    return [read_header(file_path) for file_path in file_paths]
+
+
+class MetadataCache(object):
+    """Headers of the files already read, keyed by (path, size, mtime), in a SQLite database."""
+
+    def __init__(self, path: Path, batch_size: int = METADATA_CACHE_BATCH_SIZE):
+        self._path = Path(path)
+        self._batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(
+            str(self._path), timeout=30, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS headers (path TEXT NOT NULL, size INTEGER NOT NULL, "
+                "mtime REAL NOT NULL, metadata TEXT NOT NULL, PRIMARY KEY (path, size, mtime))"
+            )
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def get(self, file_path, size: int, mtime: float) -> Optional[dict]:
+        with self._lock:
+            self._flush()
+            row = self._connection.execute(
+                "SELECT metadata FROM headers WHERE path = ? AND size = ? AND mtime = ?",
+                (str(file_path), size, mtime),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, file_path, size: int, mtime: float, metadata: dict):
+        with self._lock:
+            self._pending.append((str(file_path), size, mtime, json.dumps(metadata)))
+            if len(self._pending) >= self._batch_size:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._connection.close()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO headers VALUES (?, ?, ?, ?)", self._pending
+            )
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class HeaderTable(object):
+    """Metadata of the files of an index, by columns: one list of values (or None) per key."""
+
+    def __init__(self, rows: list):
+        keys = sorted({key for row in rows for key in row})
+        self._length = len(rows)
+        self._columns = {key: [row.get(key) for row in rows] for key in keys}
+
+    @property
+    def keys(self):
+        return list(self._columns)
+
+    def column(self, key: str) -> list:
+        if key not in self._columns:
+            return [None] * self._length
+        return self._columns[key]
+
+    def row(self, position: int) -> dict:
+        return {
+            key: values[position]
+            for key, values in self._columns.items()
+            if values[position] is not None
+        }
+
+    def __len__(self):
+        return self._length
+
+
+class MetadataExtractor(object):
+    """Reads the metadata of files, through the cache if any."""
+
+    def __init__(self, cache: MetadataCache = None, max_workers: Optional[int] = None):
+        self._cache = cache
+        self._max_workers = max_workers
+
+    def read(self, file_path, size: int, mtime: float) -> dict:
+        """Return the metadata of a single file, from the cache if possible."""
+        if not is_data_file(file_path):
+            return {}
+        metadata = self._cache.get(file_path, size, mtime) if self._cache else None
+        if metadata is None:
+            metadata = read_header(file_path)
+            if self._cache is not None:
+                self._cache.put(file_path, size, mtime, metadata)
+        return metadata
+
+    def read_index(self, file_index: FileIndex) -> HeaderTable:
+        """Return the metadata of all the files of an index, reading the missing ones in parallel."""
+        rows = [{} for _ in range(len(file_index))]
+        missing = []
+        for position in range(len(file_index)):
+            file_path = file_index.get_path(position)
+            if not is_data_file(file_path):
+                continue
+            metadata = None
+            if self._cache is not None:
+                metadata = self._cache.get(
+                    file_path, file_index.sizes[position], file_index.mtimes[position]
+                )
+            if metadata is None:
+                missing.append(position)
+            else:
+                rows[position] = metadata
+
+        file_paths = [str(file_index.get_path(position)) for position in missing]
+        for position, file_path, metadata in zip(
+            missing, file_paths, self._read_all(file_paths)
+        ):
+            rows[position] = metadata
+            if self._cache is not None:
+                self._cache.put(
+                    file_path,
+                    file_index.sizes[position],
+                    file_index.mtimes[position],
+                    metadata,
+                )
+        if self._cache is not None:
+            self._cache.flush()
+        return HeaderTable(rows)
+
+    def _read_all(self, file_paths):
+        if len(file_paths) < PARALLEL_READ_THRESHOLD:
+            return read_headers(file_paths)
+        chunks = [
+            file_paths[i : i + READ_CHUNK_SIZE]
+            for i in range(0, len(file_paths), READ_CHUNK_SIZE)
+        ]
+        with ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+            return [
+                metadata
+                for chunk in executor.map(read_headers, chunks)
+                for metadata in chunk
+            ]
+
+
+def get_metadata_cache(path: Path = None) -> MetadataCache:
+    if path is None:
+        path = ArcsecondConfig.dir_path() / METADATA_CACHE_FILENAME
+    return MetadataCache(path)
@@ -0,0 +1,129 @@
+"""
+Order in which the files of a walk are uploaded.
+
+By default, files are uploaded in the order they are found. An `UploadOrder`
+gives each file a key instead, and files with the lowest keys are uploaded
+first: the latest frames first for quick-look science, or the smallest files
+first to complete as many files as possible on a quota-limited link.
+
+Files waiting for an upload worker are kept in a heap, so that a file found
+later (while streaming or watching a folder) is uploaded before the waiting
+files with a higher key. Files without any key (e.g. no DATE-OBS in their
+header) are uploaded last, in the order they were found.
+"""
+
+import heapq
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from .index import FileIndex, IndexedFile
+
+
+class _Reversed(object):
+    """Wraps a key to sort it in descending order."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+class UploadOrder(object):
+    """Uploads files by ascending `key(indexed_file, header)` (descending with `reverse`).
+
+    `header` is the FITS or XISF header of data files if `needs_header`, or an
+    empty dict. Files whose key is None are uploaded last.
+    """
+
+    def __init__(
+        self,
+        key: Callable[[IndexedFile, dict], object],
+        needs_header: bool = False,
+        reverse: bool = False,
+        description: str = "in a custom order",
+    ):
+        self._key = key
+        self._needs_header = needs_header
+        self._reverse = reverse
+        self._description = description
+
+    @property
+    def needs_header(self) -> bool:
+        return self._needs_header
+
+    def priority(self, indexed_file: IndexedFile, header: dict = None):
+        """Return the priority of a file in the queue of uploads: the lowest first."""
+        key = self._key(indexed_file, header or {})
+        if key is None:
+            return True, 0
+        return False, _Reversed(key) if self._reverse else key
+
+    def iter_positions(self, file_index: FileIndex, positions, headers=None):
+        """Yield the positions of files of an index, in upload order.
+
+        `headers` is the `HeaderTable` of the index, if the order needs it."""
+        heap = []
+        for position in positions:
+            header = headers.row(position) if headers is not None else None
+            heap.append((self.priority(file_index[position], header), position))
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[1]
+
+    def __str__(self):
+        return self._description
+
+
+def _get_date_obs(indexed_file: IndexedFile, header: dict) -> Optional[float]:
+    date_obs = header.get("DATE-OBS")
+    if not isinstance(date_obs, str):
+        return None
+    try:
+        date = datetime.fromisoformat(date_obs)
+    except ValueError:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def _get_mtime(indexed_file: IndexedFile, header: dict) -> float:
+    return indexed_file.mtime
+
+
+def _get_size(indexed_file: IndexedFile, header: dict) -> int:
+    return indexed_file.size
+
+
+UPLOAD_ORDERS = {
+    "newest": UploadOrder(_get_mtime, reverse=True, description="newest first"),
+    "oldest": UploadOrder(_get_mtime, description="oldest first"),
+    "smallest": UploadOrder(_get_size, description="smallest first"),
+    "largest": UploadOrder(_get_size, reverse=True, description="largest first"),
+    "newest-date-obs": UploadOrder(
+        _get_date_obs,
+        needs_header=True,
+        reverse=True,
+        description="latest DATE-OBS first",
+    ),
+    "oldest-date-obs": UploadOrder(
+        _get_date_obs, needs_header=True, description="earliest DATE-OBS first"
+    ),
+}
+
+
+def get_upload_order(order) -> Optional[UploadOrder]:
+    """Return an `UploadOrder` from its name in `UPLOAD_ORDERS` (or itself, or None)."""
+    if order is None or isinstance(order, UploadOrder):
+        return order
+    if order not in UPLOAD_ORDERS:
+        raise ValueError(
+            f"Unknown upload order {order!r}, use one of {', '.join(UPLOAD_ORDERS)}."
+        )
+    return UPLOAD_ORDERS[order]
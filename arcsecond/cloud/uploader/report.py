@@ -0,0 +1,74 @@
+from .constants import Status
+from .index import FileIndex
+from .journal import UploadJournal
+
+
+class UploadReport(object):
+    """
+    Succeeded, skipped and failed uploads of a walk.
+
+    Results are stored as status codes in the `FileIndex` of the walk, and the
+    lists of paths are only built when asked for. Reports can be read like the
+    former dict: `report["failed"]`. Results are also written to the upload
+    journal, if any.
+    """
+
+    KEYS = ("succeeded", "skipped", "failed")
+
+    def __init__(self, file_index: FileIndex, journal: UploadJournal = None):
+        self._file_index = file_index
+        self._journal = journal
+
+    @property
+    def file_index(self) -> FileIndex:
+        return self._file_index
+
+    def record(self, position: int, result, file_id=None, started=None, finished=None):
+        status, substatus, error = result
+        self._file_index.set_status(position, status, substatus, error)
+        if self._journal is not None:
+            self._journal.record(
+                self._file_index.get_path(position),
+                self._file_index.sizes[position],
+                self._file_index.mtimes[position],
+                result,
+                file_id=file_id,
+                started=started,
+                finished=finished,
+            )
+
+    @property
+    def succeeded(self):
+        return [
+            str(self._file_index.get_path(position))
+            for position in self._file_index.iter_positions(Status.OK)
+        ]
+
+    @property
+    def skipped(self):
+        return self._get_details(Status.SKIPPED)
+
+    @property
+    def failed(self):
+        return self._get_details(Status.ERROR)
+
+    @property
+    def counts(self) -> dict:
+        return {
+            "succeeded": self._file_index.count_status(Status.OK),
+            "skipped": self._file_index.count_status(Status.SKIPPED),
+            "failed": self._file_index.count_status(Status.ERROR),
+        }
+
+    def _get_details(self, status):
+        details = []
+        for position in self._file_index.iter_positions(status):
+            _, substatus = self._file_index.get_status(position)
+            error = self._file_index.get_error(position)
+            details.append((str(self._file_index.get_path(position)), substatus, error))
+        return details
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
@@ -1,13 +1,25 @@
+import asyncio
 import copy
 import os
 import time
 from abc import ABC, abstractmethod
 from datetime import datetime
 from pathlib import Path
-from typing import Generic, TypeVar
+from typing import Generic, Optional, TypeVar
 
 from tqdm import tqdm
 
+from arcsecond.api.retry import RetryPolicy
+
+from .bandwidth import BandwidthLimiter, get_bandwidth_limiter
+from .chunked import (
+    CHUNKED_UPLOAD_THRESHOLD,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_PARALLEL_PARTS,
+    ChunkedUpload,
+    is_chunked_upload_supported,
+)
+from .compression import get_compressed_name
 from .constants import Status, Substatus
 from .context import BaseUploadContext
 from .errors import (
@@ -18,25 +30,105 @@ from .logger import get_logger
 
 ContextT = TypeVar("ContextT", bound=BaseUploadContext)
 
+# Files are streamed to the server by blocks of this size (1 to 16 MiB work well).
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Progress bars are redrawn at most that many times per second.
+PROGRESS_REFRESH_RATE = 4
+
+# Requests are already retried by the endpoints when it is safe. Whole uploads can
+# be tried again on top of that: a file already received is reported as synced.
+UPLOAD_RETRY_POLICY = RetryPolicy(max_attempts=3, backoff_factor=1.0)
+
 
 class UploadFileWithProgress:
-    def __init__(self, file_path, chunk_size=8192, display_progress=False):
-        self._file = open(file_path, "rb")
+    """
+    File to upload, streamed by large blocks.
+
+    The file is opened unbuffered and `iter_blocks()` reads it with `readinto`,
+    straight into the buffers sent to the server. Its `size` is known, so that
+    the length of the request body is computed beforehand (see
+    `arcsecond.api.multipart`). Progress is counted on every block, but the
+    progress bar is only updated a few times per second.
+
+    With a bandwidth `limiter`, blocks are sent by slices, as the cap allows.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        chunk_size=8192,
+        display_progress=False,
+        block_size=DEFAULT_BLOCK_SIZE,
+        limiter: BandwidthLimiter = None,
+    ):
+        self._file = open(file_path, "rb", buffering=0)
         self._chunk_size = chunk_size
+        self._block_size = block_size
+        self._limiter = limiter
         self._total = os.fstat(self._file.fileno()).st_size
         self._display_progress = display_progress
+        self._sent = 0
+        self._displayed = 0
+        self._displayed_at = 0.0
         if display_progress:
             self._progress = tqdm(total=self._total, unit="B", unit_scale=True)
 
+    @property
+    def size(self) -> int:
+        return self._total
+
+    @property
+    def limiter(self) -> Optional[BandwidthLimiter]:
+        return self._limiter
+
+    def iter_blocks(self, throttle: bool = True):
+        """Yield the content of the file, from its beginning, by blocks of `block_size` bytes.
+
+        Without `throttle`, blocks are yielded whole, the caller throttles them."""
+        self.seek(0)
+        while True:
+            # A new buffer for each block: consumers may keep the previous ones.
+            block = bytearray(self._block_size)
+            count = self._file.readinto(block)
+            if not count:
+                break
+            if self._limiter is None or not throttle:
+                self._advance(count)
+                yield memoryview(block)[:count]
+                continue
+            for part in self._limiter.throttle(memoryview(block)[:count]):
+                self._advance(len(part))
+                yield part
+        self._update_progress()
+
     def read(self, amt=None):
         data = self._file.read(amt or self._chunk_size)
-        if self._display_progress:
-            self._progress.update(len(data))
-            self._progress.refresh()
+        if self._limiter is not None:
+            self._limiter.consume(len(data))
+        self._advance(len(data))
         return data
 
+    def _advance(self, count):
+        self._sent += count
+        if (
+            self._display_progress
+            and time.monotonic() - self._displayed_at >= 1 / PROGRESS_REFRESH_RATE
+        ):
+            self._update_progress()
+
+    def _update_progress(self):
+        if not self._display_progress:
+            return
+        # A retried upload starts over: the bar goes back as well.
+        self._progress.update(self._sent - self._displayed)
+        self._displayed = self._sent
+        self._displayed_at = time.monotonic()
+
     def seek(self, offset, whence=os.SEEK_SET):
-        return self._file.seek(offset, whence)
+        position = self._file.seek(offset, whence)
+        self._sent = position
+        return position
 
     def tell(self):
         return self._file.tell()
@@ -44,33 +136,113 @@ class UploadFileWithProgress:
     def close(self):
         self._file.close()
         if self._display_progress:
+            self._update_progress()
             self._progress.close()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def __getattr__(self, name):
         # Delegate all other attributes to the file object
         return getattr(self._file, name)
 
 
+class UploadBytes:
+    """
+    Content already in memory, uploaded like an `UploadFileWithProgress`.
+
+    Used when the bytes of a file were already read for another purpose (e.g.
+    by the live-image proxy), so that the file is not read again.
+    """
+
+    def __init__(
+        self,
+        data: bytes,
+        block_size=DEFAULT_BLOCK_SIZE,
+        limiter: BandwidthLimiter = None,
+    ):
+        self._data = memoryview(data)
+        self._block_size = block_size
+        self._limiter = limiter
+        self._position = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._data)
+
+    @property
+    def limiter(self) -> Optional[BandwidthLimiter]:
+        return self._limiter
+
+    def iter_blocks(self, throttle: bool = True):
+        """Yield the content by blocks of `block_size` bytes, as `UploadFileWithProgress` does."""
+        self.seek(0)
+        for start in range(0, len(self._data), self._block_size):
+            block = self._data[start : start + self._block_size]
+            if self._limiter is None or not throttle:
+                yield block
+            else:
+                yield from self._limiter.throttle(block)
+
+    def read(self, amt=None):
+        end = len(self._data) if amt is None else self._position + amt
+        data = bytes(self._data[self._position : end])
+        if self._limiter is not None:
+            self._limiter.consume(len(data))
+        self._position += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._position}.get(whence, self.size)
+        self._position = max(0, min(base + offset, self.size))
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        pass
+
+
 class BaseFileUploader(Generic[ContextT], ABC):
     """Abstract base class for uploaders"""
 
+    # Large files are sent by parts, in parallel (None to always send files at once).
+    chunked_upload_threshold = CHUNKED_UPLOAD_THRESHOLD
+    chunk_size = DEFAULT_CHUNK_SIZE
+    parallel_parts = DEFAULT_PARALLEL_PARTS
+    # Files sent at once are read by blocks of that size.
+    block_size = DEFAULT_BLOCK_SIZE
+
     def __init__(
         self,
         context: ContextT,
         file_path: str | Path,
         display_progress=False,
+        retry_policy: RetryPolicy = UPLOAD_RETRY_POLICY,
     ):
         self._context = context
         self._file_path = Path(file_path)
         self._display_progress = display_progress
+        self._retry_policy = retry_policy
 
         self._logger = get_logger()
         self._status = [Status.NEW, Substatus.PENDING, None]
         self._started = None
         self._file_size = os.path.getsize(file_path)
+        # What is actually sent: the file itself, or a compressed copy.
+        self._upload_path = self._file_path
+        self._upload_name = self._file_path.name
 
         self._uploaded_file = None
+        self._resume_token = None
         self._cleanup_resources = []
+        # Measures of the upload, e.g. to adapt the number of parallel uploads.
+        self._upload_seconds = None
+        self._retry_count = 0
 
     @property
     def log_prefix(self):
@@ -82,6 +254,21 @@ class BaseFileUploader(Generic[ContextT], ABC):
         """Generate a log prefix for this file"""
         return self._uploaded_file.get("id", None) if self._uploaded_file else None
 
+    @property
+    def upload_size(self):
+        """Number of bytes sent (of the compressed copy, if any)"""
+        return self._file_size
+
+    @property
+    def upload_seconds(self):
+        """Time spent in the last, successful, attempt of `_perform_upload`, or None"""
+        return self._upload_seconds
+
+    @property
+    def retry_count(self):
+        """Number of attempts tried again, of both the preparation and the upload"""
+        return self._retry_count
+
     @property
     def main_status(self):
         return self._status[0]
@@ -89,15 +276,24 @@ class BaseFileUploader(Generic[ContextT], ABC):
     def get_full_status_error(self):
         return self._status
 
+    def use_compressed_file(self, compressed_path):
+        """Send a compressed copy of the file, named after the file with the compression suffix."""
+        self._upload_path = Path(compressed_path)
+        self._upload_name = get_compressed_name(self._file_path.name, compressed_path)
+        self._file_size = os.path.getsize(compressed_path)
+
     @abstractmethod
     def _prepare_upload(self):
         """Prepare for upload - to be implemented by subclasses"""
         raise NotImplementedError()
 
     def _get_upload_files(self, **kwargs):
-        filename = os.path.basename(self._file_path)
+        filename = self._upload_name
         self._file = UploadFileWithProgress(
-            self._file_path, display_progress=self._display_progress
+            self._upload_path,
+            display_progress=self._display_progress,
+            block_size=self.block_size,
+            limiter=get_bandwidth_limiter(),
         )
         self._cleanup_resources.append(self._file)
         return {
@@ -109,8 +305,7 @@ class BaseFileUploader(Generic[ContextT], ABC):
         """Get upload data fields - to be implemented by subclasses"""
         raise NotImplementedError()
 
-    def _perform_upload(self, **kwargs):
-        """Common upload implementation"""
+    def _start_upload(self, **kwargs):
         self._logger.info(
             f"{self.log_prefix} Starting uploading to Arcsecond.io ({self._file_size} bytes)"
         )
@@ -120,10 +315,9 @@ class BaseFileUploader(Generic[ContextT], ABC):
 
         files = self._get_upload_files(**kwargs)
         data = self._get_upload_data(**kwargs)
-        self._uploaded_file, error = self._context.upload_api_endpoint.create(
-            files=files, json=data
-        )
+        return files, data
 
+    def _finish_upload(self, error):
         if not error:
             seconds = (datetime.now() - self._started).total_seconds()
             self._logger.info(
@@ -140,7 +334,119 @@ class BaseFileUploader(Generic[ContextT], ABC):
             self._logger.info(
                 f"{self.log_prefix} Upload of file {self._file_path} failed."
             )
-            raise UploadRemoteFileError(f"{str(error.status)} - {str(error)}")
+            raise UploadRemoteFileError(
+                f"{str(error.status)} - {str(error)}", error.status
+            )
+
+    def _should_upload_by_parts(self):
+        return (
+            self.chunked_upload_threshold is not None
+            and self._file_size >= self.chunked_upload_threshold
+            and is_chunked_upload_supported(self._context.upload_api_endpoint)
+        )
+
+    def _get_journal_key(self):
+        stat = os.stat(self._file_path)
+        return self._file_path, stat.st_size, stat.st_mtime
+
+    def _get_resume_token(self):
+        journal = self._context.journal
+        if journal is not None:
+            return journal.get_resume_token(*self._get_journal_key())
+        return self._resume_token
+
+    def _set_resume_token(self, token):
+        self._resume_token = token
+        journal = self._context.journal
+        if journal is not None:
+            journal.set_resume_token(*self._get_journal_key(), token)
+
+    def _perform_chunked_upload(self, **kwargs):
+        """Upload the file by parts. Return False if the server cannot, to upload it at once."""
+        endpoint = self._context.upload_api_endpoint
+        self._logger.info(
+            f"{self.log_prefix} Starting uploading to Arcsecond.io by parts ({self._file_size} bytes)"
+        )
+        self._status = [Status.UPLOADING, Substatus.UPLOADING, None]
+        self._started = datetime.now()
+
+        on_progress = None
+        if self._display_progress:
+            progress = tqdm(total=self._file_size, unit="B", unit_scale=True)
+            self._cleanup_resources.append(progress)
+            on_progress = progress.update
+
+        upload = ChunkedUpload(
+            endpoint,
+            self._upload_path,
+            self._retry_policy,
+            filename=self._upload_name,
+            chunk_size=self.chunk_size,
+            parallel_parts=self.parallel_parts,
+            upload_id=self._get_resume_token(),
+            on_progress=on_progress,
+            part_body=self._get_part_body,
+        )
+        error = upload.open(self._get_upload_data(**kwargs))
+        if error is not None and upload.upload_id is None:
+            # Nothing was sent yet: the file can still go in a single request.
+            if not is_chunked_upload_supported(endpoint):
+                self._logger.info(
+                    f"{self.log_prefix} Uploads by parts are not supported, sending the file at once."
+                )
+            else:
+                self._logger.info(
+                    f"{self.log_prefix} Upload by parts could not start ({error}), sending the file at once."
+                )
+            self._set_resume_token(None)
+            return False
+
+        if error is None:
+            self._set_resume_token(upload.upload_id)
+            skipped_parts = upload.part_count - len(upload.missing_parts)
+            if skipped_parts > 0:
+                self._logger.info(
+                    f"{self.log_prefix} Resuming upload, {skipped_parts} / {upload.part_count} parts already sent."
+                )
+            error = upload.send_parts()
+        if error is None:
+            self._uploaded_file, error = upload.complete()
+            if error is None:
+                self._set_resume_token(None)
+        self._finish_upload(error)
+        return True
+
+    def _get_part_body(self, chunk: bytes):
+        """The body of a part of a chunked upload: the bytes themselves, unless capped."""
+        limiter = get_bandwidth_limiter()
+        if limiter is None:
+            return chunk
+        return UploadBytes(chunk, block_size=self.block_size, limiter=limiter)
+
+    def _perform_upload(self, **kwargs):
+        """Common upload implementation"""
+        if self._should_upload_by_parts() and self._perform_chunked_upload(**kwargs):
+            return
+        files, data = self._start_upload(**kwargs)
+        self._uploaded_file, error = self._context.upload_api_endpoint.create(
+            files=files, json=data
+        )
+        self._finish_upload(error)
+
+    async def _prepare_upload_async(self):
+        """Async preparation. Runs `_prepare_upload` in a worker thread by default."""
+        await asyncio.to_thread(self._prepare_upload)
+
+    async def _perform_upload_async(self, **kwargs):
+        """Common upload implementation, through the async API endpoint"""
+        if self._should_upload_by_parts():
+            # Parts are sent by a pool of threads of their own.
+            if await asyncio.to_thread(self._perform_chunked_upload, **kwargs):
+                return
+        files, data = self._start_upload(**kwargs)
+        endpoint = self._context.async_upload_api_endpoint
+        self._uploaded_file, error = await endpoint.create(files=files, json=data)
+        self._finish_upload(error)
 
     def _cleanup(self):
         for resource in self._cleanup_resources:
@@ -161,30 +467,83 @@ class BaseFileUploader(Generic[ContextT], ABC):
         self._logger.info(f"{self.log_prefix} Opening upload sequence.")
 
         # Pre-upload preparation (different for each context type)
-        try:
-            self._prepare_upload()
-        except Exception:
-            self._logger.info(
-                f"{self.log_prefix} Upload preparation error. Trying again automatically in 1 second."
-            )
-            # Just try again
-            time.sleep(1)
-            self._prepare_upload()
+        attempt = 1
+        while True:
+            try:
+                self._prepare_upload()
+                break
+            except Exception as e:
+                delay = self._get_retry_delay(e, attempt, "Upload preparation error")
+                time.sleep(delay)
+                attempt += 1
 
         # Perform the actual upload (common to all types)
-        kwargs_copy = copy.deepcopy(kwargs)
+        attempt = 1
         try:
-            self._perform_upload(**kwargs)
-        except UploadRemoteFileError:
-            # Just try again
-            self._logger.info(
-                f"{self.log_prefix} Upload error. Trying again automatically in 1 second."
-            )
-            time.sleep(1)
-            self._perform_upload(**kwargs_copy)
+            while True:
+                # Kwargs can be consumed by an attempt, give each one a fresh copy.
+                try:
+                    started = time.monotonic()
+                    self._perform_upload(**copy.deepcopy(kwargs))
+                    self._upload_seconds = time.monotonic() - started
+                    break
+                except UploadRemoteFileError as e:
+                    self._cleanup()
+                    time.sleep(self._get_retry_delay(e, attempt, "Upload error"))
+                    attempt += 1
+        finally:
+            self._cleanup()
+
+        return self._close_upload_sequence()
+
+    async def upload_file_async(self, **kwargs):
+        """Asyncio version of `upload_file`, for many uploads in flight on one event loop"""
+        if self._context.is_validated is False:
+            raise UploadRemoteFileInvalidatedContextError()
+
+        self._logger.info(f"{self.log_prefix} Opening upload sequence.")
+
+        attempt = 1
+        while True:
+            try:
+                await self._prepare_upload_async()
+                break
+            except Exception as e:
+                delay = self._get_retry_delay(e, attempt, "Upload preparation error")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        attempt = 1
+        try:
+            while True:
+                try:
+                    started = time.monotonic()
+                    await self._perform_upload_async(**copy.deepcopy(kwargs))
+                    self._upload_seconds = time.monotonic() - started
+                    break
+                except UploadRemoteFileError as e:
+                    self._cleanup()
+                    await asyncio.sleep(
+                        self._get_retry_delay(e, attempt, "Upload error")
+                    )
+                    attempt += 1
         finally:
             self._cleanup()
 
+        return self._close_upload_sequence()
+
+    def _get_retry_delay(self, error, attempt, reason):
+        """Return the delay before trying again after `error`, or raise it if it is final."""
+        if not self._retry_policy.should_retry_error(error, attempt):
+            raise error
+        self._retry_count += 1
+        delay = self._retry_policy.get_delay(attempt)
+        self._logger.info(
+            f"{self.log_prefix} {reason}. Trying again automatically in {delay:.1f} seconds."
+        )
+        return delay
+
+    def _close_upload_sequence(self):
         if self._status[0] == Status.SKIPPED:
             self._logger.info(f"{self.log_prefix} Upload skipped.")
         else:
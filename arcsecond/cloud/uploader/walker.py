@@ -1,106 +1,774 @@
-from collections import Counter
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 import click
 
-from .constants import Status
+from arcsecond.api.transport import ensure_http_connections
+from arcsecond.errors import ArcsecondError
+
+from .bandwidth import BandwidthLimiter, get_bandwidth_limiter, set_bandwidth_limiter
+from .compression import Compressor
+from .concurrency import ConcurrencyController
+from .constants import Status, Substatus
 from .context import BaseUploadContext
+from .index import FileIndex
+from .journal import UploadJournal
 from .logger import get_logger
+from .metadata import HeaderTable, MetadataExtractor, is_data_file
+from .ordering import UploadOrder, get_upload_order
+from .report import UploadReport
 from .uploader import BaseFileUploader
-from .utils import is_file_hidden
-
+from .watcher import BaseWatcher, get_watcher
 
-def _get_duplicates(values):
-    dups = Counter(values) - Counter(set(values))
-    return list(dups.keys())
+# Files discovered but not yet picked by an upload worker, in streaming mode.
+DEFAULT_STREAM_QUEUE_SIZE = 256
 
 
-def _walk_first_pass(root_path: Path):
+def _walk_first_pass(root_path: Path, file_index: FileIndex = None):
     logger = get_logger()
     log_prefix = "[Walker - 1/2]"
     logger.info(f"{log_prefix} Making a first pass to collect info on files...")
 
-    total_file_count = sum(
-        1 for f in root_path.glob("**/*") if f.is_file() and not is_file_hidden(f)
-    )
-
-    index = 0
-    file_paths = []
-    for file_path in root_path.glob("**/*"):
-        # Skipping both hidden files and hidden directories.
-        if is_file_hidden(file_path) or not file_path.is_file():
-            continue
+    # Hidden files and directories are skipped by the index.
+    if file_index is None:
+        file_index = FileIndex.build(root_path)
 
-        index += 1
+    total_file_count = len(file_index)
+    for index, indexed_file in enumerate(file_index, start=1):
         msg = f"{log_prefix} File {index} / {total_file_count} ({index / total_file_count * 100:.2f}%) "
-        msg += f"{file_path.name}"
+        msg += f"{indexed_file.name}"
         click.echo(msg)
-        file_paths.append(file_path)
 
     logger.info(
         f"{log_prefix} Finished collecting file info inside folder {str(root_path)}."
     )
-    return file_paths
+    return file_index
+
+
+def _fetch_remote_manifest(context: BaseUploadContext) -> bool:
+    try:
+        context.fetch_remote_manifest()
+    except ArcsecondError as error:
+        # Not fatal: the server still rejects files it already has.
+        get_logger().warning(f"[Walker] Could not fetch the remote files: {error}")
+        return False
+    return True
+
+
+def _record_skip(file_index: FileIndex, position: int, substatus, journal=None):
+    """Mark a file as skipped, and record it in the journal, as uploads of the walk are."""
+    result = (Status.SKIPPED, substatus, None)
+    UploadReport(file_index, journal).record(position, result)
+
+
+def _mark_synced_files(
+    context: BaseUploadContext, file_index: FileIndex, journal: UploadJournal = None
+):
+    """Mark the files already uploaded according to the remote manifest of the context."""
+    logger = get_logger()
+    log_prefix = "[Walker]"
+    if not _fetch_remote_manifest(context):
+        return
+
+    synced_count = 0
+    for position in file_index.iter_positions(Status.NEW):
+        if context.is_already_synced(file_index.get_path(position)):
+            _record_skip(file_index, position, Substatus.ALREADY_SYNCED, journal)
+            synced_count += 1
+    if synced_count > 0:
+        logger.info(
+            f"{log_prefix} {synced_count} file(s) already synced will not be uploaded."
+        )
+
+
+def _mark_completed_files(journal: UploadJournal, file_index: FileIndex):
+    """Mark the files whose upload is completed according to the journal, without any request."""
+    completed_count = 0
+    for position in range(len(file_index)):
+        if _is_completed(journal, file_index, position):
+            file_index.set_status(position, Status.SKIPPED, Substatus.ALREADY_SYNCED)
+            completed_count += 1
+    if completed_count > 0:
+        get_logger().info(
+            f"[Walker] Resuming: {completed_count} file(s) already uploaded will not be checked again."
+        )
+
+
+def _lacks_date_obs(file_path: Path, metadata: dict) -> bool:
+    return is_data_file(file_path) and not metadata.get("DATE-OBS")
+
+
+def _mark_files_without_date_obs(
+    headers: HeaderTable, file_index: FileIndex, journal: UploadJournal = None
+):
+    """Mark the data files whose header has no DATE-OBS."""
+    skipped_count = 0
+    for position, date_obs in enumerate(headers.column("DATE-OBS")):
+        if file_index.get_status(position)[0] != Status.NEW:
+            continue
+        if not date_obs and is_data_file(file_index.get_path(position)):
+            _record_skip(file_index, position, Substatus.SKIPPED_NO_DATE_OBS, journal)
+            skipped_count += 1
+    if skipped_count > 0:
+        get_logger().info(
+            f"[Walker] {skipped_count} data file(s) without DATE-OBS will not be uploaded."
+        )
+
+
+def _is_completed(journal: UploadJournal, file_index: FileIndex, position: int):
+    return journal.is_completed(
+        file_index.get_path(position),
+        file_index.sizes[position],
+        file_index.mtimes[position],
+    )
+
+
+def _is_being_written(file_index: FileIndex, position: int, settle_time: float):
+    return time.time() - file_index.mtimes[position] < settle_time
+
+
+def _is_modified(file_index: FileIndex, position: int, file_path: Path) -> bool:
+    try:
+        stat = file_path.stat()
+    except OSError:
+        return False
+    return (stat.st_size, stat.st_mtime) != (
+        file_index.sizes[position],
+        file_index.mtimes[position],
+    )
+
+
+def _get_compressed_path(compression, file_path: Path):
+    if compression is None:
+        return None
+    try:
+        return compression.result()
+    except Exception as error:
+        get_logger().warning(
+            f"File {file_path.name}: Compression failed ({error}), uploading the file as it is."
+        )
+        return None
+
+
+def _discard_compression(compression):
+    """Cancel the compression of a file not uploaded, or remove its compressed copy."""
+    if compression is None or compression.cancel():
+        return
+    try:
+        compressed_path = compression.result()
+    except Exception:
+        return
+    if compressed_path is not None:
+        try:
+            os.remove(compressed_path)
+        except OSError:
+            pass
+
+
+def _release_slot(concurrency: ConcurrencyController, uploader, result):
+    """Give back the slot of an upload to the controller, with its measures."""
+    if uploader is None:
+        concurrency.release(error=True)
+        return
+    concurrency.release(
+        getattr(uploader, "upload_size", 0),
+        getattr(uploader, "upload_seconds", None),
+        error=result[0] == Status.ERROR or getattr(uploader, "retry_count", 0) > 0,
+    )
+
+
+def _upload_single_file(
+    uploader_class: BaseFileUploader.__class__,
+    context: BaseUploadContext,
+    file_path: Path,
+    display_progress: bool,
+    compression=None,
+    upload_kwargs: dict = None,
+    concurrency: ConcurrencyController = None,
+):
+    """Upload a file. Return its result, and the details recorded in the journal.
+
+    `compression` is the future of the compression of the file, if any, and
+    `upload_kwargs` the arguments of its upload (e.g. from upload rules). With
+    a `concurrency` controller, the slot taken for the upload is given back.
+    """
+    started = time.time()
+    compressed_path = _get_compressed_path(compression, file_path)
+    uploader = None
+    result = Status.ERROR, Substatus.ERROR, None
+    try:
+        uploader = uploader_class(context, file_path, display_progress=display_progress)
+        if compressed_path is not None:
+            uploader.use_compressed_file(compressed_path)
+        result = uploader.upload_file(**(upload_kwargs or {}))
+    except ArcsecondError as error:
+        # The uploader has already retried and released its file handle.
+        result = Status.ERROR, Substatus.ERROR, error
+    finally:
+        if compressed_path is not None:
+            os.remove(compressed_path)
+        if concurrency is not None:
+            _release_slot(concurrency, uploader, result)
+    details = {
+        "file_id": getattr(uploader, "uploaded_file_id", None),
+        "started": started,
+        "finished": time.time(),
+    }
+    return result, details
+
+
+def _describe_workers(max_workers: int, concurrency: ConcurrencyController = None):
+    if concurrency is not None:
+        return f"adaptive, {concurrency.limit} to {concurrency.max_limit} workers"
+    return f"{max_workers} worker{'s' if max_workers > 1 else ''}"
+
+
+def _get_future_result(future):
+    if future.exception() is not None:
+        return (Status.ERROR, Substatus.ERROR, future.exception()), {}
+    return future.result()
 
 
 def _walk_second_pass(
     uploader_class: BaseFileUploader.__class__,
     context: BaseUploadContext,
     root_path: Path,
-    file_paths: list,
+    file_index: FileIndex,
+    max_workers: int = 1,
+    journal: UploadJournal = None,
+    compressor: Compressor = None,
+    upload_kwargs: list = None,
+    concurrency: ConcurrencyController = None,
+    order: UploadOrder = None,
+    headers: HeaderTable = None,
 ):
+    """Upload the files of the index that are still pending.
+
+    Only a small window of files is submitted to the workers at a time, so that
+    memory does not grow with the number of files. Files of the window are
+    compressed ahead of their upload, if a `compressor` is given.
+    `upload_kwargs` are the upload arguments of each file, by position.
+
+    With a `concurrency` controller, files are submitted as long as it gives
+    slots: the window is the number of parallel uploads it allows.
+
+    With an `order`, files are submitted in that order instead of the order of
+    the index (`headers` are the headers of the files, if the order needs them).
+    """
     logger = get_logger()
     log_prefix = "[Walker - 2/2]"
-    logger.info(f"{log_prefix} Starting second pass to upload files...")
+    logger.info(
+        f"{log_prefix} Starting second pass to upload files ({_describe_workers(max_workers, concurrency)})..."
+    )
+
+    report = UploadReport(file_index, journal)
+    total_file_count = file_index.count_status(Status.NEW)
+
+    # Progress bars of concurrent uploads would overwrite each other.
+    display_progress = max_workers == 1
 
-    uploads = {"succeeded": [], "skipped": [], "failed": []}
-    total_file_count = len(file_paths)
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="arcsecond-upload"
+    )
+    pending = {}  # future -> position in the index
 
     index = 0
-    for file_path in file_paths:
-        index += 1
-        click.echo(
-            f"{log_prefix} File {index} / {total_file_count} ({index / total_file_count * 100:.2f}%)"
-        )
 
-        uploader = uploader_class(context, file_path, display_progress=True)
-        status, substatus, error = uploader.upload_file()
-        if status == Status.OK:
-            uploads["succeeded"].append(str(file_path))
-        elif status == Status.SKIPPED:
-            uploads["skipped"].append((str(file_path), substatus, error))
-        else:
-            uploads["failed"].append((str(file_path), substatus, error))
+    def _record_done(done):
+        nonlocal index
+        for future in done:
+            position = pending.pop(future)
+            index += 1
+            click.echo(
+                f"{log_prefix} File {index} / {total_file_count} ({index / total_file_count * 100:.2f}%) {file_index.get_name(position)}"
+            )
+            result, details = _get_future_result(future)
+            report.record(position, result, **details)
+
+    positions = file_index.iter_positions(Status.NEW)
+    if order is not None:
+        positions = order.iter_positions(file_index, positions, headers)
+
+    compression = None  # Of the file waiting for a worker
+    try:
+        for position in positions:
+            file_path = file_index.get_path(position)
+            # Compressed while waiting for a worker.
+            compression = compressor.submit(file_path) if compressor else None
+            if concurrency is not None:
+                concurrency.acquire()
+                _record_done([future for future in pending if future.done()])
+            elif len(pending) >= 2 * max_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                _record_done(done)
+            future = executor.submit(
+                _upload_single_file,
+                uploader_class,
+                context,
+                file_path,
+                display_progress,
+                compression,
+                upload_kwargs[position] if upload_kwargs else None,
+                concurrency,
+            )
+            pending[future] = position
+            compression = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            _record_done(done)
+    except KeyboardInterrupt:
+        logger.warning(
+            f"{log_prefix} Interrupted. Waiting for in-flight uploads to finish..."
+        )
+        # Queued files are dropped, running ones complete and close their files.
+        executor.shutdown(wait=True, cancel_futures=True)
+        _discard_compression(compression)
+        for future, position in pending.items():
+            if not future.cancelled():
+                result, details = _get_future_result(future)
+                report.record(position, result, **details)
+        logger.warning(
+            f"{log_prefix} Upload walk interrupted, {file_index.count_status(Status.NEW)} file(s) were not uploaded."
+        )
+        return report
+    finally:
+        executor.shutdown(wait=True)
 
     msg = f"{log_prefix}\n\nFinished upload walk inside folder {root_path} "
     logger.info(msg)
 
-    return uploads
+    return report
+
+
+def _walk_streaming(
+    uploader_class: BaseFileUploader.__class__,
+    context: BaseUploadContext,
+    file_index: FileIndex,
+    max_workers: int = 1,
+    queue_size: int = DEFAULT_STREAM_QUEUE_SIZE,
+    check_synced: bool = True,
+    journal: UploadJournal = None,
+    resume: bool = False,
+    compressor: Compressor = None,
+    metadata: MetadataExtractor = None,
+    require_date_obs: bool = False,
+    rules=None,
+    watcher: BaseWatcher = None,
+    watch_duration: float = None,
+    concurrency: ConcurrencyController = None,
+    order: UploadOrder = None,
+):
+    """Discover and upload files at the same time.
+
+    A discovery thread scans the tree and feeds a bounded queue, from which the
+    upload workers take files as soon as they are found. Duplicate names are
+    detected as they come: on the first one, no new upload is started, and the
+    duplicate name is returned along with the report.
+
+    With a `watcher`, the discovery thread then goes on with the files written
+    in the tree, until interrupted (or for `watch_duration` seconds). Duplicate
+    names met while watching are only logged, and their files not uploaded.
+    Files found by the scan while still being written are left to the watcher,
+    and uploaded once complete.
+
+    With a `concurrency` controller, workers wait for a slot before uploading.
+
+    With an `order`, workers take the files of the queue in that order, instead
+    of the order they were found: a file found later, e.g. a new file while
+    watching, is uploaded before the waiting files with a higher key.
+    """
+    logger = get_logger()
+    log_prefix = "[Walker - stream]"
+    logger.info(
+        f"{log_prefix} Uploading files while discovering them ({_describe_workers(max_workers, concurrency)})..."
+    )
+
+    report = UploadReport(file_index, journal)
+    # Items are (0, priority, position, upload) and (1, n) for the end of the
+    # work: the queue is ordered by discovery without `order`.
+    work_queue = queue.PriorityQueue(maxsize=queue_size)
+    stop = threading.Event()
+    duplicates = []
+    display_progress = max_workers == 1
+    lock = threading.Lock()
+    index = 0
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                work_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _dispatch(position):
+        file_path = file_index.get_path(position)
+        if resume and _is_completed(journal, file_index, position):
+            file_index.set_status(position, Status.SKIPPED, Substatus.ALREADY_SYNCED)
+            return
+        header = {}
+        if metadata is not None:
+            header = metadata.read(
+                file_path, file_index.sizes[position], file_index.mtimes[position]
+            )
+        if require_date_obs and _lacks_date_obs(file_path, header):
+            result = (Status.SKIPPED, Substatus.SKIPPED_NO_DATE_OBS, None)
+            report.record(position, result)
+            return
+        if check_synced and context.is_already_synced(file_path):
+            result = (Status.SKIPPED, Substatus.ALREADY_SYNCED, None)
+            report.record(position, result)
+            return
+        upload_kwargs = rules.apply_to(header) if rules else None
+        priority = order.priority(file_index[position], header) if order else 0
+        # Compressed while waiting in the queue.
+        compression = compressor.submit(file_path) if compressor else None
+        if not _put((0, priority, position, (file_path, upload_kwargs, compression))):
+            _discard_compression(compression)
+
+    def _watch(seen_names, held):
+        logger.info(
+            f"{log_prefix} Watching {file_index.root_path} for new files (press Ctrl-C to stop)..."
+        )
+        for file_path in watcher.watch(stop, watch_duration):
+            name = file_path.name
+            if name in seen_names:
+                position = seen_names[name]
+                if file_index.get_path(position) != file_path:
+                    logger.error(
+                        f"{log_prefix} Duplicate file name {name} (not allowed in the same dataset), not uploaded: {file_path}"
+                    )
+                elif position in held:
+                    held.discard(position)
+                    try:
+                        file_index.update(position)
+                    except OSError:
+                        continue  # Removed in the meantime
+                    _dispatch(position)
+                elif _is_modified(file_index, position, file_path):
+                    logger.warning(
+                        f"{log_prefix} File {name} was written again after being found, not uploaded again."
+                    )
+                continue
+            try:
+                position = file_index.add(file_path)
+            except OSError:
+                continue  # Removed in the meantime
+            seen_names[name] = position
+            _dispatch(position)
+
+    def _discover():
+        seen_names = {}  # name -> position
+        held = set()  # Positions of files left to the watcher
+        try:
+            for position in file_index.scan():
+                if stop.is_set():
+                    break
+                name = file_index.get_name(position)
+                if name in seen_names:
+                    duplicates.append(name)
+                    stop.set()
+                    break
+                seen_names[name] = position
+                if watcher is not None and _is_being_written(
+                    file_index, position, watcher.settle_time
+                ):
+                    held.add(position)
+                    watcher.wait_for(file_index.get_path(position))
+                    continue
+                _dispatch(position)
+            if watcher is not None and not stop.is_set():
+                _watch(seen_names, held)
+        finally:
+            for worker in range(max_workers):
+                work_queue.put((1, worker))
+
+    def _consume():
+        nonlocal index
+        while True:
+            item = work_queue.get()
+            if item[0] == 1:
+                return
+            _, _, position, (file_path, upload_kwargs, compression) = item
+            if stop.is_set() or (
+                concurrency is not None and not concurrency.acquire(stop)
+            ):
+                _discard_compression(compression)
+                continue  # Left pending.
+            try:
+                result, details = _upload_single_file(
+                    uploader_class,
+                    context,
+                    file_path,
+                    display_progress,
+                    compression,
+                    upload_kwargs,
+                    concurrency,
+                )
+            except Exception as error:
+                result, details = (Status.ERROR, Substatus.ERROR, error), {}
+            with lock:
+                index += 1
+                click.echo(f"{log_prefix} File {index} {file_path.name}")
+                report.record(position, result, **details)
+
+    threads = [threading.Thread(target=_discover, name="arcsecond-discovery")]
+    threads += [
+        threading.Thread(target=_consume, name=f"arcsecond-upload-{i}")
+        for i in range(max_workers)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                # Joining with a timeout lets Ctrl-C reach the main thread.
+                thread.join(0.2)
+    except KeyboardInterrupt:
+        logger.warning(
+            f"{log_prefix} Interrupted. Waiting for in-flight uploads to finish..."
+        )
+        stop.set()
+        for thread in threads:
+            thread.join()
+        logger.warning(
+            f"{log_prefix} Upload walk interrupted, {file_index.count_status(Status.NEW)} discovered file(s) were not uploaded."
+        )
+
+    return report, duplicates
 
 
 def walk_folder_and_upload_files(
     uploader_class: BaseFileUploader.__class__,
     context: BaseUploadContext,
     folder_string: str,
+    max_workers: int = 1,
+    file_index: FileIndex = None,
+    stream: bool = False,
+    journal: UploadJournal = None,
+    resume: bool = False,
+    compression: str = None,
+    require_date_obs: bool = False,
+    metadata: MetadataExtractor = None,
+    rules=None,
+    watch: bool = False,
+    watch_duration: float = None,
+    concurrency: ConcurrencyController = None,
+    bandwidth: BandwidthLimiter = None,
+    order=None,
+):
+    """Upload all regular files of a folder tree.
+
+    A `file_index` of the folder, already built for the upload summary, can be
+    passed to avoid walking the tree again. With `stream`, files are uploaded
+    while the tree is being walked, instead of after a first full pass.
+
+    Results are recorded in the `journal`, if any. With `resume`, files whose
+    upload is completed according to the journal are skipped without any request.
+
+    With a `compression` method ("gzip", "bz2" or "auto"), data files are
+    compressed by a pool of processes before being uploaded.
+
+    With `require_date_obs`, data files whose header has no DATE-OBS are skipped.
+    With `rules` (e.g. the `UploadRules` of data files), the upload arguments
+    of each file are given by its header, through `rules.apply(headers)` (or
+    `rules.apply_to(header)` while streaming).
+    Headers are read by the `metadata` extractor, if given (to use its cache).
+
+    With `watch`, files are streamed, and the files written in the tree after
+    the walk are uploaded as well, as soon as they are complete, until
+    interrupted (or for `watch_duration` seconds).
+
+    With a `concurrency` controller, the number of files uploaded in parallel
+    is adapted to the measured throughput and latency, up to its maximum,
+    instead of `max_workers`.
+
+    With a `bandwidth` limiter, all uploads of the walk share its cap, which can
+    change during the walk.
+
+    With an `order` (an `UploadOrder`, or the name of one of `UPLOAD_ORDERS`,
+    e.g. "newest"), files are uploaded in that order instead of the order they
+    are found. While streaming, only the files waiting for a worker are ordered.
+    """
+    if concurrency is not None:
+        max_workers = concurrency.max_limit
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    if resume and journal is None:
+        raise ValueError("resume needs an upload journal")
+    order = get_upload_order(order)
+    previous_limiter = get_bandwidth_limiter()
+    if bandwidth is not None:
+        set_bandwidth_limiter(bandwidth)
+    try:
+        return _walk_folder_with_compression(
+            uploader_class,
+            context,
+            folder_string,
+            max_workers,
+            file_index,
+            stream,
+            journal,
+            resume,
+            compression,
+            require_date_obs,
+            metadata,
+            rules,
+            watch,
+            watch_duration,
+            concurrency,
+            order,
+        )
+    finally:
+        if bandwidth is not None:
+            set_bandwidth_limiter(previous_limiter)
+            get_logger().info(f"[Bandwidth] {bandwidth.summary()}")
+
+
+def _walk_folder_with_compression(
+    uploader_class: BaseFileUploader.__class__,
+    context: BaseUploadContext,
+    folder_string: str,
+    max_workers: int,
+    file_index: FileIndex,
+    stream: bool,
+    journal: UploadJournal,
+    resume: bool,
+    compression: str,
+    require_date_obs: bool,
+    metadata: MetadataExtractor,
+    rules,
+    watch: bool,
+    watch_duration: float,
+    concurrency: ConcurrencyController,
+    order: UploadOrder,
+):
+    if journal is not None:
+        context.journal = journal
+    needs_header = order is not None and order.needs_header
+    if not require_date_obs and rules is None and not needs_header:
+        metadata = None
+    elif metadata is None:
+        metadata = MetadataExtractor()
+    if compression is None:
+        return _walk_folder(
+            uploader_class,
+            context,
+            folder_string,
+            max_workers,
+            file_index,
+            stream,
+            journal,
+            resume,
+            metadata=metadata,
+            require_date_obs=require_date_obs,
+            rules=rules,
+            watch=watch,
+            watch_duration=watch_duration,
+            concurrency=concurrency,
+            order=order,
+        )
+
+    # A process per worker and one ahead, so that compression keeps up with uploads.
+    processes = max(1, min(os.cpu_count() or 1, max_workers + 1))
+    with Compressor(compression, max_workers=processes) as compressor:
+        return _walk_folder(
+            uploader_class,
+            context,
+            folder_string,
+            max_workers,
+            file_index,
+            stream,
+            journal,
+            resume,
+            compressor,
+            metadata=metadata,
+            require_date_obs=require_date_obs,
+            rules=rules,
+            watch=watch,
+            watch_duration=watch_duration,
+            concurrency=concurrency,
+            order=order,
+        )
+
+
+def _walk_folder(
+    uploader_class: BaseFileUploader.__class__,
+    context: BaseUploadContext,
+    folder_string: str,
+    max_workers: int,
+    file_index: FileIndex,
+    stream: bool,
+    journal: UploadJournal,
+    resume: bool,
+    compressor: Compressor = None,
+    metadata: MetadataExtractor = None,
+    require_date_obs: bool = False,
+    rules=None,
+    watch: bool = False,
+    watch_duration: float = None,
+    concurrency: ConcurrencyController = None,
+    order: UploadOrder = None,
 ):
     logger = get_logger()
     log_prefix = "[Walker]"
-    root_path = Path(folder_string).resolve()
-    if root_path.is_file():  # Just in case we pass a file...
-        root_path = root_path.parent
+    if file_index is not None:
+        root_path = file_index.root_path
+    else:
+        root_path = Path(folder_string).resolve()
+        if root_path.is_file():  # Just in case we pass a file...
+            root_path = root_path.parent
 
     logger.info(
         f"{log_prefix} Starting to walk through {root_path} and its subfolders..."
     )
 
-    file_paths = _walk_first_pass(root_path)
-    if len(file_paths) == 0:
+    if watch or (stream and file_index is None):
+        ensure_http_connections(max_workers)
+        check_synced = _fetch_remote_manifest(context)
+        # Watching starts before the walk, so that no new file is missed.
+        watcher = get_watcher(root_path) if watch else None
+        try:
+            uploads, duplicates = _walk_streaming(
+                uploader_class,
+                context,
+                FileIndex.create(root_path),
+                max_workers=max_workers,
+                check_synced=check_synced,
+                journal=journal,
+                resume=resume,
+                compressor=compressor,
+                metadata=metadata,
+                require_date_obs=require_date_obs,
+                rules=rules,
+                watcher=watcher,
+                watch_duration=watch_duration,
+                concurrency=concurrency,
+                order=order,
+            )
+        finally:
+            if watcher is not None:
+                watcher.close()
+        if journal is not None:
+            journal.flush()
+        if len(duplicates) > 0:
+            msg = f"{log_prefix} Stopped on a duplicate file name (not allowed in the same dataset): "
+            msg += f"{', '.join(duplicates)}"
+            logger.error(msg)
+        return _log_report(uploads)
+
+    file_index = _walk_first_pass(root_path, file_index)
+    if len(file_index) == 0:
         msg = f"{log_prefix} No file paths to upload. Exiting.\n\n"
         logger.info(msg)
         return
 
-    all_local_filenames = [path.name for path in file_paths]
-    duplicates = _get_duplicates(all_local_filenames)
+    duplicates = file_index.get_duplicate_names()
     if len(duplicates) > 0:
         msg = f"{log_prefix} The following files have duplicate names (not allowed in the same dataset): "
         msg += f"{', '.join(duplicates)}"
@@ -108,17 +776,56 @@ def walk_folder_and_upload_files(
         logger.error("Exiting.")
         return
 
-    uploads = _walk_second_pass(uploader_class, context, root_path, file_paths)
-    msg = f"{log_prefix} uploads succeeded: {len(uploads['succeeded'])}, "
-    msg += f"skipped: {len(uploads['skipped'])}, failed: {len(uploads['failed'])}\n"
+    if resume:
+        _mark_completed_files(journal, file_index)
+    upload_kwargs = None
+    headers = None
+    if metadata is not None and file_index.count_status(Status.NEW) > 0:
+        # Headers only, read once for both the skipping and the rules.
+        headers = metadata.read_index(file_index)
+        if require_date_obs:
+            _mark_files_without_date_obs(headers, file_index, journal)
+        if rules is not None:
+            upload_kwargs = rules.apply(headers)
+    if file_index.count_status(Status.NEW) > 0:
+        _mark_synced_files(context, file_index, journal)
+
+    # One pooled connection per worker, so that no worker waits for the pool.
+    ensure_http_connections(max_workers)
+    uploads = _walk_second_pass(
+        uploader_class,
+        context,
+        root_path,
+        file_index,
+        max_workers=max_workers,
+        journal=journal,
+        compressor=compressor,
+        upload_kwargs=upload_kwargs,
+        concurrency=concurrency,
+        order=order,
+        headers=headers,
+    )
+    if journal is not None:
+        journal.flush()
+    return _log_report(uploads)
+
+
+def _log_report(uploads: UploadReport):
+    logger = get_logger()
+    log_prefix = "[Walker]"
+    counts = uploads.counts
+    msg = f"{log_prefix} uploads succeeded: {counts['succeeded']}, "
+    msg += f"skipped: {counts['skipped']}, failed: {counts['failed']}\n"
     logger.info(msg)
 
-    if len(uploads["skipped"]) > 0:
+    if counts["skipped"] > 0:
         logger.error(f"{log_prefix} Here are the skipped uploads:")
-        for path, substatus, error in uploads["skipped"]:
+        for path, substatus, error in uploads.skipped:
             logger.warning(f"{path} ({substatus})")
 
-    if len(uploads["failed"]) > 0:
+    if counts["failed"] > 0:
         logger.error(f"{log_prefix} Here are the failed uploads:")
-        for path, substatus, error in uploads["failed"]:
+        for path, substatus, error in uploads.failed:
             logger.error(f"{path} ({substatus}) {error}")
+
+    return uploads
@@ -0,0 +1,278 @@
+"""
+Watch a folder tree for new files, to upload them as soon as they are written.
+
+On Linux, inotify (through ctypes, without any dependency) reports the files
+closed after being written, or moved into the tree: nothing runs as long as no
+file is written, and the tree is never scanned again. Elsewhere, or if inotify
+cannot be used (e.g. its limit of watches is reached), the tree is scanned
+every few seconds instead.
+
+Acquisition software may write a file in several steps: a file is only
+reported once it has not changed for `settle_time` seconds.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .logger import get_logger
+
+DEFAULT_SETTLE_TIME = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+# Longest wait for events, so that a stop request is noticed.
+STOP_CHECK_INTERVAL = 1.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+EVENTS_BUFFER_SIZE = 64 * 1024
+
+
+def _is_hidden(name: str) -> bool:
+    return name.startswith(".")
+
+
+class BaseWatcher(object):
+    """Reports the files written in a folder tree, once they are settled."""
+
+    def __init__(self, root_path, settle_time: float = DEFAULT_SETTLE_TIME):
+        self._root_path = Path(root_path)
+        self._settle_time = settle_time
+        self._pending = {}  # path -> (deadline, size, mtime)
+
+    @property
+    def root_path(self) -> Path:
+        return self._root_path
+
+    @property
+    def settle_time(self) -> float:
+        return self._settle_time
+
+    def wait_for(self, file_path):
+        """Report a file once settled, e.g. one found still being written by a scan."""
+        self._touch(str(file_path))
+
+    def watch(self, stop: threading.Event, duration: Optional[float] = None):
+        """Yield the paths of the files written, until `stop` is set or for `duration` seconds.
+
+        Files still being written when the watch stops are not reported.
+        """
+        end = None if duration is None else time.monotonic() + duration
+        while not stop.is_set():
+            now = time.monotonic()
+            if end is not None and now >= end:
+                return
+            timeout = STOP_CHECK_INTERVAL
+            if self._pending:
+                next_deadline = min(d for d, _, _ in self._pending.values())
+                timeout = min(timeout, max(0.0, next_deadline - now))
+            if end is not None:
+                timeout = min(timeout, end - now)
+            self._wait_events(timeout, stop)
+            yield from self._pop_settled()
+
+    def close(self):
+        pass
+
+    def _wait_events(self, timeout: float, stop: threading.Event):
+        raise NotImplementedError()
+
+    def _touch(self, file_path: str):
+        """Note that a file was written: it is reported once settled."""
+        if any(
+            _is_hidden(part)
+            for part in Path(file_path).relative_to(self._root_path).parts
+        ):
+            return
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return  # Already removed
+        if not os.path.isfile(file_path):
+            return
+        deadline = time.monotonic() + self._settle_time
+        self._pending[file_path] = (deadline, stat.st_size, stat.st_mtime)
+
+    def _pop_settled(self):
+        now = time.monotonic()
+        for file_path, (deadline, size, mtime) in list(self._pending.items()):
+            if deadline > now:
+                continue
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                del self._pending[file_path]
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                # Still being written.
+                self._pending[file_path] = (
+                    now + self._settle_time,
+                    stat.st_size,
+                    stat.st_mtime,
+                )
+                continue
+            del self._pending[file_path]
+            yield Path(file_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class InotifyWatcher(BaseWatcher):
+    """Watches a tree with Linux inotify. Raises OSError if it cannot be used."""
+
+    def __init__(self, root_path, settle_time: float = DEFAULT_SETTLE_TIME):
+        super().__init__(root_path, settle_time)
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {}  # watch descriptor -> folder
+        try:
+            self._add_tree(str(self._root_path))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_watch(self, folder: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Cannot watch {folder}: {os.strerror(errno)}")
+        self._watches[wd] = folder
+
+    def _add_tree(self, folder: str, touch_files: bool = False):
+        """Watch a folder and its sub-folders. Files of a new folder may be there before its watch."""
+        for current, folders, files in os.walk(folder):
+            folders[:] = [f for f in folders if not _is_hidden(f)]
+            self._add_watch(current)
+            if touch_files:
+                for name in files:
+                    self._touch(os.path.join(current, name))
+
+    def _wait_events(self, timeout: float, stop: threading.Event):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return
+        while True:
+            try:
+                data = os.read(self._fd, EVENTS_BUFFER_SIZE)
+            except BlockingIOError:
+                return
+            self._handle_events(data)
+
+    def _handle_events(self, data: bytes):
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                get_logger().warning(
+                    "[Watcher] Too many events at once, looking for new files in the whole folder."
+                )
+                self._add_tree(str(self._root_path), touch_files=True)
+                continue
+            folder = self._watches.get(wd)
+            if folder is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._watches[wd]  # Folder removed
+                continue
+            if _is_hidden(name):
+                continue
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path, touch_files=True)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._touch(path)
+
+
+class PollingWatcher(BaseWatcher):
+    """Watches a tree by scanning it every `poll_interval` seconds."""
+
+    def __init__(
+        self,
+        root_path,
+        settle_time: float = DEFAULT_SETTLE_TIME,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        super().__init__(root_path, settle_time)
+        self._poll_interval = poll_interval
+        # Files present at the start are not reported.
+        self._known = self._scan()
+        self._next_scan = time.monotonic() + poll_interval
+
+    def _scan(self) -> dict:
+        files = {}
+        for current, folders, names in os.walk(str(self._root_path)):
+            folders[:] = [f for f in folders if not _is_hidden(f)]
+            for name in names:
+                if _is_hidden(name):
+                    continue
+                path = os.path.join(current, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def _wait_events(self, timeout: float, stop: threading.Event):
+        remaining = self._next_scan - time.monotonic()
+        if remaining > timeout:
+            stop.wait(timeout)
+            return
+        stop.wait(max(0.0, remaining))
+        self._next_scan = time.monotonic() + self._poll_interval
+        files = self._scan()
+        for path, signature in files.items():
+            if self._known.get(path) != signature:
+                self._touch(path)
+        self._known = files
+
+
+def get_watcher(
+    root_path,
+    settle_time: float = DEFAULT_SETTLE_TIME,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+) -> BaseWatcher:
+    """Return an inotify watcher of a folder tree if possible, or a polling one."""
+    try:
+        return InotifyWatcher(root_path, settle_time)
+    except OSError as error:
+        get_logger().info(
+            f"[Watcher] Cannot use inotify ({error}), scanning the folder every {poll_interval:g}s."
+        )
+        return PollingWatcher(root_path, settle_time, poll_interval)
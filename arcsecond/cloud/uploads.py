@@ -5,15 +5,39 @@ from arcsecond.cloud.uploader import (
     DatasetFileUploader,
     DatasetUploadContext,
 )
+from arcsecond.cloud.uploader.bandwidth import BandwidthLimiter, BandwidthSchedule
+from arcsecond.cloud.uploader.concurrency import ConcurrencyController
+from arcsecond.cloud.uploader.datafiles.rules import load_upload_rules
 from arcsecond.cloud.uploader.datafiles.utils import (
     display_upload_datafiles_command_summary,
 )
+from arcsecond.cloud.uploader.index import FileIndex
+from arcsecond.cloud.uploader.journal import get_upload_journal
+from arcsecond.cloud.uploader.metadata import MetadataExtractor, get_metadata_cache
+from arcsecond.cloud.uploader.ordering import UPLOAD_ORDERS, get_upload_order
 from arcsecond.cloud.uploader.walker import walk_folder_and_upload_files
 from arcsecond.options import State, basic_options
 
 pass_state = click.make_pass_decorator(State, ensure=True)
 
 
+class JobsParamType(click.ParamType):
+    """A number of parallel uploads, or 'auto' to adapt it while uploading."""
+
+    name = "integer|auto"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, int) or str(value).lower() == "auto":
+            return value if isinstance(value, int) else "auto"
+        try:
+            jobs = int(value)
+        except ValueError:
+            self.fail(f"{value!r} is neither an integer nor 'auto'.", param, ctx)
+        if jobs < 1:
+            self.fail(f"{jobs} is smaller than the minimum of 1.", param, ctx)
+        return jobs
+
+
 @click.command()
 @click.argument("folder", required=True, nargs=1)
 @click.option(
@@ -53,10 +77,93 @@ pass_state = click.make_pass_decorator(State, ensure=True)
     type=click.STRING,
     help="The portal subdomain, if uploading for an Observatory Portal.",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    required=False,
+    nargs=1,
+    type=JobsParamType(),
+    default=1,
+    show_default=True,
+    help="The number of files uploaded in parallel, or 'auto' to adapt it to the measured throughput.",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="Start uploading files while the folder is being walked (for very large trees).",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="Keep watching the folder after the upload, and upload new files as soon as they are written (implies --stream).",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Skip the files already uploaded by a previous run, according to the local upload journal.",
+)
+@click.option(
+    "--compress",
+    required=False,
+    type=click.Choice(["gzip", "bz2", "auto"]),
+    help="Compress data files before uploading them. With auto, only files that compress well are, with gzip.",
+)
+@click.option(
+    "--require-date-obs",
+    is_flag=True,
+    default=False,
+    help="Skip FITS and XISF files whose header has no DATE-OBS.",
+)
+@click.option(
+    "--rules",
+    "rules_path",
+    required=False,
+    type=click.Path(exists=True, dir_okay=False),
+    help="A YAML or INI file of rules giving the tags and raw flag of each file, from its FITS or XISF header.",
+)
+@click.option(
+    "--bandwidth",
+    required=False,
+    nargs=1,
+    type=click.STRING,
+    help="Cap the upload rate, in bytes per second, by time of the day, e.g. '18:00-07:00=200k' or '1M'.",
+)
+@click.option(
+    "--bandwidth-file",
+    "bandwidth_path",
+    required=False,
+    type=click.Path(exists=True, dir_okay=False),
+    help="A file with the same caps as --bandwidth, read again whenever it changes.",
+)
+@click.option(
+    "--order",
+    required=False,
+    type=click.Choice(list(UPLOAD_ORDERS)),
+    help="Upload files newest or oldest first (by modification time or DATE-OBS), or smallest or largest first.",
+)
 @basic_options
 @pass_state
 def upload_data(
-    state, folder, dataset=None, telescope=None, raw=None, tags=None, portal=None
+    state,
+    folder,
+    dataset=None,
+    telescope=None,
+    raw=None,
+    tags=None,
+    portal=None,
+    jobs=1,
+    stream=False,
+    watch=False,
+    resume=False,
+    compress=None,
+    require_date_obs=False,
+    rules_path=None,
+    bandwidth=None,
+    bandwidth_path=None,
+    order=None,
 ):
     """
     Upload the data files contained in a folder.
@@ -64,9 +171,9 @@ def upload_data(
     You will be prompted for confirmation before the whole walking process actually
     start.
 
-    Warning: this method allows to upload a folder with a **consistent** raw data flag as well
-    as common custom tags, both applied to every single file. If you want to upload a mixed-content
-    folder, you must write your own script.
+    By default, the raw data flag and the custom tags are applied to every single file.
+    To upload a mixed-content folder, use `--rules` to give the tags and raw flag of each
+    file from its header.
 
     Every DataFile must belong to a Dataset. If you provide a Dataset UUID, Arcsecond will
     append files to the dataset. If you provide a Dataset *name*, Arcsecond will try to find
@@ -82,8 +189,54 @@ def upload_data(
     account or portal.
 
     Upon validation, Arcsecond will then start walking through the folder tree and uploads regular
-    files (hidden and empty files will always be skipped).
+    files (hidden and empty files will always be skipped). Use --jobs to upload several files
+    in parallel. With --jobs auto, the number of parallel uploads starts low, and is raised
+    while the throughput improves, or lowered on errors and rising latency. Press Ctrl-C to
+    stop: files being uploaded are finished, the others are left for a later run.
+
+    With --stream, uploads start as soon as the first files are found, instead of after
+    a full walk of the folder (whose volume is then not shown in the summary). Duplicate
+    file names stop the upload when they are met.
+
+    With --watch, the command then keeps watching the folder during the night, and uploads
+    every new file as soon as the acquisition software has finished writing it (with inotify
+    on Linux, by scanning the folder every few seconds elsewhere). Press Ctrl-C to stop.
+
+    Every upload is recorded in a local journal. If an upload was interrupted, run the same
+    command again with --resume: files already uploaded are skipped without checking them
+    with the server, and only failed or pending ones are uploaded.
+
+    With --compress, FITS and XISF files are compressed by a pool of processes, ahead of their
+    upload, and uploaded as .gz or .bz2 files. This saves a lot of time on slow links.
+
+    With --require-date-obs, FITS and XISF files whose header has no DATE-OBS are skipped.
+    Only headers are read, and they are cached locally, so that the next runs do not read
+    them again.
+
+    With --rules, each file gets its own tags and raw flag, from its header, so that a whole
+    night of mixed content (bias, darks, flats and science frames) can be uploaded at once.
+    Calibration frames can also be grouped by exposure time, filter and temperature. See the
+    documentation for the format of the rules file.
+
+    With --bandwidth, all uploads share a cap of bytes per second, which can depend on the
+    time of the day (local time), e.g. '18:00-07:00=200k' leaves room on the link for remote
+    operations during the night, and sends at full speed by day. With --bandwidth-file, the
+    caps are read from a file, which can be edited while uploading.
+
+    With --order, files are uploaded in that order instead of the order they are found, e.g.
+    newest first to get the latest frames online first for quick-look, or smallest first to
+    complete as many files as possible on a limited link. While watching, new files jump the
+    line when their turn comes earlier.
     """
+    # Local files first, so that a malformed one fails before any request.
+    rules = load_upload_rules(rules_path) if rules_path else None
+    upload_order = get_upload_order(order)
+    limiter = None
+    if bandwidth_path:
+        limiter = BandwidthLimiter(path=bandwidth_path)
+    elif bandwidth:
+        limiter = BandwidthLimiter(BandwidthSchedule.parse(bandwidth))
+
     config = ArcsecondConfig.from_state(state)
     context = DatasetUploadContext(
         config,
@@ -95,13 +248,53 @@ def upload_data(
     )
 
     context.validate()
-
-    display_upload_datafiles_command_summary(
-        context,
-        [
+    journal = get_upload_journal(context)
+    if resume and journal is None:
+        raise click.UsageError(
+            "--resume needs the local upload journal, which cannot be used with this configuration."
+        )
+    needs_header = upload_order is not None and upload_order.needs_header
+    needs_cache = require_date_obs or rules is not None or needs_header
+    cache = None
+    try:
+        # Walk the folder tree once, for both the summary and the upload.
+        stream = stream or watch
+        file_index = None if stream else FileIndex.build(folder)
+        display_upload_datafiles_command_summary(
+            context,
+            [
+                folder,
+            ],
+            None if stream else [file_index],
+            show_volume=not stream,
+            rules=rules,
+            bandwidth=limiter,
+            order=upload_order,
+        )
+        ok = input("\n   ----> OK? (Press Enter) ")
+        if ok.strip() != "":
+            return
+        cache = get_metadata_cache() if needs_cache else None
+        walk_folder_and_upload_files(
+            DatasetFileUploader,
+            context,
             folder,
-        ],
-    )
-    ok = input("\n   ----> OK? (Press Enter) ")
-    if ok.strip() == "":
-        walk_folder_and_upload_files(DatasetFileUploader, context, folder)
+            max_workers=1 if jobs == "auto" else jobs,
+            file_index=file_index,
+            stream=stream,
+            watch=watch,
+            journal=journal,
+            resume=resume,
+            compression=compress,
+            require_date_obs=require_date_obs,
+            metadata=MetadataExtractor(cache) if cache is not None else None,
+            rules=rules,
+            concurrency=ConcurrencyController() if jobs == "auto" else None,
+            bandwidth=limiter,
+            order=upload_order,
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+        if cache is not None:
+            cache.close()
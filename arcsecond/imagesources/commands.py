@@ -3,19 +3,38 @@ Click command groups: ``arcsecond webcam`` and ``arcsecond allsky``.
 
 Both groups talk to the same proxy. ``webcam`` is kept for backward
 compatibility; ``allsky`` is the new entry point for fisheye / all-sky
-cameras whose driver software writes JPEGs to disk.
+cameras whose driver software writes JPEGs to disk. ``arcsecond allsky
+upload`` also uploads these images to the camera, optionally while serving
+them through the proxy.
 """
 
+import asyncio
 import logging
+from datetime import timezone
 
 import click
 
+from arcsecond.api import ArcsecondConfig
+from arcsecond.cloud.uploader.allskycameraimages.context import (
+    AllSkyCameraImageUploadContext,
+)
+from arcsecond.cloud.uploader.allskycameraimages.follower import AllSkyImageFollower
+from arcsecond.cloud.uploader.allskycameraimages.timestamps import (
+    TimestampExtractor,
+)
+from arcsecond.cloud.uploader.allskycameraimages.utils import (
+    display_follow_allskycameraimages_command_summary,
+)
+from arcsecond.options import State, basic_options
+
 from .registry import AllskyOverride
 from .sources.filewatch import detect_allsky
 from .sources.opencv import detect_webcams
 
 logger = logging.getLogger(__name__)
 
+pass_state = click.make_pass_decorator(State, ensure=True)
+
 
 def _check_aiohttp():
     try:
@@ -53,7 +72,9 @@ def _parse_allsky_overrides(values: tuple[str, ...]) -> list[AllskyOverride]:
     return overrides
 
 
-def _run_proxy(host: str, port: int, log_level: str, allsky_overrides):
+def _run_proxy(
+    host: str, port: int, log_level: str, allsky_overrides, background_tasks=None
+):
     _check_aiohttp()
 
     logging.basicConfig(
@@ -73,7 +94,12 @@ def _run_proxy(host: str, port: int, log_level: str, allsky_overrides):
 
     from .proxy import run
 
-    run(host=host, port=port, allsky_overrides=allsky_overrides)
+    run(
+        host=host,
+        port=port,
+        allsky_overrides=allsky_overrides,
+        background_tasks=background_tasks,
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -204,3 +230,106 @@ def allsky_detect_cmd():
 def allsky_start_cmd(port, host, log_level, allsky):
     overrides = _parse_allsky_overrides(allsky)
     _run_proxy(host, port, log_level, overrides)
+
+
+@allsky.command(
+    name="upload",
+    help=(
+        "Upload the new images of an all-sky camera as they are written.\n\n"
+        "PATH is the image file written by the all-sky software (e.g. its "
+        '"latest image"), or a glob. Each new image is uploaded to the images '
+        "of the camera CAMERA (its UUID), with the UTC time it was taken, read "
+        "from its file name (see --timestamp-pattern), its FITS header or its "
+        "EXIF data. Images without timestamp are skipped.\n\n"
+        "With --serve, the live-image proxy also runs in the same process, "
+        "streaming the same images as source allsky:<ID>: each image is read "
+        "only once for both.\n\n"
+        "Press Ctrl-C to stop."
+    ),
+)
+@click.argument("camera", required=True, type=click.UUID)
+@click.argument("path", required=True)
+@click.option(
+    "-p",
+    "--portal",
+    required=False,
+    type=click.STRING,
+    help="The portal subdomain, if uploading for an Observatory Portal.",
+)
+@click.option(
+    "--timestamp-pattern",
+    "timestamp_patterns",
+    multiple=True,
+    metavar="PATTERN",
+    help="A pattern of image file names giving the time they were taken, in strftime "
+    "format, with * and ? wildcards, e.g. 'image-%Y%m%d%H%M%S.jpg'. Repeatable.",
+)
+@click.option(
+    "--utc",
+    is_flag=True,
+    default=False,
+    help="Times of file names and EXIF data without time zone are in UTC, "
+    "rather than in the local time of this computer.",
+)
+@click.option(
+    "--use-mtime",
+    is_flag=True,
+    default=False,
+    help="Use the modification time of images whose timestamp cannot be found otherwise.",
+)
+@click.option(
+    "--serve",
+    is_flag=True,
+    default=False,
+    help="Also run the live-image proxy, sharing the images read.",
+)
+@click.option(
+    "--id",
+    "source_id",
+    default="camera",
+    show_default=True,
+    help="The id of the all-sky source served by the proxy, with --serve.",
+)
+@_add_options(_start_options[:3])
+@basic_options
+@pass_state
+def allsky_upload_cmd(
+    state,
+    camera,
+    path,
+    portal=None,
+    timestamp_patterns=(),
+    utc=False,
+    use_mtime=False,
+    serve=False,
+    source_id="camera",
+    port=8765,
+    host="0.0.0.0",
+    log_level="INFO",
+):
+    if serve:
+        _check_aiohttp()
+    extractor = TimestampExtractor(
+        timestamp_patterns,
+        naive_timezone=timezone.utc if utc else None,
+        use_mtime=use_mtime,
+    )
+    config = ArcsecondConfig.from_state(state)
+    context = AllSkyCameraImageUploadContext(config, camera, org_subdomain=portal)
+    context.validate()
+    display_follow_allskycameraimages_command_summary(context, path, extractor)
+
+    follower = AllSkyImageFollower(context, path, extractor)
+    try:
+        if serve:
+            overrides = [AllskyOverride(id=source_id, path=path)]
+            _run_proxy(host, port, log_level, overrides, [follower.run])
+        else:
+            asyncio.run(follower.run())
+    except KeyboardInterrupt:
+        pass
+    counts = follower.counts
+    click.echo(
+        f"\n • Images uploaded: {counts['succeeded']}, skipped: {counts['skipped']}, "
+        f"failed: {counts['failed']}."
+    )
@@ -141,13 +141,28 @@ def run(
     host: str = "0.0.0.0",
     port: int = 8765,
     allsky_overrides: Optional[list[AllskyOverride]] = None,
+    background_tasks: Optional[list] = None,
 ):
-    """Build and run the aiohttp application (blocking)."""
+    """Build and run the aiohttp application (blocking).
+
+    ``background_tasks`` are coroutine functions run on the same event loop
+    while the server runs (e.g. the uploader of ``arcsecond allsky upload``),
+    and cancelled when it stops.
+    """
     from aiohttp import web
 
     app = web.Application()
     app["registry"] = Registry(allsky_overrides=allsky_overrides)
 
+    async def _run_background_tasks(app):
+        tasks = [asyncio.create_task(task()) for task in background_tasks or []]
+        yield
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    app.cleanup_ctx.append(_run_background_tasks)
+
     app.router.add_get("/health", handle_health)
     app.router.add_get("/detect", handle_detect)
     app.router.add_get("/stream/{id}", handle_stream)
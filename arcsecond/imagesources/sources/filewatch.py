@@ -6,11 +6,17 @@ disk every 30-120 seconds, usually keeping a stable "latest image" path
 (symlink or fixed filename). This source returns the file's bytes whenever its
 mtime changes, and ``None`` otherwise. The proxy stays dumb — no decoding,
 stretching or re-encoding.
+
+Each image is read from disk once per process: the proxy clients and the
+uploader of ``arcsecond allsky upload`` share the bytes of the latest images
+through ``FRAME_CACHE``.
 """
 
 import asyncio
 import glob
 import logging
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional
 
@@ -30,6 +36,40 @@ ALLSKY_DISCOVERY_PATHS: list[Path] = [
     Path.home() / "indi-allsky" / "latest.jpg",
 ]
 
+# Latest images kept in memory, shared by every source of the process.
+_FRAME_CACHE_SIZE = 8
+
+
+class FrameCache:
+    """Bytes of the latest images read, keyed by path and mtime."""
+
+    def __init__(self, max_size: int = _FRAME_CACHE_SIZE):
+        self._max_size = max_size
+        self._frames: OrderedDict[Path, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, path: Path, mtime: float) -> bytes:
+        """Return the bytes of the image, read from disk only if not already in memory."""
+        with self._lock:
+            cached = self._frames.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._frames.move_to_end(path)
+                return cached[1]
+        data = path.read_bytes()
+        with self._lock:
+            self._frames[path] = (mtime, data)
+            self._frames.move_to_end(path)
+            while len(self._frames) > self._max_size:
+                self._frames.popitem(last=False)
+        return data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+
+
+FRAME_CACHE = FrameCache()
+
 
 class FileWatchSource(FrameSource):
     """Emit a frame whenever a file's mtime changes.
@@ -49,6 +89,11 @@ class FileWatchSource(FrameSource):
         self._last_mtime: Optional[float] = None
         self._last_path: Optional[Path] = None
 
+    @property
+    def last_path(self) -> Optional[Path]:
+        """Path of the last frame returned by ``read()``."""
+        return self._last_path
+
     async def open(self) -> None:
         # Nothing to acquire — file is read on each poll.
         return
@@ -75,7 +120,7 @@ class FileWatchSource(FrameSource):
             mtime = current.stat().st_mtime
             if current == self._last_path and mtime == self._last_mtime:
                 return None
-            data = current.read_bytes()
+            data = FRAME_CACHE.read(current, mtime)
             self._last_path = current
             self._last_mtime = mtime
             return data
@@ -1,6 +1,10 @@
+import json
+import time
 from unittest.mock import Mock, patch
 
 import pytest
+import respx
+from httpx import Response
 
 from arcsecond.api.config import ArcsecondConfig
 from arcsecond.api.endpoint import ArcsecondAPIEndpoint, ArcsecondError
@@ -59,7 +63,7 @@ def test_detail_url(endpoint):
     assert url == "https://fixture.example.io/sub/test/123/"
 
 
-@patch("httpx.get")
+@patch("httpx.Client.get")
 def test_list_success(mock_get, endpoint):
     mock_response = Mock()
     mock_response.status_code = 200
@@ -73,7 +77,7 @@ def test_list_success(mock_get, endpoint):
     mock_get.assert_called_once()
 
 
-@patch("httpx.get")
+@patch("httpx.Client.get")
 def test_read_success(mock_get, endpoint):
     mock_response = Mock()
     mock_response.status_code = 200
@@ -86,7 +90,7 @@ def test_read_success(mock_get, endpoint):
     assert response == {"id": "123"}
 
 
-@patch("httpx.post")
+@patch("httpx.Client.post")
 def test_create_success(mock_post, endpoint):
     mock_response = Mock()
     mock_response.status_code = 201
@@ -99,7 +103,7 @@ def test_create_success(mock_post, endpoint):
     assert response == {"id": "new"}
 
 
-@patch("httpx.post")
+@patch("httpx.Client.post")
 def test_create_success_with_keyword_fields(mock_post, endpoint):
     mock_response = Mock()
     mock_response.status_code = 201
@@ -114,7 +118,7 @@ def test_create_success_with_keyword_fields(mock_post, endpoint):
     assert kwargs["json"] == {"name": "test", "enabled": True}
 
 
-@patch("httpx.patch")
+@patch("httpx.Client.patch")
 def test_update_success(mock_patch, endpoint):
     mock_response = Mock()
     mock_response.status_code = 200
@@ -127,7 +131,7 @@ def test_update_success(mock_patch, endpoint):
     assert response == {"id": "123", "updated": True}
 
 
-@patch("httpx.get")
+@patch("httpx.Client.get")
 def test_find_one_success(mock_get, endpoint):
     mock_response = Mock()
     mock_response.status_code = 200
@@ -140,8 +144,8 @@ def test_find_one_success(mock_get, endpoint):
     assert response == {"id": "123", "name": "single"}
 
 
-@patch("httpx.patch")
-@patch("httpx.get")
+@patch("httpx.Client.patch")
+@patch("httpx.Client.get")
 def test_upsert_updates_existing_match(mock_get, mock_patch, endpoint):
     mock_list_response = Mock()
     mock_list_response.status_code = 200
@@ -164,7 +168,7 @@ def test_upsert_updates_existing_match(mock_get, mock_patch, endpoint):
     assert kwargs["json"] == {"name": "existing", "enabled": False}
 
 
-@patch("httpx.delete")
+@patch("httpx.Client.delete")
 def test_delete_success(mock_delete, endpoint):
     mock_response = Mock()
     mock_response.status_code = 204
@@ -185,7 +189,7 @@ def test_check_and_set_auth_key_no_key(config):
     assert "Missing auth keys" in str(exc_info.value)
 
 
-@patch("httpx.get")
+@patch("httpx.Client.get")
 def test_error_response(mock_get, endpoint):
     mock_response = Mock()
     mock_response.status_code = 404
@@ -195,3 +199,256 @@ def test_error_response(mock_get, endpoint):
     response, error = endpoint.read("123")
     assert response is None
     assert isinstance(error, ArcsecondError)
+
+
+def make_page(base_url, page, page_count, page_size=2):
+    results = [{"id": (page - 1) * page_size + i} for i in range(1, page_size + 1)]
+    next_url = f"{base_url}?page={page + 1}" if page < page_count else None
+    return {"count": page_count * page_size, "next": next_url, "results": results}
+
+
+@respx.mock
+def test_iter_all_follows_pagination(endpoint):
+    base_url = "https://fixture.example.io/sub/test/"
+    respx.get(base_url).mock(
+        side_effect=lambda request: Response(
+            200,
+            json=make_page(
+                base_url, int(request.url.params.get("page", 1)), page_count=3
+            ),
+        )
+    )
+    assert [r["id"] for r in endpoint.iter_all()] == [1, 2, 3, 4, 5, 6]
+
+
+@respx.mock
+def test_iter_all_stops_when_consumer_breaks(endpoint):
+    base_url = "https://fixture.example.io/sub/test/"
+    route = respx.get(base_url).mock(
+        side_effect=lambda request: Response(
+            200,
+            json=make_page(
+                base_url, int(request.url.params.get("page", 1)), page_count=100
+            ),
+        )
+    )
+    for result in endpoint.iter_all():
+        if result["id"] == 3:
+            break
+    # First two pages plus at most one prefetched page, not the 100 of them.
+    assert route.call_count <= 3
+
+
+@respx.mock
+def test_iter_all_raises_errors(endpoint):
+    respx.get("https://fixture.example.io/sub/test/?name=x").mock(
+        Response(403, text="Forbidden")
+    )
+    with pytest.raises(ArcsecondError) as exc_info:
+        list(endpoint.iter_all(name="x"))
+    assert exc_info.value.status == 403
+
+
+@respx.mock
+def test_list_all_fetches_counted_pages_in_parallel(endpoint):
+    base_url = "https://fixture.example.io/sub/test/"
+    route = respx.get(base_url).mock(
+        side_effect=lambda request: Response(
+            200,
+            json=make_page(
+                base_url, int(request.url.params.get("page", 1)), page_count=5
+            ),
+        )
+    )
+    results, error = endpoint.list_all(parallel=4)
+    assert error is None
+    assert [r["id"] for r in results] == list(range(1, 11))
+    assert route.call_count == 5
+
+
+@respx.mock
+def test_list_all_supports_limit_offset_pagination(endpoint):
+    base_url = "https://fixture.example.io/sub/test/"
+
+    def respond(request):
+        offset = int(request.url.params.get("offset", 0))
+        next_url = f"{base_url}?limit=3&offset={offset + 3}" if offset < 6 else None
+        results = [{"id": i} for i in range(offset, min(offset + 3, 8))]
+        return Response(200, json={"count": 8, "next": next_url, "results": results})
+
+    respx.get(base_url).mock(side_effect=respond)
+    results, error = endpoint.list_all(parallel=3)
+    assert error is None
+    assert [r["id"] for r in results] == list(range(8))
+
+
+@respx.mock
+def test_list_all_falls_back_to_next_links_without_count(endpoint):
+    base_url = "https://fixture.example.io/sub/test/"
+
+    def respond(request):
+        page = make_page(base_url, int(request.url.params.get("page", 1)), 3)
+        del page["count"]
+        return Response(200, json=page)
+
+    route = respx.get(base_url).mock(side_effect=respond)
+    results, error = endpoint.list_all(parallel=4)
+    assert error is None
+    assert [r["id"] for r in results] == [1, 2, 3, 4, 5, 6]
+    assert route.call_count == 3
+
+
+@respx.mock
+def test_list_all_returns_page_errors(endpoint):
+    base_url = "https://fixture.example.io/sub/test/"
+
+    def respond(request):
+        page = int(request.url.params.get("page", 1))
+        if page == 3:
+            return Response(500, text="Server Error")
+        return Response(200, json=make_page(base_url, page, page_count=4))
+
+    respx.get(base_url).mock(side_effect=respond)
+    results, error = endpoint.list_all(parallel=2)
+    assert results is None
+    assert error.status == 500
+
+
+@respx.mock
+def test_create_many_yields_results_in_input_order(endpoint):
+    base_url = "https://fixture.example.io/sub/test/"
+
+    def respond(request):
+        name = json.loads(request.content)["name"]
+        time.sleep(0.01 * (5 - int(name)))  # first items answer last
+        if name == "3":
+            return Response(400, text="Invalid")
+        return Response(201, json={"name": name})
+
+    route = respx.post(base_url).mock(side_effect=respond)
+    payloads = ({"name": str(i)} for i in range(6))
+    results = list(endpoint.create_many(payloads, concurrency=3))
+
+    assert route.call_count == 6
+    assert [r["name"] for r, e in results if e is None] == ["0", "1", "2", "4", "5"]
+    assert results[3][0] is None and results[3][1].status == 400
+
+
+@respx.mock
+def test_update_read_delete_many(endpoint):
+    base_url = "https://fixture.example.io/sub/test"
+    respx.patch(url__regex=rf"{base_url}/\w+/").mock(
+        side_effect=lambda request: Response(200, json=json.loads(request.content))
+    )
+    respx.get(url__regex=rf"{base_url}/\w+/").mock(
+        side_effect=lambda request: Response(200, json={"url": str(request.url)})
+    )
+    delete_route = respx.delete(url__regex=rf"{base_url}/\w+/").mock(
+        return_value=Response(204)
+    )
+
+    updates = list(
+        endpoint.update_many([("a", {"name": "A"}), {"uuid": "b", "name": "B"}, {}])
+    )
+    assert updates[0] == ({"name": "A"}, None)
+    assert updates[1] == ({"uuid": "b", "name": "B"}, None)
+    assert updates[2][0] is None and "identifier" in str(updates[2][1])
+
+    reads = list(endpoint.read_many(["x", "y"]))
+    assert [r["url"] for r, _ in reads] == [f"{base_url}/x/", f"{base_url}/y/"]
+
+    assert list(endpoint.delete_many(["x", "y"])) == [({}, None), ({}, None)]
+    assert delete_route.call_count == 2
+
+
+@respx.mock
+def test_many_helpers_use_native_batches_when_available(endpoint):
+    endpoint.native_batch_actions = frozenset({"create"})
+    endpoint.native_batch_size = 2
+    route = respx.post("https://fixture.example.io/sub/test/batch/").mock(
+        side_effect=lambda request: Response(
+            200, json=[dict(p, id=1) for p in json.loads(request.content)["items"]]
+        )
+    )
+    results = list(endpoint.create_many({"name": str(i)} for i in range(3)))
+    assert route.call_count == 2
+    assert json.loads(route.calls[0].request.content)["action"] == "create"
+    assert [r["name"] for r, _ in results] == ["0", "1", "2"]
+
+
+def test_many_helpers_reject_invalid_concurrency(endpoint):
+    with pytest.raises(ValueError):
+        endpoint.create_many([], concurrency=0)
+
+
+@respx.mock
+def test_upsert_many_lists_once_and_writes_only_what_is_needed(endpoint):
+    base_url = "https://fixture.example.io/sub/test/"
+    list_route = respx.get(base_url).mock(
+        return_value=Response(
+            200,
+            json=[
+                {"uuid": "u1", "name": "M31"},
+                {"uuid": "u2", "name": "M42"},
+                {"uuid": "u3", "name": "twin"},
+                {"uuid": "u4", "name": "twin"},
+            ],
+        )
+    )
+    create_route = respx.post(base_url).mock(
+        side_effect=lambda request: Response(
+            201, json=dict(json.loads(request.content), uuid="new")
+        )
+    )
+    update_route = respx.patch(url__regex=rf"{base_url}\w+/").mock(
+        side_effect=lambda request: Response(200, json=json.loads(request.content))
+    )
+
+    records = [
+        {"name": "M31", "notes": "a"},
+        {"name": "NGC 104"},
+        {"name": "twin"},
+        {"name": "NGC 104", "notes": "b"},
+        {"name": "M42"},
+    ]
+    results = list(endpoint.upsert_many(records, concurrency=3))
+
+    assert list_route.call_count == 1
+    assert create_route.call_count == 1
+    assert update_route.call_count == 3
+    assert results[0] == ({"name": "M31", "notes": "a"}, None)
+    assert results[1] == ({"name": "NGC 104", "uuid": "new"}, None)
+    assert "got 2" in str(results[2][1])
+    # The second record with a new name updates the resource created for the first.
+    assert any(c.request.url.path.endswith("/new/") for c in update_route.calls)
+    assert results[3] == ({"name": "NGC 104", "notes": "b"}, None)
+    assert results[4] == ({"name": "M42"}, None)
+
+
+@respx.mock
+def test_upsert_many_can_look_up_by_chunks(endpoint):
+    base_url = "https://fixture.example.io/sub/test/"
+
+    def respond(request):
+        names = request.url.params["name__in"].split(",")
+        return Response(200, json=[{"id": n, "name": n} for n in names if n != "c"])
+
+    list_route = respx.get(base_url).mock(side_effect=respond)
+    respx.post(base_url).mock(return_value=Response(201, json={"id": "created"}))
+    respx.patch(url__regex=rf"{base_url}\w+/").mock(return_value=Response(200, json={}))
+
+    records = [{"name": n} for n in "abcde"]
+    results = list(endpoint.upsert_many(records, lookup_chunk_size=2))
+
+    assert list_route.call_count == 3
+    assert results[2] == ({"id": "created"}, None)
+    assert all(error is None for _, error in results)
+
+
+@respx.mock
+def test_upsert_many_reports_lookup_errors_for_every_record(endpoint):
+    respx.get("https://fixture.example.io/sub/test/").mock(
+        return_value=Response(500, text="Server Error")
+    )
+    results = list(endpoint.upsert_many([{"name": "a"}, {"name": "b"}]))
+    assert [error.status for _, error in results] == [500, 500]
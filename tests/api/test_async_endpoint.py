@@ -0,0 +1,172 @@
+import asyncio
+from unittest.mock import Mock
+
+import respx
+from httpx import ConnectError, Response
+
+from arcsecond import AsyncArcsecondAPI
+from arcsecond.api.async_endpoint import AsyncArcsecondAPIEndpoint
+from arcsecond.api.cache import ResponseCache
+from arcsecond.api.config import ArcsecondConfig
+from arcsecond.errors import ArcsecondError
+
+BASE_URL = "https://fixture.example.io"
+
+
+def make_config():
+    config = Mock(spec=ArcsecondConfig)
+    config.api_server = BASE_URL
+    config.verbose = False
+    config.access_key = "test_access_key"
+    config.upload_key = None
+    return config
+
+
+def run(coroutine):
+    async def _run():
+        async with AsyncArcsecondAPI(make_config()):
+            return await coroutine
+
+    return asyncio.run(_run())
+
+
+@respx.mock
+def test_async_read_and_list():
+    respx.get(f"{BASE_URL}/sub/test/123/").mock(Response(200, json={"id": "123"}))
+    respx.get(f"{BASE_URL}/sub/test/?name=x").mock(
+        Response(200, json={"results": [{"id": "1", "name": "x"}]})
+    )
+    endpoint = AsyncArcsecondAPIEndpoint(make_config(), "test", "sub")
+
+    assert run(endpoint.read("123")) == ({"id": "123"}, None)
+    assert run(endpoint.find_one(name="x")) == ({"id": "1", "name": "x"}, None)
+
+
+@respx.mock
+def test_async_create_sends_auth_header_and_json():
+    route = respx.post(f"{BASE_URL}/sub/test/").mock(Response(201, json={"id": "new"}))
+    endpoint = AsyncArcsecondAPIEndpoint(make_config(), "test", "sub")
+
+    response, error = run(endpoint.create(name="test"))
+    assert error is None
+    assert response == {"id": "new"}
+    request = route.calls.last.request
+    assert request.headers["X-Arcsecond-API-Authorization"] == "Key test_access_key"
+    assert request.content == b'{"name":"test"}'
+
+
+@respx.mock
+def test_async_upsert_updates_existing_match():
+    respx.get(f"{BASE_URL}/sub/test/?name=existing").mock(
+        Response(200, json={"results": [{"id": "123", "name": "existing"}]})
+    )
+    route = respx.patch(f"{BASE_URL}/sub/test/123/").mock(
+        Response(200, json={"id": "123", "name": "existing"})
+    )
+    endpoint = AsyncArcsecondAPIEndpoint(make_config(), "test", "sub")
+
+    response, error = run(endpoint.upsert(name="existing", enabled=False))
+    assert error is None
+    assert response == {"id": "123", "name": "existing"}
+    assert route.called
+
+
+@respx.mock
+def test_async_errors_are_returned_as_tuples():
+    respx.delete(f"{BASE_URL}/sub/test/404/").mock(Response(404, text="Not Found"))
+    respx.delete(f"{BASE_URL}/sub/test/down/").mock(side_effect=ConnectError("down"))
+    endpoint = AsyncArcsecondAPIEndpoint(make_config(), "test", "sub")
+
+    response, error = run(endpoint.delete("404"))
+    assert response is None
+    assert isinstance(error, ArcsecondError) and error.status == 404
+
+    response, error = run(endpoint.delete("down"))
+    assert response is None
+    assert isinstance(error, ArcsecondError) and error.status == 400
+
+
+@respx.mock
+def test_many_requests_in_flight_on_one_event_loop():
+    respx.get(url__regex=rf"{BASE_URL}/test/\d+/").mock(
+        side_effect=lambda request: Response(200, json={"url": str(request.url)})
+    )
+    api_endpoint = AsyncArcsecondAPIEndpoint(make_config(), "test")
+
+    async def read_all():
+        return await asyncio.gather(*(api_endpoint.read(i) for i in range(50)))
+
+    results = run(read_all())
+    assert [r["url"] for r, _ in results] == [
+        f"{BASE_URL}/test/{i}/" for i in range(50)
+    ]
+
+
+@respx.mock
+def test_async_iter_all_follows_pagination():
+    respx.get(f"{BASE_URL}/test/").mock(
+        side_effect=lambda request: Response(
+            200,
+            json={
+                "next": (
+                    None
+                    if request.url.params.get("page") == "2"
+                    else f"{BASE_URL}/test/?page=2"
+                ),
+                "results": [{"page": request.url.params.get("page", "1")}],
+            },
+        )
+    )
+    endpoint = AsyncArcsecondAPIEndpoint(make_config(), "test")
+
+    async def collect():
+        return [result async for result in endpoint.iter_all()]
+
+    assert run(collect()) == [{"page": "1"}, {"page": "2"}]
+
+
+@respx.mock
+def test_async_list_all_fetches_counted_pages_concurrently():
+    def respond(request):
+        page = int(request.url.params.get("page", 1))
+        return Response(
+            200,
+            json={
+                "count": 7,
+                "next": f"{BASE_URL}/test/?page={page + 1}" if page < 4 else None,
+                "results": [
+                    {"id": i} for i in range(2 * page - 1, min(2 * page, 7) + 1)
+                ],
+            },
+        )
+
+    route = respx.get(f"{BASE_URL}/test/").mock(side_effect=respond)
+    endpoint = AsyncArcsecondAPIEndpoint(make_config(), "test")
+
+    results, error = run(endpoint.list_all(parallel=3))
+    assert error is None
+    assert [r["id"] for r in results] == list(range(1, 8))
+    assert route.call_count == 4
+
+
+@respx.mock
+def test_async_identical_reads_are_coalesced(tmp_path):
+    async def respond(request):
+        await asyncio.sleep(0.05)
+        return Response(200, json={"id": "1"}, headers={"ETag": '"v1"'})
+
+    route = respx.get(f"{BASE_URL}/test/1/").mock(side_effect=respond)
+    cache = ResponseCache(tmp_path)
+    endpoint = AsyncArcsecondAPIEndpoint(make_config(), "test", cache=cache)
+
+    async def read_all():
+        return await asyncio.gather(*(endpoint.read("1") for _ in range(4)))
+
+    results = run(read_all())
+    assert results == [({"id": "1"}, None)] * 4
+    assert route.call_count == 1
+    # Each caller gets its own copy.
+    results[0][0]["id"] = "2"
+    assert results[1][0] == {"id": "1"}
+    # Written to disk from a thread, once.
+    assert len(list(tmp_path.rglob("*.json"))) == 1
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+import respx
+from httpx import Response
+
+from arcsecond.api.cache import ResponseCache
+from arcsecond.api.config import ArcsecondConfig
+from arcsecond.api.endpoint import ArcsecondAPIEndpoint
+
+BASE_URL = "https://cache.example.io"
+
+
+@pytest.fixture
+def config():
+    config = Mock(spec=ArcsecondConfig)
+    config.api_server = BASE_URL
+    config.verbose = False
+    config.access_key = "test_access_key"
+    config.upload_key = None
+    return config
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(directory=tmp_path)
+
+
+@pytest.fixture
+def endpoint(config, cache):
+    return ArcsecondAPIEndpoint(config, "datasets", cache=cache)
+
+
+def test_memory_entries_expire(tmp_path):
+    cache = ResponseCache(directory=tmp_path, ttl=0.01)
+    cache.store("group", "key", {"a": 1})
+    assert cache.get_fresh("key") == {"a": 1}
+    time.sleep(0.02)
+    assert cache.get_fresh("key") is None
+
+
+def test_memory_entries_are_bounded():
+    cache = ResponseCache(max_entries=2)
+    for i in range(3):
+        cache.store("group", f"key{i}", i)
+    assert cache.get_fresh("key0") is None
+    assert cache.get_fresh("key2") == 2
+
+
+def test_cached_bodies_are_copies():
+    cache = ResponseCache()
+    cache.store("group", "key", {"a": [1]})
+    cache.get_fresh("key")["a"].append(2)
+    assert cache.get_fresh("key") == {"a": [1]}
+
+
+def test_only_validated_responses_are_written_to_disk(cache):
+    cache.store("group", "plain", {"a": 1})
+    cache.store("group", "tagged", {"a": 2}, etag='"v1"')
+    assert cache.get_stored("group", "plain") is None
+    assert cache.get_stored("group", "tagged") == {
+        "etag": '"v1"',
+        "last_modified": None,
+        "body": {"a": 2},
+    }
+
+
+@respx.mock
+def test_fresh_entries_are_served_from_memory(endpoint):
+    route = respx.get(f"{BASE_URL}/datasets/1/").mock(
+        return_value=Response(200, json={"uuid": "1"})
+    )
+    assert endpoint.read("1") == ({"uuid": "1"}, None)
+    assert endpoint.read("1") == ({"uuid": "1"}, None)
+    assert route.call_count == 1
+
+
+@respx.mock
+def test_stale_entries_are_revalidated_with_etag(config, tmp_path):
+    url = f"{BASE_URL}/datasets/1/"
+    respx.get(url).mock(
+        return_value=Response(200, json={"uuid": "1"}, headers={"ETag": '"v1"'})
+    )
+    first = ArcsecondAPIEndpoint(config, "datasets", cache=ResponseCache(tmp_path))
+    assert first.read("1") == ({"uuid": "1"}, None)
+
+    # A new process only has the on-disk tier.
+    route = respx.get(url).mock(return_value=Response(304))
+    second = ArcsecondAPIEndpoint(config, "datasets", cache=ResponseCache(tmp_path))
+    assert second.read("1") == ({"uuid": "1"}, None)
+    assert route.calls.last.request.headers["If-None-Match"] == '"v1"'
+
+
+@respx.mock
+def test_writes_invalidate_the_resource(endpoint, cache):
+    list_route = respx.get(f"{BASE_URL}/datasets/").mock(
+        return_value=Response(200, json=[], headers={"ETag": '"v1"'})
+    )
+    respx.post(f"{BASE_URL}/datasets/").mock(
+        return_value=Response(201, json={"uuid": "1"})
+    )
+    endpoint.list()
+    endpoint.create(json={"name": "new"})
+    endpoint.list()
+    assert list_route.call_count == 2
+    assert "If-None-Match" not in list_route.calls.last.request.headers
+
+
+@respx.mock
+def test_errors_are_not_cached(endpoint):
+    route = respx.get(f"{BASE_URL}/datasets/1/").mock(
+        return_value=Response(404, json={"detail": "Not found."})
+    )
+    _, error = endpoint.read("1")
+    assert error is not None
+    endpoint.read("1")
+    assert route.call_count == 2
+
+
+def test_concurrent_identical_requests_are_coalesced():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(1)
+        return {"a": 1}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.coalesce("key", fetch)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"a": 1}] * 4
+
+
+def test_concurrent_identical_coroutines_are_coalesced():
+    cache = ResponseCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"a": 1}
+
+    async def run():
+        first = asyncio.ensure_future(cache.acoalesce("key", fetch))
+        others = [
+            asyncio.ensure_future(cache.acoalesce("key", fetch)) for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        # Cancelling the first caller does not cancel the others.
+        first.cancel()
+        return await asyncio.gather(*others)
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert results == [{"a": 1}] * 3
@@ -0,0 +1,132 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+import respx
+from httpx import Response
+from httpx._multipart import MultipartStream
+
+from arcsecond.api.async_endpoint import AsyncArcsecondAPIEndpoint
+from arcsecond.api.config import ArcsecondConfig
+from arcsecond.api.endpoint import ArcsecondAPIEndpoint
+from arcsecond.api.multipart import MultipartBody
+from arcsecond.cloud.uploader.uploader import UploadFileWithProgress
+
+BASE_URL = "https://fixture.example.io"
+CONTENT = b"0123456789" * 1000
+
+
+def make_config():
+    config = Mock(spec=ArcsecondConfig)
+    config.api_server = BASE_URL
+    config.verbose = False
+    config.access_key = "test_access_key"
+    config.upload_key = None
+    return config
+
+
+def make_file(tmp_path, block_size=4096):
+    file_path = tmp_path / "image.fits"
+    file_path.write_bytes(CONTENT)
+    return UploadFileWithProgress(file_path, block_size=block_size)
+
+
+def test_body_is_encoded_as_httpx_does(tmp_path):
+    data = {"dataset": "d1", "is_raw": True, "tags": ["a", "b"], 'na"me': "x"}
+    with make_file(tmp_path) as file:
+        body = MultipartBody(
+            data, {"file": ("image.fits", file, "application/fits")}, b"b0undary"
+        )
+        expected = b"".join(
+            MultipartStream(
+                data, {"file": ("image.fits", CONTENT, "application/fits")}, b"b0undary"
+            )
+        )
+
+        content = b"".join(body)
+        assert content == expected
+        assert body.content_length == len(expected)
+        assert body.content_type == "multipart/form-data; boundary=b0undary"
+
+
+def test_body_streams_files_by_blocks(tmp_path):
+    with make_file(tmp_path, block_size=4096) as file:
+        body = MultipartBody({"dataset": "d1"}, {"file": ("image.fits", file)})
+        sizes = [len(block) for block in body]
+
+        # Fields, file headers, 3 blocks, file trailer and closing boundary.
+        assert sizes[2:5] == [4096, 4096, 10000 - 2 * 4096]
+        # The body can be sent again.
+        assert len(b"".join(body)) == body.content_length
+
+
+@respx.mock
+def test_endpoint_streams_files_with_a_content_length(tmp_path):
+    route = respx.post(f"{BASE_URL}/datafiles/").mock(
+        return_value=Response(201, json={"id": 1})
+    )
+    endpoint = ArcsecondAPIEndpoint(make_config(), "datafiles")
+    with make_file(tmp_path) as file:
+        result, error = endpoint.create(
+            json={"dataset": "d1"}, files={"file": ("image.fits", file)}
+        )
+
+    assert error is None
+    request = route.calls.last.request
+    assert "transfer-encoding" not in request.headers
+    assert int(request.headers["content-length"]) == len(request.content)
+    assert CONTENT in request.content
+    assert b'name="dataset"\r\n\r\nd1\r\n' in request.content
+
+
+@respx.mock
+def test_endpoint_sends_the_whole_file_again_on_retry(tmp_path):
+    route = respx.post(f"{BASE_URL}/datafiles/").mock(
+        side_effect=[
+            Response(503, headers={"Retry-After": "0"}),
+            Response(201, json={"id": 1}),
+        ]
+    )
+    endpoint = ArcsecondAPIEndpoint(make_config(), "datafiles")
+    with make_file(tmp_path) as file:
+        _, error = endpoint.create(
+            json={"dataset": "d1"}, files={"file": ("image.fits", file)}
+        )
+
+    assert error is None
+    assert route.call_count == 2
+    assert CONTENT in route.calls.last.request.content
+
+
+@respx.mock
+def test_async_endpoint_streams_files(tmp_path):
+    route = respx.post(f"{BASE_URL}/datafiles/").mock(
+        return_value=Response(201, json={"id": 1})
+    )
+    endpoint = AsyncArcsecondAPIEndpoint(make_config(), "datafiles")
+
+    async def upload():
+        with make_file(tmp_path) as file:
+            return await endpoint.create(
+                json={"dataset": "d1"}, files={"file": ("image.fits", file)}
+            )
+
+    assert asyncio.run(upload()) == ({"id": 1}, None)
+    request = route.calls.last.request
+    assert int(request.headers["content-length"]) == len(request.content)
+    assert CONTENT in request.content
+
+
+def test_progress_is_updated_a_few_times_per_second(tmp_path):
+    file_path = tmp_path / "image.fits"
+    file_path.write_bytes(CONTENT)
+    with patch("arcsecond.cloud.uploader.uploader.tqdm") as progress_class:
+        file = UploadFileWithProgress(file_path, display_progress=True, block_size=10)
+        blocks = list(file.iter_blocks())
+        file.close()
+
+    progress = progress_class.return_value
+    assert len(blocks) == 1000
+    # Not once per block, but the total is right.
+    assert progress.update.call_count < 10
+    assert sum(c.args[0] for c in progress.update.call_args_list) == len(CONTENT)
+    progress.refresh.assert_not_called()
@@ -0,0 +1,90 @@
+from configparser import ConfigParser
+from unittest.mock import Mock, patch
+
+import respx
+from httpx import Response
+
+from arcsecond.api.config import ArcsecondConfig
+from arcsecond.api.endpoint import ArcsecondAPIEndpoint
+from arcsecond.api.ratelimit import RateLimiter, get_rate_limiter, get_request_size
+
+
+def make_config(**keys):
+    parser = ConfigParser()
+    parser["limited"] = keys
+    return ArcsecondConfig(api_name="limited", config=parser)
+
+
+def test_bursts_are_free_then_requests_are_spaced(tmp_path):
+    limiter = RateLimiter(tmp_path / "api.json", requests_per_second=10)
+    with patch("arcsecond.api.ratelimit.time.time", return_value=1000.0):
+        delays = [limiter.reserve() for _ in range(22)]
+    assert delays[:20] == [0] * 20
+    assert delays[20] == 0.1
+    assert round(delays[21], 6) == 0.2
+
+
+def test_tokens_are_refilled_over_time(tmp_path):
+    limiter = RateLimiter(tmp_path / "api.json", requests_per_second=1)
+    with patch("arcsecond.api.ratelimit.time.time", return_value=1000.0):
+        limiter.reserve(requests=2)
+        assert limiter.reserve() == 1
+    with patch("arcsecond.api.ratelimit.time.time", return_value=1003.0):
+        assert limiter.reserve() == 0
+
+
+def test_bytes_have_their_own_budget(tmp_path):
+    limiter = RateLimiter(
+        tmp_path / "api.json", requests_per_second=100, bytes_per_second=1000
+    )
+    with patch("arcsecond.api.ratelimit.time.time", return_value=1000.0):
+        assert limiter.reserve(nbytes=2000) == 0
+        assert limiter.reserve(nbytes=500) == 0.5
+        assert limiter.reserve() == 0
+
+
+def test_quota_is_shared_through_the_state_file(tmp_path):
+    # Two limiters on the same file behave like two processes.
+    first = RateLimiter(tmp_path / "api.json", requests_per_second=1)
+    second = RateLimiter(tmp_path / "api.json", requests_per_second=1)
+    with patch("arcsecond.api.ratelimit.time.time", return_value=1000.0):
+        assert first.reserve(requests=2) == 0
+        assert second.reserve() == 1
+
+
+def test_limits_are_read_from_config():
+    assert get_rate_limiter(make_config()) is None
+    assert get_rate_limiter(make_config(rate_limit_requests="0")) is None
+    assert get_rate_limiter(Mock(spec=ArcsecondConfig)) is None
+
+    limiter = get_rate_limiter(make_config(rate_limit_bytes="1e6"))
+    assert limiter.path == ArcsecondConfig.dir_path() / "ratelimit" / "limited.json"
+    assert get_rate_limiter(make_config(rate_limit_bytes="1e6")) is limiter
+
+
+def test_request_size_counts_files(tmp_path):
+    path = tmp_path / "file.fits"
+    path.write_bytes(b"x" * 1234)
+    with open(path, "rb") as f:
+        assert get_request_size({"file": ("file.fits", f, "application/fits")}) == 1234
+    assert get_request_size(None) == 0
+
+
+@respx.mock
+def test_endpoint_waits_for_the_limiter(tmp_path):
+    config = Mock(spec=ArcsecondConfig)
+    config.api_server = "https://limited.example.io"
+    config.verbose = False
+    config.access_key = "key"
+    endpoint = ArcsecondAPIEndpoint(config, "test")
+    limiter = RateLimiter(tmp_path / "api.json", requests_per_second=1)
+    respx.get("https://limited.example.io/test/").mock(return_value=Response(200))
+
+    with (
+        patch("arcsecond.api.endpoint.get_rate_limiter", return_value=limiter),
+        patch("arcsecond.api.ratelimit.time.time", return_value=1000.0),
+        patch("arcsecond.api.ratelimit.time.sleep") as sleep,
+    ):
+        for _ in range(3):
+            endpoint.list()
+    sleep.assert_called_once_with(1.0)
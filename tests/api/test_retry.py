@@ -0,0 +1,126 @@
+from unittest.mock import Mock, patch
+
+import httpx
+import pytest
+import respx
+from httpx import Response
+
+from arcsecond.api.config import ArcsecondConfig
+from arcsecond.api.endpoint import ArcsecondAPIEndpoint
+from arcsecond.api.retry import CircuitBreaker, RetryPolicy, get_circuit_breaker
+
+BASE_URL = "https://retry.example.io"
+
+
+@pytest.fixture
+def config():
+    config = Mock(spec=ArcsecondConfig)
+    config.api_server = BASE_URL
+    config.verbose = False
+    config.access_key = "test_access_key"
+    config.upload_key = None
+    return config
+
+
+@pytest.fixture
+def endpoint(config):
+    return ArcsecondAPIEndpoint(config, "test", retry_policy=RetryPolicy(jitter=False))
+
+
+def test_backoff_is_exponential_and_capped():
+    policy = RetryPolicy(backoff_factor=1, max_backoff=5, jitter=False)
+    assert [policy.get_delay(a) for a in range(1, 5)] == [1, 2, 4, 5]
+
+
+def test_jitter_stays_below_backoff():
+    policy = RetryPolicy(backoff_factor=1)
+    assert all(0 <= policy.get_delay(3) <= 4 for _ in range(20))
+
+
+def test_retry_after_header_is_honoured():
+    policy = RetryPolicy(max_backoff=30)
+    assert policy.get_delay(1, Response(429, headers={"Retry-After": "7"})) == 7
+    assert policy.get_delay(1, Response(429, headers={"Retry-After": "300"})) == 30
+    date = "Wed, 21 Oct 2015 07:28:00 GMT"  # in the past
+    assert policy.get_delay(1, Response(503, headers={"Retry-After": date})) == 0
+
+
+def test_non_idempotent_requests_are_retried_only_when_unprocessed():
+    policy = RetryPolicy()
+    read_timeout = httpx.ReadTimeout("slow")
+    assert policy.should_retry("get", 1, exception=read_timeout)
+    assert not policy.should_retry("post", 1, exception=read_timeout)
+    assert policy.should_retry("post", 1, exception=httpx.ConnectError("down"))
+    assert policy.should_retry("post", 1, response=Response(503))
+    assert not policy.should_retry("post", 1, response=Response(502))
+    assert policy.should_retry("put", 1, response=Response(502))
+    assert not policy.should_retry("get", 1, response=Response(500))
+    assert not policy.should_retry("get", 4, response=Response(503))
+
+
+def test_final_client_errors_are_not_retried():
+    policy = RetryPolicy()
+    assert not policy.should_retry_error(Mock(status=403), 1)
+    assert policy.should_retry_error(Mock(status=503), 1)
+    assert not policy.should_retry_error(Mock(status=503), 4)
+
+
+@respx.mock
+def test_endpoint_retries_transient_failures(endpoint):
+    route = respx.get(f"{BASE_URL}/test/1/").mock(
+        side_effect=[
+            httpx.ConnectError("down"),
+            Response(503, headers={"Retry-After": "2"}),
+            Response(200, json={"id": 1}),
+        ]
+    )
+    with patch("arcsecond.api.endpoint.time.sleep") as sleep:
+        response, error = endpoint.read("1")
+    assert error is None and response == {"id": 1}
+    assert route.call_count == 3
+    assert [c.args[0] for c in sleep.call_args_list] == [0.5, 2]
+
+
+@respx.mock
+def test_endpoint_does_not_repeat_unsafe_posts(endpoint):
+    route = respx.post(f"{BASE_URL}/test/").mock(side_effect=httpx.ReadTimeout("slow"))
+    with patch("arcsecond.api.endpoint.time.sleep") as sleep:
+        response, error = endpoint.create(json={"name": "x"})
+    assert response is None and error.status == 400
+    assert route.call_count == 1
+    sleep.assert_not_called()
+
+
+def test_circuit_opens_and_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.acquire() == 0
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.acquire() > 0
+
+    with patch("arcsecond.api.retry.time.monotonic", return_value=1e12):
+        assert breaker.acquire() == 0  # the probe
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.acquire() > 0  # the others wait for it
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.acquire() == 0
+
+
+@respx.mock
+def test_open_circuit_pauses_requests(endpoint):
+    breaker = get_circuit_breaker(BASE_URL)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    respx.get(f"{BASE_URL}/test/1/").mock(return_value=Response(200, json={}))
+
+    def wait(seconds):
+        breaker._paused_until = 0
+
+    with patch("arcsecond.api.endpoint.time.sleep", side_effect=wait) as sleep:
+        _, error = endpoint.read("1")
+    assert error is None
+    assert sleep.call_count == 1
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -21,7 +21,7 @@ def test_api_exposes_targets_and_targetlists():
     assert isinstance(api.targetlists, ArcsecondTargetListsResource)
 
 
-@patch("httpx.post")
+@patch("httpx.Client.post")
 def test_targets_create_accepts_keyword_fields(mock_post):
     config = make_config()
     mock_response = Mock()
@@ -48,8 +48,8 @@ def test_targets_create_accepts_keyword_fields(mock_post):
     }
 
 
-@patch("httpx.get")
-@patch("httpx.patch")
+@patch("httpx.Client.get")
+@patch("httpx.Client.patch")
 def test_targets_upsert_updates_existing_match(mock_patch, mock_get):
     config = make_config()
 
@@ -82,8 +82,8 @@ def test_targets_upsert_updates_existing_match(mock_patch, mock_get):
     }
 
 
-@patch("httpx.post")
-@patch("httpx.get")
+@patch("httpx.Client.post")
+@patch("httpx.Client.get")
 def test_targets_upsert_creates_missing_match(mock_get, mock_post):
     config = make_config()
 
@@ -113,7 +113,7 @@ def test_targets_upsert_creates_missing_match(mock_get, mock_post):
     }
 
 
-@patch("httpx.post")
+@patch("httpx.Client.post")
 def test_targetlists_create_accepts_targets(mock_post):
     config = make_config()
     mock_response = Mock()
@@ -151,8 +151,8 @@ def test_targetlists_create_accepts_targets(mock_post):
     }
 
 
-@patch("httpx.get")
-@patch("httpx.patch")
+@patch("httpx.Client.get")
+@patch("httpx.Client.patch")
 def test_targetlists_add_targets_merges_existing_targets(mock_patch, mock_get):
     config = make_config()
 
@@ -199,8 +199,8 @@ def test_targetlists_add_targets_merges_existing_targets(mock_patch, mock_get):
     }
 
 
-@patch("httpx.get")
-@patch("httpx.patch")
+@patch("httpx.Client.get")
+@patch("httpx.Client.patch")
 def test_targetlists_remove_targets_uses_target_payloads(mock_patch, mock_get):
     config = make_config()
 
@@ -243,3 +243,28 @@ def test_targetlists_remove_targets_uses_target_payloads(mock_patch, mock_get):
             {"name": "M 31", "target_class": "AstronomicalObject"},
         ]
     }
+
+
+@patch("httpx.Client.get")
+@patch("httpx.Client.post")
+def test_targetlists_upsert_many_normalises_target_payloads(mock_post, mock_get):
+    list_response = Mock(status_code=200, text="[]")
+    list_response.json.return_value = []
+    mock_get.return_value = list_response
+    create_response = Mock(status_code=201, text='{"uuid": "list-1"}')
+    create_response.json.return_value = {"uuid": "list-1"}
+    mock_post.return_value = create_response
+
+    resource = ArcsecondTargetListsResource(make_config(), "targetlists", "demo")
+    results = list(
+        resource.upsert_many(
+            [{"name": "Tonight", "targets": [{"name": "M 42", "ra": 83.8}]}]
+        )
+    )
+
+    assert results == [({"uuid": "list-1"}, None)]
+    assert mock_get.call_count == 1
+    assert mock_post.call_args.kwargs["json"] == {
+        "name": "Tonight",
+        "targets": [{"name": "M 42"}],
+    }
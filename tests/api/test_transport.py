@@ -0,0 +1,73 @@
+from unittest.mock import Mock
+
+import httpx
+import pytest
+
+from arcsecond import ArcsecondAPI
+from arcsecond.api.config import ArcsecondConfig
+from arcsecond.api.endpoint import ArcsecondAPIEndpoint
+from arcsecond.api.transport import (
+    DEFAULT_MAX_CONNECTIONS,
+    DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+    close_http_clients,
+    configure_http_clients,
+    ensure_http_connections,
+    get_http_client,
+    get_pool_limits,
+)
+
+
+def make_config(api_server="https://fixture.example.io"):
+    config = Mock(spec=ArcsecondConfig)
+    config.api_server = api_server
+    config.verbose = False
+    config.access_key = "test_access_key"
+    config.upload_key = None
+    return config
+
+
+@pytest.fixture(autouse=True)
+def reset_clients():
+    yield
+    configure_http_clients(
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+    )
+    close_http_clients()
+
+
+def test_api_and_ad_hoc_endpoints_share_one_client():
+    config = make_config()
+    api = ArcsecondAPI(config, subdomain="demo")
+    ad_hoc = ArcsecondAPIEndpoint(config, "datafiles", "demo")
+    assert isinstance(api.http_client, httpx.Client)
+    assert api.datasets.http_client is api.http_client
+    assert api.organisations.http_client is api.http_client
+    assert ad_hoc.http_client is api.http_client
+
+
+def test_each_api_server_has_its_own_client():
+    one = ArcsecondAPIEndpoint(make_config("https://one.example.io"), "datasets")
+    two = ArcsecondAPIEndpoint(make_config("https://two.example.io"), "datasets")
+    assert one.http_client is not two.http_client
+
+
+def test_closed_client_is_recreated():
+    client = get_http_client("https://fixture.example.io/")
+    close_http_clients()
+    assert client.is_closed
+    assert get_http_client("https://fixture.example.io/") is not client
+
+
+def test_configure_pool_limits_recreates_clients():
+    client = get_http_client("https://fixture.example.io/")
+    configure_http_clients(max_connections=42)
+    assert client.is_closed
+    assert get_pool_limits().max_connections == 42
+
+
+def test_ensure_http_connections_only_grows_pool():
+    ensure_http_connections(2)
+    assert get_pool_limits().max_connections == DEFAULT_MAX_CONNECTIONS
+    ensure_http_connections(DEFAULT_MAX_CONNECTIONS + 5)
+    assert get_pool_limits().max_connections == DEFAULT_MAX_CONNECTIONS + 5
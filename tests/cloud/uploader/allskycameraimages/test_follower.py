@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from arcsecond.cloud.uploader.allskycameraimages.follower import AllSkyImageFollower
+from arcsecond.cloud.uploader.allskycameraimages.timestamps import TimestampExtractor
+from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.errors import ArcsecondError
+from arcsecond.imagesources.sources.filewatch import FRAME_CACHE, FileWatchSource
+from tests.cloud.uploader.allskycameraimages.test_timestamps import make_jpeg
+
+
+class RecordingUploader(object):
+    uploads = []
+
+    def __init__(self, context, file_path, data=None):
+        self._file_path = file_path
+        self._data = data
+
+    async def upload_file_async(self, utc_timestamp):
+        if self._data == b"rejected":
+            raise ArcsecondError("rejected")
+        if self._data == b"removed":
+            raise FileNotFoundError(self._file_path)
+        RecordingUploader.uploads.append(
+            (self._file_path.name, self._data, utc_timestamp)
+        )
+        return Status.OK, Substatus.DONE, None
+
+
+def write_images_later(folder, names, delay=0.15):
+    def _write():
+        for name in names:
+            time.sleep(delay)
+            (folder / name).write_bytes(make_jpeg("2024:03:01 21:05:12"))
+
+    thread = threading.Thread(target=_write)
+    thread.start()
+    return thread
+
+
+def test_follower_uploads_new_images(tmp_path):
+    (tmp_path / "image-20240301210000.jpg").write_bytes(b"already there")
+    RecordingUploader.uploads = []
+    extractor = TimestampExtractor(["image-%Y%m%d%H%M%S.jpg"], use_mtime=False)
+    follower = AllSkyImageFollower(
+        MagicMock(),
+        str(tmp_path / "image-*.jpg"),
+        extractor,
+        uploader_class=RecordingUploader,
+        poll_interval=0.05,
+    )
+    thread = write_images_later(
+        tmp_path, ["image-20240301210100.jpg", "no-timestamp.jpg", "image-bad.jpg"]
+    )
+
+    asyncio.run(follower.run(duration=0.8))
+    thread.join()
+
+    # image-bad.jpg matches the glob, but no timestamp pattern, and has EXIF data.
+    assert [name for name, _, _ in RecordingUploader.uploads] == [
+        "image-20240301210100.jpg",
+        "image-bad.jpg",
+    ]
+    name, data, timestamp = RecordingUploader.uploads[0]
+    assert data == (tmp_path / name).read_bytes()
+    assert timestamp == extractor.extract(tmp_path / name)
+    assert follower.counts == {"succeeded": 2, "skipped": 0, "failed": 0}
+
+
+def test_follower_counts_skipped_and_failed_images(tmp_path):
+    RecordingUploader.uploads = []
+    follower = AllSkyImageFollower(
+        MagicMock(),
+        str(tmp_path / "*.jpg"),
+        TimestampExtractor(["image-%Y%m%d%H%M%S.jpg"]),
+        uploader_class=RecordingUploader,
+    )
+
+    asyncio.run(follower.upload(tmp_path / "latest.jpg", b"no timestamp"))
+    asyncio.run(follower.upload(tmp_path / "image-20240301210000.jpg", b"rejected"))
+    asyncio.run(follower.upload(tmp_path / "image-20240301210100.jpg", b"removed"))
+
+    assert RecordingUploader.uploads == []
+    assert follower.counts == {"succeeded": 0, "skipped": 1, "failed": 2}
+
+
+def test_follower_goes_on_after_images_removed_before_their_upload(tmp_path):
+    follower = AllSkyImageFollower(
+        MagicMock(),
+        str(tmp_path / "*.jpg"),
+        TimestampExtractor(["image-%Y%m%d%H%M%S.jpg"]),
+    )
+
+    # Rotated away by the camera software: the uploader cannot find its size.
+    result = asyncio.run(
+        follower.upload(tmp_path / "image-20240301210000.jpg", b"frame")
+    )
+
+    assert result is None
+    assert follower.counts == {"succeeded": 0, "skipped": 0, "failed": 1}
+
+
+def test_sources_share_the_images_read(tmp_path):
+    path = tmp_path / "latest.jpg"
+    path.write_bytes(b"frame")
+    FRAME_CACHE.clear()
+    sources = [FileWatchSource(f"allsky:{n}", str(path)) for n in range(3)]
+
+    async def read_all():
+        return [await source.read() for source in sources]
+
+    with patch.object(
+        Path, "read_bytes", autospec=True, side_effect=Path.read_bytes
+    ) as read:
+        assert asyncio.run(read_all()) == [b"frame"] * 3
+        assert read.call_count == 1
+        assert asyncio.run(read_all()) == [None] * 3
+        assert read.call_count == 1
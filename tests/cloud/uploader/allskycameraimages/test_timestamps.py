@@ -0,0 +1,153 @@
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from arcsecond.cloud.uploader.allskycameraimages.errors import (
+    InvalidTimestampPatternError,
+)
+from arcsecond.cloud.uploader.allskycameraimages.timestamps import (
+    FilenamePattern,
+    TimestampExtractor,
+    parse_exif_datetime,
+)
+from tests.cloud.uploader.test_metadata import make_fits
+
+UTC = timezone.utc
+CEST = timezone(timedelta(hours=2))
+
+
+def _ascii_entry(tag, value, offset):
+    raw = value.encode("ascii") + b"\x00"
+    return struct.pack("<HHII", tag, 2, len(raw), offset), raw
+
+
+def make_jpeg(date_time_original=None, offset_time=None, date_time=None):
+    """Return minimal JPEG content with EXIF data (little-endian TIFF)."""
+    ifd0_entries, exif_entries = [], []
+    if date_time is not None:
+        ifd0_entries.append((0x0132, date_time))
+    if date_time_original is not None:
+        exif_entries.append((0x9003, date_time_original))
+    if offset_time is not None:
+        exif_entries.append((0x9011, offset_time))
+
+    ifd0_size = 2 + 12 * (len(ifd0_entries) + 1) + 4
+    exif_offset = 8 + ifd0_size
+    exif_size = 2 + 12 * len(exif_entries) + 4
+    data_offset = exif_offset + exif_size
+
+    entries, values = [], b""
+    for tag, value in ifd0_entries:
+        entry, raw = _ascii_entry(tag, value, data_offset + len(values))
+        entries.append(entry)
+        values += raw
+    entries.append(struct.pack("<HHII", 0x8769, 4, 1, exif_offset))
+    ifd0 = struct.pack("<H", len(entries)) + b"".join(entries) + b"\x00" * 4
+
+    entries = []
+    for tag, value in exif_entries:
+        entry, raw = _ascii_entry(tag, value, data_offset + len(values))
+        entries.append(entry)
+        values += raw
+    exif = struct.pack("<H", len(entries)) + b"".join(entries) + b"\x00" * 4
+
+    tiff = b"II" + struct.pack("<HI", 42, 8) + ifd0 + exif + values
+    app1 = b"Exif\x00\x00" + tiff
+    # An APP0 segment first, as written by most cameras.
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    return (
+        b"\xff\xd8"
+        + app0
+        + b"\xff\xe1"
+        + struct.pack(">H", len(app1) + 2)
+        + app1
+        + b"\xff\xda\x00\x02pixels\xff\xd9"
+    )
+
+
+def test_exif_datetime():
+    assert parse_exif_datetime(make_jpeg("2024:03:01 21:05:12")) == datetime(
+        2024, 3, 1, 21, 5, 12
+    )
+    assert parse_exif_datetime(
+        make_jpeg("2024:03:01 21:05:12", offset_time="+02:00")
+    ) == datetime(2024, 3, 1, 21, 5, 12, tzinfo=CEST)
+    assert parse_exif_datetime(make_jpeg(date_time="2024:03:01 21:06:00")) == (
+        datetime(2024, 3, 1, 21, 6)
+    )
+    assert parse_exif_datetime(make_jpeg()) is None
+    assert parse_exif_datetime(b"\xff\xd8\xff\xda") is None
+    assert parse_exif_datetime(b"not an image") is None
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        (
+            "image-%Y%m%d%H%M%S.jpg",
+            "/allsky/images/image-20240301210512.jpg",
+            datetime(2024, 3, 1, 21, 5, 12),
+        ),
+        (
+            "*_%Y%m%d_%H%M%S*",
+            "ccd1_20240301_210512_stretched.jpg",
+            datetime(2024, 3, 1, 21, 5, 12),
+        ),
+        (
+            "%Y%m%d/image-%H%M%S.jpg",
+            "/allsky/images/20240301/image-210512.jpg",
+            datetime(2024, 3, 1, 21, 5, 12),
+        ),
+        (
+            "frame-%s.jpg",
+            "frame-1709327112.jpg",
+            datetime(2024, 3, 1, 21, 5, 12, tzinfo=UTC),
+        ),
+        ("image-%Y%m%d%H%M%S.jpg", "image.jpg", None),
+        ("image-%Y%m%d%H%M%S.jpg", "image-20241301210512.jpg", None),
+    ],
+)
+def test_filename_patterns(pattern, path, expected):
+    assert FilenamePattern(pattern).match(path) == expected
+
+
+@pytest.mark.parametrize("pattern", ["image.jpg", "image-%Q.jpg", "%s-%Y.jpg"])
+def test_invalid_filename_patterns(pattern):
+    with pytest.raises(InvalidTimestampPatternError):
+        FilenamePattern(pattern)
+
+
+def test_extractor_prefers_patterns_then_headers(tmp_path):
+    extractor = TimestampExtractor(["image-%Y%m%d%H%M%S.jpg"], naive_timezone=CEST)
+    jpeg = make_jpeg("2024:03:01 21:05:12")
+
+    # File names first, then EXIF data, in the given time zone.
+    assert extractor.extract_datetime("image-20240301220000.jpg", jpeg) == datetime(
+        2024, 3, 1, 20, tzinfo=UTC
+    )
+    assert extractor.extract_datetime("latest.jpg", jpeg) == datetime(
+        2024, 3, 1, 19, 5, 12, tzinfo=UTC
+    )
+
+    # FITS dates are UTC.
+    path = tmp_path / "latest.fits"
+    path.write_bytes(make_fits(["DATE-OBS= '2024-03-01T21:05:12.5'"]))
+    assert extractor.extract_datetime(path) == datetime(
+        2024, 3, 1, 21, 5, 12, 500000, tzinfo=UTC
+    )
+    data = make_fits(["MJD-OBS =              60370.5"])
+    assert (
+        extractor.extract(path, data)
+        == datetime(2024, 3, 1, 12, tzinfo=UTC).timestamp()
+    )
+
+
+def test_extractor_mtime_fallback(tmp_path):
+    path = tmp_path / "latest.jpg"
+    path.write_bytes(make_jpeg())
+    os.utime(path, (1709327112, 1709327112))
+
+    assert TimestampExtractor().extract(path) is None
+    assert TimestampExtractor(use_mtime=True).extract(path) == 1709327112
@@ -83,3 +83,30 @@ def test_full_upload_process_allskyimages(mock_config):
             assert status.value == Status.OK.value
             assert substatus.value == Substatus.DONE.value
             assert error is None
+
+
+@respx.mock
+def test_upload_allskyimage_already_read(mock_config, tmp_path):
+    camera_uuid = str(uuid.uuid4())
+    prepare_successful_login(mock_config)
+    prepare_upload_allskyimages(mock_config, camera_uuid)
+    route = respx.post(
+        f"{mock_config.api_server}/allskycameras/{camera_uuid}/images/"
+    ).mock(Response(201, json={"status": "success", "id": 1}))
+
+    context = AllSkyCameraImageUploadContext(mock_config, input_camera_uuid=camera_uuid)
+    context.validate()
+    file_path = tmp_path / "latest.jpg"
+    file_path.write_bytes(b"newer image, not read again")
+
+    uploader = AllSkyCameraImageFileUploader(
+        context, str(file_path), data=b"image shared with the proxy"
+    )
+    status, substatus, error = uploader.upload_file(utc_timestamp=1709327112.0)
+
+    assert status == Status.OK
+    assert error is None
+    body = route.calls.last.request.read()
+    assert b"image shared with the proxy" in body
+    assert b"not read again" not in body
+    assert b"1709327112.0" in body
@@ -0,0 +1,208 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.cloud.uploader.datafiles.errors import InvalidUploadRulesError
+from arcsecond.cloud.uploader.datafiles.rules import UploadRules, load_upload_rules
+from arcsecond.cloud.uploader.metadata import HeaderTable
+from arcsecond.cloud.uploader.walker import walk_folder_and_upload_files
+from tests.cloud.uploader.test_metadata import make_fits
+
+NIGHT = [
+    {"IMAGETYP": "Bias Frame", "EXPTIME": 0.0, "CCD-TEMP": -10.2},
+    {"IMAGETYP": "Dark Frame", "EXPTIME": 300.0, "CCD-TEMP": -9.9},
+    {"IMAGETYP": "Dark Frame", "EXPTIME": 300.0, "CCD-TEMP": -10.4},
+    {"IMAGETYP": "Flat Field", "EXPTIME": 2.5, "FILTER": "Ha", "CCD-TEMP": -10.0},
+    {"IMAGETYP": "Light Frame", "EXPTIME": 300.0, "FILTER": "Ha", "OBJECT": "M 31"},
+    {"IMAGETYP": "LIGHT", "EXPTIME": 30.0, "FILTER": "R"},
+    {},
+]
+
+RULES = {
+    "calibration": {},
+    "rules": [
+        {"name": "calibration", "match": {"IMAGETYP": ["*bias*", "*dark*", "*flat*"]}},
+        {
+            "name": "science",
+            "match": {"IMAGETYP": "light*", "EXPTIME": ">= 60"},
+            "tags": ["science"],
+            "is_raw": True,
+        },
+        {"name": "Ha", "match": {"FILTER": "ha"}, "tags": "Ha"},
+        {"name": "short", "match": {"EXPTIME": "< 60"}, "is_raw": "false"},
+    ],
+}
+
+
+def test_rules_tag_and_group_a_whole_night():
+    results = UploadRules.from_dict(RULES).apply(HeaderTable(NIGHT))
+
+    assert results == [
+        {
+            "extra_tags": ["bias", "calib:bias/EXPTIME=0/CCD-TEMP=-10"],
+            "is_raw": "False",
+        },
+        {"extra_tags": ["dark", "calib:dark/EXPTIME=300/CCD-TEMP=-10"]},
+        {"extra_tags": ["dark", "calib:dark/EXPTIME=300/CCD-TEMP=-10"]},
+        {
+            "extra_tags": [
+                "Ha",
+                "flat",
+                "calib:flat/EXPTIME=2.5/FILTER=Ha/CCD-TEMP=-10",
+            ],
+            "is_raw": "False",
+        },
+        {"extra_tags": ["science", "Ha"], "is_raw": "True"},
+        {"is_raw": "False"},
+        {},
+    ]
+
+
+def test_calibration_grouping_options():
+    rules = UploadRules.from_dict(
+        {
+            "calibration": {
+                "keys": ["EXPTIME"],
+                "frames": {"offset": "*bias*"},
+                "round": {"EXPTIME": 100},
+                "tag_prefix": "group",
+            }
+        }
+    )
+
+    results = rules.apply(HeaderTable(NIGHT[:2]))
+
+    assert results == [{"extra_tags": ["offset", "group:offset/EXPTIME=0"]}, {}]
+
+
+def test_rules_apply_to_a_single_header():
+    rules = UploadRules.from_dict(RULES)
+    assert rules.apply_to(NIGHT[4]) == {
+        "extra_tags": ["science", "Ha"],
+        "is_raw": "True",
+    }
+    assert len(rules) == 4
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        [],
+        {"rules": [{"match": {"FILTER": "Ha"}, "tag": "Ha"}]},
+        {"rules": [{"match": ["FILTER"]}]},
+        {"rules": [{"match": {"EXPTIME": "> long"}}]},
+        {"rules": [{"tags": "arcsecond-reserved"}]},
+        {"rules": [{"is_raw": "maybe"}]},
+        {"calibration": {"frame": {}}},
+        {"filters": {}},
+    ],
+)
+def test_invalid_rules_are_rejected(data):
+    with pytest.raises(InvalidUploadRulesError):
+        UploadRules.from_dict(data)
+
+
+def test_load_rules_from_yaml(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "rules.yaml"
+    path.write_text("""
+calibration:
+  round: {CCD-TEMP: 1}
+rules:
+  - name: science
+    match: {IMAGETYP: "light*", EXPTIME: ">= 60"}
+    tags: [science]
+    is_raw: true
+  - name: Ha
+    match: {FILTER: ha}
+    tags: Ha
+  - name: short
+    match: {EXPTIME: "< 60"}
+    is_raw: false
+""")
+
+    results = load_upload_rules(path).apply(HeaderTable(NIGHT))
+
+    assert results[2] == {"extra_tags": ["dark", "calib:dark/EXPTIME=300/CCD-TEMP=-10"]}
+    assert results[4] == {"extra_tags": ["science", "Ha"], "is_raw": "True"}
+
+
+def test_load_rules_from_ini(tmp_path):
+    path = tmp_path / "rules.ini"
+    path.write_text("""
+[calibration]
+keys = EXPTIME, FILTER
+frames.dark = *dark*
+
+[rule science]
+match.IMAGETYP = light*
+match.EXPTIME = >= 60
+tags = science
+is_raw = true
+
+[rule Ha]
+match.FILTER = Ha, H-alpha
+tags = Ha
+""")
+
+    rules = load_upload_rules(path)
+    results = rules.apply(HeaderTable(NIGHT))
+
+    assert [rule.name for rule in rules.rules] == ["science", "Ha"]
+    assert results[0] == {}
+    assert results[1] == {"extra_tags": ["dark", "calib:dark/EXPTIME=300"]}
+    assert results[4] == {"extra_tags": ["science", "Ha"], "is_raw": "True"}
+
+
+def test_load_rules_rejects_other_files(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text("{}")
+    with pytest.raises(InvalidUploadRulesError):
+        load_upload_rules(path)
+    with pytest.raises(InvalidUploadRulesError):
+        load_upload_rules(tmp_path / "missing.ini")
+
+    path = tmp_path / "rules.ini"
+    path.write_text("[filters]\nHa = Ha\n")
+    with pytest.raises(InvalidUploadRulesError):
+        load_upload_rules(path)
+
+
+class RecordingUploader(object):
+    kwargs = {}
+
+    def __init__(self, context, file_path, display_progress=False):
+        self._file_path = file_path
+
+    def upload_file(self, **kwargs):
+        RecordingUploader.kwargs[self._file_path.name] = kwargs
+        return [Status.OK, Substatus.DONE, None]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_walk_uploads_files_with_their_own_tags(tmp_path, stream):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    (folder / "bias.fits").write_bytes(make_fits(["IMAGETYP= 'Bias Frame'"]))
+    (folder / "light.fits").write_bytes(
+        make_fits(["IMAGETYP= 'Light Frame'", "EXPTIME =                300.0"])
+    )
+    (folder / "notes.txt").write_text("notes")
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    RecordingUploader.kwargs = {}
+
+    walk_folder_and_upload_files(
+        RecordingUploader,
+        context,
+        str(folder),
+        stream=stream,
+        rules=UploadRules.from_dict(RULES),
+    )
+
+    assert RecordingUploader.kwargs == {
+        "bias.fits": {"extra_tags": ["bias", "calib:bias"]},
+        "light.fits": {"extra_tags": ["science"], "is_raw": "True"},
+        "notes.txt": {},
+    }
@@ -1,3 +1,4 @@
+import asyncio
 import random
 import shutil
 import tempfile
@@ -14,6 +15,7 @@ from arcsecond import (
     DatasetUploadContext,
 )
 from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.cloud.uploader.walker import walk_folder_and_upload_files
 from tests.utils import (
     prepare_successful_login,
     prepare_upload_files,
@@ -80,3 +82,100 @@ def test_full_upload_process_datafiles(mock_config):
             assert status.value == Status.OK.value
             assert substatus.value == Substatus.DONE.value
             assert error is None
+
+
+@respx.mock
+def test_full_upload_process_datafiles_async(mock_config):
+    dataset_uuid = str(uuid.uuid4())
+    telescope_uuid = str(uuid.uuid4())
+
+    prepare_successful_login(mock_config)
+    prepare_upload_files(mock_config, dataset_uuid, telescope_uuid)
+    route = respx.post("/".join([mock_config.api_server, "datafiles"]) + "/").mock(
+        Response(201, json={"status": "success", "id": random.randint(1, 1000)})
+    )
+
+    context = DatasetUploadContext(
+        mock_config,
+        input_dataset_uuid_or_name=dataset_uuid,
+        input_telescope_uuid=telescope_uuid,
+        is_raw_data=True,
+    )
+    context.validate()
+
+    fixtures_dir = Path(__file__).parent.parent.parent.parent / "fixtures"
+    fixture_files = list(fixtures_dir.glob("*.fits"))
+
+    async def upload_all():
+        uploaders = [
+            DatasetFileUploader(context, str(path), display_progress=False)
+            for path in fixture_files
+        ]
+        return await asyncio.gather(*(u.upload_file_async() for u in uploaders))
+
+    for status, substatus, error in asyncio.run(upload_all()):
+        assert status.value == Status.OK.value
+        assert substatus.value == Substatus.DONE.value
+        assert error is None
+    assert route.call_count == len(fixture_files)
+
+
+@respx.mock
+def test_walk_skips_files_already_in_the_dataset(mock_config, tmp_path):
+    dataset_uuid = str(uuid.uuid4())
+    telescope_uuid = str(uuid.uuid4())
+    org_subdomain = "test-portal"
+
+    prepare_successful_login(mock_config, org_subdomain)
+    prepare_upload_files(mock_config, dataset_uuid, telescope_uuid, org_subdomain)
+    datafiles_url = "/".join([mock_config.api_server, org_subdomain, "datafiles"]) + "/"
+    respx.get(datafiles_url).mock(
+        Response(
+            200,
+            json=[
+                {
+                    "id": 1,
+                    "file": "https://cdn.example.com/data/synced.fits",
+                    "size": 4,
+                },
+                {
+                    "id": 2,
+                    "file": "https://cdn.example.com/data/resized.fits",
+                    "size": 1,
+                },
+                {
+                    "id": 3,
+                    "file": "https://cdn.example.com/data/packed.fits.gz",
+                    "size": 2,
+                },
+            ],
+        )
+    )
+    post_route = respx.post(datafiles_url).mock(
+        Response(201, json={"status": "success", "id": 3})
+    )
+
+    for name in ["synced.fits", "resized.fits", "packed.fits", "new.fits"]:
+        (tmp_path / name).write_bytes(b"data")
+
+    context = DatasetUploadContext(
+        mock_config,
+        input_dataset_uuid_or_name=dataset_uuid,
+        input_telescope_uuid=telescope_uuid,
+        org_subdomain=org_subdomain,
+    )
+    context.validate()
+    walk_folder_and_upload_files(DatasetFileUploader, context, str(tmp_path))
+
+    assert context.is_already_synced(tmp_path / "synced.fits")
+    assert not context.is_already_synced(tmp_path / "resized.fits")
+    # Uploaded compressed by a previous run.
+    assert context.is_already_synced(tmp_path / "packed.fits")
+    # Removed since the walk: left to its upload to tell.
+    (tmp_path / "synced.fits").unlink()
+    assert not context.is_already_synced(tmp_path / "synced.fits")
+    uploaded = [
+        call.request.content.split(b'filename="')[1].split(b'"')[0]
+        for call in post_route.calls
+    ]
+    assert sorted(uploaded) == [b"new.fits", b"resized.fits"]
@@ -46,6 +46,17 @@ def test_get_upload_data_with_custom_tags_string(file_uploader, temp_file):
     assert result["tags"] == "t0,t5,t6"  # yes, it is stringified for MultipartEncoder
 
 
+def test_get_upload_data_with_extra_tags(file_uploader, temp_file):
+    """Test that per-file tags come on top of the custom tags."""
+    file_uploader._context.custom_tags = ["t1", "t2"]
+    result = file_uploader._get_upload_data(
+        extra_tags=["t2", "dark", " "], is_raw="False"
+    )
+    assert result["tags"] == "t1,t2,dark"
+    assert result["is_raw"] == "False"
+    assert "extra_tags" not in result
+
+
 def test_upload_file_complete_process(file_uploader):
     """Test the complete upload file process."""
     # Mock all the component methods
@@ -0,0 +1,228 @@
+import asyncio
+import os
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from arcsecond.api.multipart import MultipartBody
+from arcsecond.cloud.uploader.bandwidth import (
+    RELOAD_INTERVAL,
+    BandwidthLimiter,
+    BandwidthSchedule,
+    get_bandwidth_limiter,
+    parse_rate,
+)
+from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.cloud.uploader.errors import InvalidBandwidthScheduleError
+from arcsecond.cloud.uploader.uploader import UploadBytes, UploadFileWithProgress
+from arcsecond.cloud.uploader.walker import walk_folder_and_upload_files
+from tests.cloud.uploader.test_walker import make_files
+
+KIB = 1024
+MIB = 1024 * 1024
+
+
+class Clock(object):
+    """Monotonic time, advanced by sleeping."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with (
+        patch("arcsecond.cloud.uploader.bandwidth.time.monotonic", clock),
+        patch("arcsecond.cloud.uploader.bandwidth.time.sleep", clock.sleep),
+    ):
+        yield clock
+
+
+def test_parse_rates():
+    assert parse_rate("200k") == 200 * KIB
+    assert parse_rate("1.5M") == 1.5 * MIB
+    assert parse_rate("200kB/s") == 200 * KIB
+    assert parse_rate("4096") == 4096
+    assert parse_rate("unlimited") is None
+    assert parse_rate("0") is None
+    with pytest.raises(InvalidBandwidthScheduleError):
+        parse_rate("fast")
+
+
+def test_schedule_rates_by_time_of_the_day():
+    schedule = BandwidthSchedule.parse("18:00-07:00=200k, 12:00-13:00=1M, 2M")
+
+    assert schedule.rate_at(datetime(2024, 3, 1, 22, 30)) == 200 * KIB
+    assert schedule.rate_at(datetime(2024, 3, 1, 3, 0)) == 200 * KIB
+    assert schedule.rate_at(datetime(2024, 3, 1, 7, 0)) == 2 * MIB
+    assert schedule.rate_at(datetime(2024, 3, 1, 12, 15)) == MIB
+    assert str(schedule) == (
+        "200.00 kB/s from 18:00 to 07:00, 1.00 MB/s from 12:00 to 13:00, 2.00 MB/s otherwise"
+    )
+    assert (
+        BandwidthSchedule.parse("18:00-07:00=200k").rate_at(datetime(2024, 3, 1, 9, 0))
+        is None
+    )
+
+
+@pytest.mark.parametrize(
+    "spec", ["18:00=200k", "25:00-07:00=200k", "18:00-07:00=", "18h-7h=200k"]
+)
+def test_invalid_schedules_are_rejected(spec):
+    with pytest.raises(InvalidBandwidthScheduleError):
+        BandwidthSchedule.parse(spec)
+
+
+def test_limiter_serves_bytes_at_the_cap(clock):
+    limiter = BandwidthLimiter(BandwidthSchedule(default_rate=100 * KIB))
+
+    # The bucket starts empty, and goes in debt: later requests wait longer.
+    assert limiter.reserve(100 * KIB) == pytest.approx(1.0)
+    assert limiter.reserve(50 * KIB) == pytest.approx(1.5)
+    clock.now += 2.0
+    # Tokens are refilled up to a short burst only.
+    assert limiter.reserve(10 * KIB) == 0.0
+    clock.now += 60.0
+    assert limiter.reserve(60 * KIB) == pytest.approx(0.1)
+    assert limiter.sent == 220 * KIB
+
+
+def test_limiter_without_cap_does_not_wait(clock):
+    limiter = BandwidthLimiter()
+
+    assert limiter.rate is None
+    assert limiter.reserve(100 * MIB) == 0.0
+    assert [len(part) for part in limiter.throttle(b"x" * MIB)] == [MIB]
+    assert "no cap" in limiter.summary()
+
+
+def test_upload_file_is_streamed_by_slices_at_the_cap(tmp_path, clock):
+    path = tmp_path / "frame.fits"
+    content = os.urandom(MIB)
+    path.write_bytes(content)
+    limiter = BandwidthLimiter(BandwidthSchedule(default_rate=MIB))
+
+    with UploadFileWithProgress(
+        path, block_size=256 * KIB, limiter=limiter
+    ) as upload_file:
+        parts = list(upload_file.iter_blocks())
+
+    assert b"".join(parts) == content
+    # Slices of a tenth of second, so that the link is never saturated.
+    assert max(len(part) for part in parts) == MIB // 10
+    assert clock.slept == pytest.approx(1.0)
+    assert limiter.sent == MIB
+
+
+def test_upload_bytes_are_throttled(clock):
+    limiter = BandwidthLimiter(BandwidthSchedule(default_rate=100 * KIB))
+    upload = UploadBytes(b"x" * 200 * KIB, block_size=64 * KIB, limiter=limiter)
+
+    assert len(b"".join(upload.iter_blocks())) == 200 * KIB
+    assert clock.slept == pytest.approx(2.0)
+
+
+def test_async_bodies_are_throttled_without_blocking_the_loop(tmp_path):
+    path = tmp_path / "frame.fits"
+    content = os.urandom(48 * KIB)
+    path.write_bytes(content)
+    limiter = BandwidthLimiter(BandwidthSchedule(default_rate=160 * KIB))
+    ticks = []
+
+    async def tick(stop):
+        while not stop.is_set():
+            ticks.append(1)
+            await asyncio.sleep(0.02)
+
+    async def send():
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(tick(stop))
+        with UploadFileWithProgress(path, block_size=32 * KIB, limiter=limiter) as f:
+            body = MultipartBody({}, {"file": ("frame.fits", f)})
+            data = b"".join([bytes(block) async for block in body.async_stream()])
+        stop.set()
+        await ticker
+        return data
+
+    data = asyncio.run(send())
+
+    assert content in data
+    assert limiter.sent == 48 * KIB
+    # About 0.3s at the cap, during which the loop kept running.
+    assert len(ticks) >= 5
+
+
+def test_schedule_change_is_applied_live(clock):
+    limiter = BandwidthLimiter(BandwidthSchedule(default_rate=100 * KIB))
+    limiter.reserve(100 * KIB)
+
+    limiter.set_schedule(BandwidthSchedule(default_rate=MIB))
+
+    assert limiter.rate == MIB
+    # The debt at the former rate is forgotten.
+    assert limiter.reserve(MIB) == pytest.approx(1.0)
+
+
+def test_schedule_file_is_read_again_when_changed(tmp_path, clock):
+    path = tmp_path / "bandwidth.txt"
+    path.write_text("# No cap yet\nunlimited\n")
+    limiter = BandwidthLimiter(path=path)
+    assert limiter.rate is None
+
+    path.write_text("1M\n")
+    os.utime(path, (1, 1))
+    clock.now += RELOAD_INTERVAL
+    limiter.reserve(KIB)
+    assert limiter.rate == MIB
+
+    # An invalid file is reported, and the former schedule kept.
+    path.write_text("fast\n")
+    os.utime(path, (2, 2))
+    clock.now += RELOAD_INTERVAL
+    limiter.reserve(KIB)
+    assert limiter.rate == MIB
+
+    with pytest.raises(InvalidBandwidthScheduleError):
+        BandwidthLimiter(path=tmp_path / "missing.txt")
+
+
+class LimitedUploader(object):
+    limiters = []
+
+    def __init__(self, context, file_path, display_progress=False):
+        pass
+
+    def upload_file(self, **kwargs):
+        LimitedUploader.limiters.append(get_bandwidth_limiter())
+        return [Status.OK, Substatus.DONE, None]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_walk_shares_its_limiter_with_all_uploads(tmp_path, stream):
+    make_files(tmp_path, ["a.fits", "b.fits", "c.fits"])
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    limiter = BandwidthLimiter(BandwidthSchedule(default_rate=MIB))
+    LimitedUploader.limiters = []
+
+    walk_folder_and_upload_files(
+        LimitedUploader,
+        context,
+        str(tmp_path),
+        max_workers=2,
+        stream=stream,
+        bandwidth=limiter,
+    )
+
+    assert LimitedUploader.limiters == [limiter] * 3
+    assert get_bandwidth_limiter() is None
@@ -0,0 +1,191 @@
+from unittest.mock import MagicMock
+
+import pytest
+import respx
+from httpx import Response
+
+from arcsecond import DatasetFileUploader
+from arcsecond.api import ArcsecondAPIEndpoint
+from arcsecond.api.retry import RetryPolicy
+from arcsecond.cloud.uploader import DatasetUploadContext
+from arcsecond.cloud.uploader.chunked import reset_chunked_upload_support
+from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.cloud.uploader.journal import UploadJournal
+
+BASE_URL = "http://mock.example.com/datafiles"
+CONTENT = bytes(range(256)) * 4  # 1024 bytes, 8 parts of 128 bytes
+
+
+class StandInServer:
+    """Implements the chunked upload protocol in memory."""
+
+    def __init__(self, failing_parts=(), received=None):
+        self.started = 0
+        self.parts = {}
+        self.failures = set(failing_parts)
+        self.received = received or {}
+        self.completed = False
+        respx.post(f"{BASE_URL}/chunked/").mock(side_effect=self.start)
+        respx.get(url__regex=rf"{BASE_URL}/chunked/\w+/$").mock(side_effect=self.status)
+        respx.patch(url__regex=rf"{BASE_URL}/chunked/\w+/parts/\d+/").mock(
+            side_effect=self.receive
+        )
+        respx.post(url__regex=rf"{BASE_URL}/chunked/\w+/complete/").mock(
+            side_effect=self.complete
+        )
+
+    def start(self, request):
+        self.started += 1
+        return Response(201, json={"upload_id": "up1", "chunk_size": 128})
+
+    def status(self, request):
+        upload_id = request.url.path.split("/")[-2]
+        if upload_id not in self.received:
+            return Response(404, json={"detail": "Unknown upload."})
+        return Response(
+            200, json={"chunk_size": 128, "received": self.received[upload_id]}
+        )
+
+    def receive(self, request):
+        number = int(request.url.path.split("/")[-2])
+        if number in self.failures:
+            self.failures.remove(number)
+            return Response(500, json={"detail": "boom"})
+        self.parts[number] = request.content
+        return Response(200, json={})
+
+    def complete(self, request):
+        self.completed = True
+        return Response(201, json={"id": 7})
+
+
+@pytest.fixture(autouse=True)
+def chunked_upload_support():
+    reset_chunked_upload_support()
+    yield
+    reset_chunked_upload_support()
+
+
+@pytest.fixture
+def large_file(tmp_path):
+    file_path = tmp_path / "cube.fits"
+    file_path.write_bytes(CONTENT)
+    return file_path
+
+
+@pytest.fixture
+def context(mock_config):
+    context = MagicMock(spec=DatasetUploadContext)
+    context.config = mock_config
+    context.is_validated = True
+    context.dataset_uuid = "test-dataset-uuid"
+    context.is_raw_data = True
+    context.custom_tags = None
+    context.journal = None
+    context.upload_api_endpoint = ArcsecondAPIEndpoint(mock_config, "datafiles")
+    return context
+
+
+def make_uploader(context, file_path):
+    uploader = DatasetFileUploader(
+        context, file_path, retry_policy=RetryPolicy(backoff_factor=0)
+    )
+    uploader.chunked_upload_threshold = 512
+    uploader.chunk_size = 100
+    return uploader
+
+
+@respx.mock
+def test_large_files_are_uploaded_by_parts(context, large_file):
+    server = StandInServer()
+    uploader = make_uploader(context, large_file)
+
+    assert uploader.upload_file() == [Status.OK, Substatus.DONE, None]
+    assert server.completed
+    # The part size chosen by the server is used.
+    assert sorted(server.parts) == list(range(8))
+    for number, content in server.parts.items():
+        assert CONTENT[number * 128 : (number + 1) * 128] in content
+    assert uploader.uploaded_file_id == 7
+
+
+@respx.mock
+def test_failed_parts_are_retried_alone(context, large_file):
+    server = StandInServer(failing_parts=[3, 5])
+    uploader = make_uploader(context, large_file)
+
+    assert uploader.upload_file()[0] == Status.OK
+    assert sorted(server.parts) == list(range(8))
+    assert server.started == 1
+
+
+@respx.mock
+def test_interrupted_uploads_resume_from_the_journal(context, large_file, tmp_path):
+    server = StandInServer(received={"up0": [0, 1, 2, 3, 4]})
+    stat = large_file.stat()
+    with UploadJournal(tmp_path / "j.sqlite3", "main", None, "d") as journal:
+        journal.set_resume_token(large_file, stat.st_size, stat.st_mtime, "up0")
+        context.journal = journal
+        uploader = make_uploader(context, large_file)
+
+        assert uploader.upload_file()[0] == Status.OK
+        assert server.started == 0
+        assert sorted(server.parts) == [5, 6, 7]
+        assert journal.get_resume_token(large_file, stat.st_size, stat.st_mtime) is None
+
+
+@respx.mock
+def test_unknown_resume_token_starts_over(context, large_file):
+    server = StandInServer()
+    uploader = make_uploader(context, large_file)
+    uploader._resume_token = "expired"
+
+    assert uploader.upload_file()[0] == Status.OK
+    assert server.started == 1
+    assert sorted(server.parts) == list(range(8))
+
+
+@respx.mock
+def test_falls_back_to_single_uploads_without_server_support(context, large_file):
+    chunked_route = respx.post(f"{BASE_URL}/chunked/").mock(
+        return_value=Response(404, json={"detail": "Not found."})
+    )
+    route = respx.post(f"{BASE_URL}/").mock(return_value=Response(201, json={"id": 1}))
+
+    for _ in range(2):
+        uploader = make_uploader(context, large_file)
+        assert uploader.upload_file()[0] == Status.OK
+
+    assert route.call_count == 2
+    # The server is not asked again.
+    assert chunked_route.call_count == 1
+
+
+@pytest.mark.parametrize("status", [400, 403])
+@respx.mock
+def test_falls_back_to_single_uploads_when_parts_cannot_start(
+    context, large_file, status
+):
+    chunked_route = respx.post(f"{BASE_URL}/chunked/").mock(
+        return_value=Response(status, json={"detail": "Not allowed."})
+    )
+    route = respx.post(f"{BASE_URL}/").mock(return_value=Response(201, json={"id": 1}))
+
+    uploader = make_uploader(context, large_file)
+    assert uploader.upload_file() == [Status.OK, Substatus.DONE, None]
+
+    assert chunked_route.call_count == 1
+    assert route.call_count == 1
+    assert CONTENT in route.calls.last.request.content
+
+
+@respx.mock
+def test_small_files_are_uploaded_at_once(context, tmp_path):
+    file_path = tmp_path / "small.fits"
+    file_path.write_bytes(b"small")
+    chunked_route = respx.post(f"{BASE_URL}/chunked/")
+    route = respx.post(f"{BASE_URL}/").mock(return_value=Response(201, json={"id": 1}))
+
+    assert make_uploader(context, file_path).upload_file()[0] == Status.OK
+    assert route.call_count == 1
+    assert not chunked_route.called
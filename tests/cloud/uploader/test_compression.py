@@ -0,0 +1,200 @@
+import bz2
+import gzip
+import os
+import time
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from arcsecond.cloud.uploader.compression import (
+    Compressor,
+    compress_file,
+    get_sample_ratio,
+    is_compressible,
+)
+from arcsecond.cloud.uploader.walker import walk_folder_and_upload_files
+from tests.cloud.uploader.test_walker import FakeUploader, make_files
+
+COMPRESSIBLE = b"SIMPLE  =                    T" + bytes(200_000)
+
+
+def test_only_uncompressed_data_files_are_compressible():
+    assert is_compressible("/data/image.fits")
+    assert is_compressible("/data/IMAGE.FIT")
+    assert is_compressible("/data/image.xisf")
+    assert not is_compressible("/data/image.fits.gz")
+    assert not is_compressible("/data/notes.txt")
+
+
+@pytest.mark.parametrize("method,module", [("gzip", gzip), ("bz2", bz2)])
+def test_compress_file(tmp_path, method, module):
+    file_path = tmp_path / "image.fits"
+    file_path.write_bytes(COMPRESSIBLE)
+
+    compressed_path = compress_file(str(file_path), method, str(tmp_path))
+
+    assert compressed_path.endswith(
+        "image.fits" + (".gz" if method == "gzip" else ".bz2")
+    )
+    assert os.path.getsize(compressed_path) < len(COMPRESSIBLE) / 10
+    with module.open(compressed_path) as f:
+        assert f.read() == COMPRESSIBLE
+
+
+def test_files_not_shrinking_are_not_compressed(tmp_path):
+    file_path = tmp_path / "noise.fits"
+    file_path.write_bytes(os.urandom(100_000))
+
+    assert get_sample_ratio(file_path) > 0.9
+    assert compress_file(str(file_path), "auto", str(tmp_path)) is None
+    assert compress_file(str(file_path), "gzip", str(tmp_path)) is None
+    assert os.listdir(tmp_path) == ["noise.fits"]
+
+
+def test_auto_compresses_files_that_shrink(tmp_path):
+    file_path = tmp_path / "image.fits"
+    file_path.write_bytes(COMPRESSIBLE)
+
+    assert get_sample_ratio(file_path) < 0.1
+    assert compress_file(str(file_path), "auto", str(tmp_path)).endswith(".gz")
+
+
+def test_compressor_spools_files_in_a_temporary_folder(tmp_path):
+    file_path = tmp_path / "image.fits"
+    file_path.write_bytes(COMPRESSIBLE)
+    other_path = tmp_path / "notes.txt"
+    other_path.write_bytes(COMPRESSIBLE)
+
+    with Compressor("gzip", max_workers=1) as compressor:
+        compressed_path = compressor.submit(file_path).result()
+        assert os.path.dirname(compressed_path) == compressor.directory
+        assert compressor.submit(other_path).result() is None
+
+    assert not os.path.exists(compressor.directory)
+
+
+def test_compressor_rejects_unknown_methods():
+    with pytest.raises(ValueError):
+        Compressor("zstd")
+
+
+class FakeCompressedUploader(FakeUploader):
+    sent = {}
+
+    def use_compressed_file(self, compressed_path):
+        with gzip.open(compressed_path) as f:
+            FakeCompressedUploader.sent[self._file_path.name] = f.read()
+
+
+def test_walk_uploads_compressed_copies(tmp_path):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    for i in range(3):
+        (folder / f"image{i}.fits").write_bytes(COMPRESSIBLE)
+    (folder / "notes.txt").write_bytes(b"notes")
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    FakeCompressedUploader.sent = {}
+
+    uploads = walk_folder_and_upload_files(
+        FakeCompressedUploader, context, str(folder), max_workers=2, compression="gzip"
+    )
+
+    assert uploads.counts["succeeded"] == 4
+    assert sorted(FakeCompressedUploader.sent) == [
+        "image0.fits",
+        "image1.fits",
+        "image2.fits",
+    ]
+    assert all(c == COMPRESSIBLE for c in FakeCompressedUploader.sent.values())
+
+
+class FakeCompressor(object):
+    """Copies files into a spool folder at once, and records them."""
+
+    spool = None
+    submitted = []
+
+    def __init__(self, method, max_workers=None):
+        pass
+
+    def submit(self, file_path):
+        FakeCompressor.submitted.append(file_path.name)
+        compressed_path = FakeCompressor.spool / (file_path.name + ".gz")
+        compressed_path.write_bytes(b"compressed")
+        future = Future()
+        future.set_result(str(compressed_path))
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+@pytest.fixture
+def fake_compressor(tmp_path):
+    FakeCompressor.spool = tmp_path / "spool"
+    FakeCompressor.spool.mkdir()
+    FakeCompressor.submitted = []
+    FakeUploader.uploaded = []
+    with patch("arcsecond.cloud.uploader.walker.Compressor", FakeCompressor):
+        yield FakeCompressor
+
+
+class WaitingUploader(FakeCompressedUploader):
+    """Waits for the compression of all files before the first upload."""
+
+    compressed_first = 0
+
+    def use_compressed_file(self, compressed_path):
+        if not FakeUploader.uploaded:
+            deadline = time.monotonic() + 2
+            while len(FakeCompressor.submitted) < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            WaitingUploader.compressed_first = len(FakeCompressor.submitted)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_files_are_compressed_before_a_worker_is_free(
+    tmp_path, fake_compressor, stream
+):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    make_files(folder, ["a.fits", "b.fits", "c.fits"])
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+
+    uploads = walk_folder_and_upload_files(
+        WaitingUploader, context, str(folder), stream=stream, compression="gzip"
+    )
+
+    assert uploads.counts["succeeded"] == 3
+    assert WaitingUploader.compressed_first == 3
+    assert os.listdir(fake_compressor.spool) == []
+
+
+class SlowUploader(FakeUploader):
+    def use_compressed_file(self, compressed_path):
+        time.sleep(0.3)
+
+
+def test_compressed_copies_of_dropped_files_are_removed(tmp_path, fake_compressor):
+    folder = tmp_path / "data"
+    (folder / "a").mkdir(parents=True)
+    (folder / "b").mkdir()
+    make_files(folder / "a", ["x.fits", "y.fits", "z.fits"])
+    make_files(folder / "b", ["x.fits"])
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+
+    walk_folder_and_upload_files(
+        SlowUploader, context, str(folder), stream=True, compression="gzip"
+    )
+
+    # The walk stops at the duplicate, while the first file is uploaded.
+    assert FakeUploader.uploaded == ["x.fits"]
+    assert len(fake_compressor.submitted) == 3
+    assert os.listdir(fake_compressor.spool) == []
@@ -0,0 +1,101 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from arcsecond.cloud.uploader.concurrency import ConcurrencyController
+from arcsecond.cloud.uploader.walker import walk_folder_and_upload_files
+from tests.cloud.uploader.test_walker import FakeUploader, make_files
+
+MIB = 1024 * 1024
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with patch("arcsecond.cloud.uploader.concurrency.time.monotonic", clock):
+        yield clock
+
+
+def run_round(controller, clock, seconds, throughput, latency=1.0, errors=0):
+    """Complete a round of uploads: `throughput` bytes/s in total, in `seconds`."""
+    count = controller.limit
+    for _ in range(count):
+        assert controller.acquire()
+    clock.now += seconds
+    for index in range(count):
+        if index >= count - errors:
+            controller.release(error=True)
+        else:
+            size = int(throughput * seconds / count)
+            controller.release(size, latency * size / MIB)
+
+
+def test_limit_grows_while_throughput_improves(clock):
+    controller = ConcurrencyController(initial_limit=1, max_limit=4)
+
+    run_round(controller, clock, 10, 1 * MIB)
+    assert controller.limit == 2
+    run_round(controller, clock, 10, 2 * MIB)
+    assert controller.limit == 3
+    run_round(controller, clock, 10, 2.02 * MIB)  # No real gain: kept.
+    assert controller.limit == 3
+    run_round(controller, clock, 10, 3 * MIB)
+    run_round(controller, clock, 10, 4 * MIB)
+    assert controller.limit == 4  # Maximum
+
+
+def test_limit_is_cut_on_errors_and_rising_latency(clock):
+    controller = ConcurrencyController(initial_limit=8, max_limit=16)
+
+    run_round(controller, clock, 10, 8 * MIB, latency=1.0)
+    assert controller.limit == 9
+    run_round(controller, clock, 10, 8 * MIB, latency=2.5)
+    assert controller.limit == 4
+    run_round(controller, clock, 10, 8 * MIB, latency=1.0)
+    assert controller.limit == 5
+    run_round(controller, clock, 10, 8 * MIB, errors=1)
+    assert controller.limit == 2
+    run_round(controller, clock, 10, 8 * MIB, errors=2)
+    run_round(controller, clock, 10, 8 * MIB, errors=1)
+    assert controller.limit == 1  # Minimum
+
+
+def test_acquire_waits_for_a_free_slot():
+    controller = ConcurrencyController(initial_limit=1)
+    stop = threading.Event()
+    assert controller.acquire(stop)
+
+    stop.set()
+    assert not controller.acquire(stop)
+
+    threading.Timer(0.1, controller.release).start()
+    assert controller.acquire()
+    assert controller.active == 1
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_walk_with_adaptive_concurrency(tmp_path, stream):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    make_files(folder, [f"file{i}.fits" for i in range(40)])
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    controller = ConcurrencyController(initial_limit=2, max_limit=6)
+
+    uploads = walk_folder_and_upload_files(
+        FakeUploader, context, str(folder), stream=stream, concurrency=controller
+    )
+
+    assert uploads.counts["succeeded"] == 40
+    # Without measures (the fake uploader has none), the limit only probes upwards.
+    assert 2 < FakeUploader.max_running <= 6
+    assert controller.active == 0
@@ -0,0 +1,109 @@
+import os
+from unittest.mock import patch
+
+from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.cloud.uploader.index import FileIndex
+from arcsecond.errors import ArcsecondError
+
+
+def make_tree(root):
+    for relative_path, content in [
+        ("a.fits", b"12345"),
+        ("night1/b.fits", b"1"),
+        ("night1/a.fits", b"12"),
+        ("night2/deep/c.xisf", b"123"),
+        (".hidden.fits", b"x"),
+        (".git/objects/blob", b"x"),
+        ("night2/.cache/d.fits", b"x"),
+    ]:
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+
+def test_index_collects_regular_files_with_their_stats(tmp_path):
+    make_tree(tmp_path)
+    file_index = FileIndex.build(tmp_path)
+
+    relative_paths = [str(f.path.relative_to(tmp_path)) for f in file_index]
+    assert sorted(relative_paths) == [
+        "a.fits",
+        os.path.join("night1", "a.fits"),
+        os.path.join("night1", "b.fits"),
+        os.path.join("night2", "deep", "c.xisf"),
+    ]
+    assert len(file_index) == 4
+    assert file_index.total_size == 5 + 1 + 2 + 3
+
+    indexed = next(f for f in file_index if f.path == tmp_path / "a.fits")
+    stat = (tmp_path / "a.fits").stat()
+    assert (indexed.size, indexed.mtime, indexed.inode) == (
+        stat.st_size,
+        stat.st_mtime,
+        stat.st_ino,
+    )
+
+
+def test_hidden_folders_are_not_descended_into(tmp_path):
+    make_tree(tmp_path)
+    scanned = []
+    real_scandir = os.scandir
+
+    def scandir(path):
+        scanned.append(os.path.basename(path))
+        return real_scandir(path)
+
+    with patch("arcsecond.cloud.uploader.index.os.scandir", side_effect=scandir):
+        FileIndex.build(tmp_path)
+
+    assert ".git" not in scanned and ".cache" not in scanned
+    assert "deep" in scanned
+
+
+def test_index_reports_duplicate_names(tmp_path):
+    make_tree(tmp_path)
+    assert FileIndex.build(tmp_path).get_duplicate_names() == ["a.fits"]
+
+
+def test_index_of_a_file_covers_its_folder(tmp_path):
+    make_tree(tmp_path)
+    file_index = FileIndex.build(tmp_path / "night1" / "a.fits")
+    assert file_index.root_path == tmp_path / "night1"
+    assert len(file_index) == 2
+
+
+def test_records_are_views_on_compact_arrays(tmp_path):
+    make_tree(tmp_path)
+    file_index = FileIndex.build(tmp_path)
+
+    record = file_index[0]
+    assert not hasattr(record, "__dict__")
+    assert record.path == tmp_path / record.name
+    assert record.size == file_index.sizes[0]
+    assert record.status == (Status.NEW, Substatus.PENDING)
+    # Folders are stored once, whatever their number of files.
+    assert len(file_index._folders) == 3
+
+
+def test_statuses_are_stored_per_file(tmp_path):
+    make_tree(tmp_path)
+    file_index = FileIndex.build(tmp_path)
+    error = ArcsecondError("boom")
+
+    file_index.set_status(1, Status.OK, Substatus.DONE)
+    file_index.set_status(2, Status.ERROR, Substatus.ERROR, error)
+    file_index.set_status(3, Status.OK, Substatus.DONE)
+
+    assert file_index.count_status(Status.OK) == 2
+    assert file_index.count_status(Status.NEW) == 1
+    assert list(file_index.iter_positions(Status.OK)) == [1, 3]
+    assert file_index[2].error is error
+    assert file_index[1].error is None
+
+
+def test_index_of_given_paths(tmp_path):
+    make_tree(tmp_path)
+    paths = [tmp_path / "night1" / "b.fits", tmp_path / "a.fits"]
+    file_index = FileIndex.from_paths(paths)
+    assert file_index.paths == paths
+    assert file_index.total_size == 6
@@ -0,0 +1,90 @@
+import sqlite3
+from unittest.mock import MagicMock
+
+from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.cloud.uploader.journal import UploadJournal, get_upload_journal
+
+
+def make_journal(tmp_path, **kwargs):
+    return UploadJournal(
+        tmp_path / "uploads.sqlite3", "main", None, "dataset:d1", **kwargs
+    )
+
+
+def test_journal_records_and_reads_results(tmp_path):
+    with make_journal(tmp_path) as journal:
+        journal.record("/data/a.fits", 10, 1.5, (Status.OK, Substatus.DONE, None), 42)
+        journal.record("/data/b.fits", 20, 2.5, (Status.ERROR, Substatus.ERROR, "boom"))
+
+        assert journal.get_result("/data/a.fits", 10, 1.5) == (
+            Status.OK,
+            Substatus.DONE,
+        )
+        assert journal.is_completed("/data/a.fits", 10, 1.5)
+        assert not journal.is_completed("/data/b.fits", 20, 2.5)
+        assert journal.get_result("/data/c.fits", 10, 1.5) is None
+
+
+def test_only_uploaded_or_synced_files_are_completed(tmp_path):
+    with make_journal(tmp_path) as journal:
+        journal.record(
+            "/data/a.fits", 10, 1.5, (Status.SKIPPED, Substatus.ALREADY_SYNCED, None)
+        )
+        journal.record(
+            "/data/b.fits",
+            20,
+            2.5,
+            (Status.SKIPPED, Substatus.SKIPPED_NO_DATE_OBS, None),
+        )
+
+        assert journal.is_completed("/data/a.fits", 10, 1.5)
+        assert not journal.is_completed("/data/b.fits", 20, 2.5)
+
+
+def test_journal_keys_include_size_and_mtime(tmp_path):
+    with make_journal(tmp_path) as journal:
+        journal.record("/data/a.fits", 10, 1.5, (Status.OK, Substatus.DONE, None))
+        assert not journal.is_completed("/data/a.fits", 11, 1.5)
+        assert not journal.is_completed("/data/a.fits", 10, 3.0)
+
+
+def test_journal_is_scoped_to_its_target(tmp_path):
+    with make_journal(tmp_path) as journal:
+        journal.record("/data/a.fits", 10, 1.5, (Status.OK, Substatus.DONE, None))
+    other = UploadJournal(tmp_path / "uploads.sqlite3", "main", None, "dataset:d2")
+    with other:
+        assert not other.is_completed("/data/a.fits", 10, 1.5)
+
+
+def test_journal_writes_by_batches_in_wal_mode(tmp_path):
+    journal = make_journal(tmp_path, batch_size=3, flush_interval=3600)
+    path = tmp_path / "uploads.sqlite3"
+
+    def count_rows():
+        with sqlite3.connect(str(path)) as connection:
+            return connection.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+
+    for i in range(2):
+        journal.record(f"/data/{i}.fits", 1, 1.0, (Status.OK, Substatus.DONE, None))
+    assert count_rows() == 0
+    journal.record("/data/2.fits", 1, 1.0, (Status.OK, Substatus.DONE, None))
+    assert count_rows() == 3
+
+    journal.record("/data/3.fits", 1, 1.0, (Status.OK, Substatus.DONE, None))
+    journal.close()
+    assert count_rows() == 4
+    with sqlite3.connect(str(path)) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_journal_survives_reopening(tmp_path):
+    with make_journal(tmp_path) as journal:
+        journal.record("/data/a.fits", 10, 1.5, (Status.OK, Substatus.DONE, None))
+    with make_journal(tmp_path) as journal:
+        assert journal.is_completed("/data/a.fits", 10, 1.5)
+
+
+def test_no_journal_for_contexts_without_target(tmp_path):
+    context = MagicMock()
+    context.journal_target = None
+    assert get_upload_journal(context, tmp_path / "uploads.sqlite3") is None
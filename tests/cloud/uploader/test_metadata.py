@@ -0,0 +1,249 @@
+import gzip
+import struct
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from arcsecond.cloud.uploader import metadata as metadata_module
+from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.cloud.uploader.index import FileIndex
+from arcsecond.cloud.uploader.journal import UploadJournal
+from arcsecond.cloud.uploader.metadata import (
+    MetadataCache,
+    MetadataExtractor,
+    parse_fits_value,
+    read_header,
+)
+from arcsecond.cloud.uploader.walker import walk_folder_and_upload_files
+from tests.cloud.uploader.test_walker import FakeUploader
+
+FIXTURE_PATH = Path(__file__).parent.parent.parent / "fixtures" / "file1.fits"
+
+
+def make_fits(cards, data_size=2880):
+    header = "".join(
+        card.ljust(80) for card in ["SIMPLE  =                    T"] + cards
+    )
+    header += "END".ljust(80)
+    header = header.ljust((len(header) + 2879) // 2880 * 2880)
+    return header.encode("ascii") + bytes(data_size)
+
+
+def make_xisf(xml: str):
+    header = xml.encode("utf-8")
+    return b"XISF0100" + struct.pack("<I", len(header)) + bytes(4) + header
+
+
+FITS_CARDS = [
+    "DATE-OBS= '2024-03-01T21:05:12.5' / UTC start",
+    "OBJECT  = 'M 31''s core'",
+    "FRAME   = 'Light'",
+    "FILTER  = 'Ha      '",
+    "EXPOSURE=                 300. / seconds",
+    "CCD-TEMP=               -10.2D0",
+    "NAXIS   =                    2",
+    "NAXIS1  =                 4096",
+    "COMMENT = 'not kept'",
+]
+
+
+@pytest.mark.parametrize(
+    "raw,value",
+    [
+        ("'Light Frame'         / type", "Light Frame"),
+        ("'it''s'", "it's"),
+        ("''", None),
+        ("                   T", True),
+        ("                   F / flag", False),
+        ("                 -15 / temp", -15),
+        ("              1.5E-3", 0.0015),
+        ("                1.5D2", 150.0),
+        ("", None),
+    ],
+)
+def test_parse_fits_value(raw, value):
+    assert parse_fits_value(raw) == value
+
+
+def test_read_fits_header_keeps_known_keys_with_aliases(tmp_path):
+    file_path = tmp_path / "image.fits"
+    file_path.write_bytes(make_fits(FITS_CARDS))
+
+    assert read_header(file_path) == {
+        "DATE-OBS": "2024-03-01T21:05:12.5",
+        "OBJECT": "M 31's core",
+        "IMAGETYP": "Light",
+        "FILTER": "Ha",
+        "EXPTIME": 300.0,
+        "CCD-TEMP": -10.2,
+        "NAXIS": 2,
+        "NAXIS1": 4096,
+    }
+
+
+def test_read_fits_header_spanning_several_blocks(tmp_path):
+    file_path = tmp_path / "image.fits"
+    cards = [f"HISTORY  step {i}" for i in range(40)] + FITS_CARDS[:1]
+    file_path.write_bytes(make_fits(cards))
+
+    assert read_header(file_path)["DATE-OBS"] == "2024-03-01T21:05:12.5"
+
+
+def test_read_header_of_the_fixture():
+    header = read_header(FIXTURE_PATH)
+    assert header["IMAGETYP"] == "Light Frame"
+    assert header["NAXIS1"] == 752
+    assert header["NAXIS2"] == 582
+    assert "DATE-OBS" not in header
+
+
+def test_read_header_of_compressed_fits(tmp_path):
+    file_path = tmp_path / "image.fits.gz"
+    file_path.write_bytes(gzip.compress(make_fits(FITS_CARDS)))
+
+    assert read_header(file_path)["OBJECT"] == "M 31's core"
+
+
+def test_read_xisf_header(tmp_path):
+    file_path = tmp_path / "image.xisf"
+    file_path.write_bytes(
+        make_xisf(
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<xisf version="1.0" xmlns="http://www.pixinsight.com/xisf">'
+            '<Image geometry="1024:768:1" sampleFormat="UInt16">'
+            '<FITSKeyword name="OBJECT" value="\'NGC 7000\'" comment=""/>'
+            '<FITSKeyword name="EXPTIME" value="120." comment=""/>'
+            '<Property id="Observation:Time:Start" type="TimePoint" value="2024-03-01T21:05:12Z"/>'
+            '<Property id="Instrument:Filter:Name" type="String" value="OIII"/>'
+            "</Image></xisf>"
+        )
+    )
+
+    assert read_header(file_path) == {
+        "NAXIS": 3,
+        "NAXIS1": 1024,
+        "NAXIS2": 768,
+        "NAXIS3": 1,
+        "OBJECT": "NGC 7000",
+        "EXPTIME": 120.0,
+        "DATE-OBS": "2024-03-01T21:05:12Z",
+        "FILTER": "OIII",
+    }
+
+
+def test_read_header_of_other_or_broken_files(tmp_path):
+    (tmp_path / "notes.txt").write_text("SIMPLE  =")
+    (tmp_path / "short.fits").write_bytes(b"SIMPLE  =")
+    (tmp_path / "wrong.fits").write_bytes(bytes(2880))
+    (tmp_path / "broken.xisf").write_bytes(make_xisf("<xisf><Image"))
+
+    for name in ("notes.txt", "short.fits", "wrong.fits", "broken.xisf"):
+        assert read_header(tmp_path / name) == {}
+
+
+def test_cache_is_keyed_by_path_size_and_mtime(tmp_path):
+    with MetadataCache(tmp_path / "metadata.sqlite3") as cache:
+        cache.put("/data/a.fits", 10, 1.5, {"OBJECT": "M 31"})
+        assert cache.get("/data/a.fits", 10, 1.5) == {"OBJECT": "M 31"}
+        assert cache.get("/data/a.fits", 11, 1.5) is None
+        assert cache.get("/data/a.fits", 10, 2.5) is None
+
+    with MetadataCache(tmp_path / "metadata.sqlite3") as cache:
+        assert cache.get("/data/a.fits", 10, 1.5) == {"OBJECT": "M 31"}
+
+
+def test_extractor_reads_headers_once(tmp_path):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    (folder / "a.fits").write_bytes(make_fits(FITS_CARDS))
+    (folder / "b.fits").write_bytes(make_fits(["OBJECT  = 'M 42'"]))
+    (folder / "notes.txt").write_text("notes")
+    file_index = FileIndex.build(folder)
+
+    with MetadataCache(tmp_path / "metadata.sqlite3") as cache:
+        headers = MetadataExtractor(cache).read_index(file_index)
+        names = [file_index.get_name(p) for p in range(len(file_index))]
+        objects = dict(zip(names, headers.column("OBJECT")))
+        assert objects == {"a.fits": "M 31's core", "b.fits": "M 42", "notes.txt": None}
+        assert headers.column("GAIN") == [None, None, None]
+        assert headers.row(names.index("b.fits")) == {"OBJECT": "M 42"}
+
+        with patch.object(metadata_module, "read_headers") as read_headers:
+            again = MetadataExtractor(cache).read_index(file_index)
+        read_headers.assert_called_once_with([])
+        assert again.column("OBJECT") == headers.column("OBJECT")
+
+
+def test_extractor_reads_many_headers_in_a_process_pool(tmp_path):
+    for i in range(metadata_module.PARALLEL_READ_THRESHOLD + 1):
+        (tmp_path / f"image{i}.fits").write_bytes(
+            make_fits([f"OBJECT  = 'field {i}'"], data_size=0)
+        )
+    file_index = FileIndex.build(tmp_path)
+
+    headers = MetadataExtractor(max_workers=2).read_index(file_index)
+
+    for position, value in enumerate(headers.column("OBJECT")):
+        assert value == f"field {file_index.get_name(position)[5:-5]}"
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_walk_skips_data_files_without_date_obs(tmp_path, stream):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    (folder / "dated.fits").write_bytes(make_fits(FITS_CARDS))
+    (folder / "undated.fits").write_bytes(FIXTURE_PATH.read_bytes())
+    (folder / "notes.txt").write_text("notes")
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    FakeUploader.uploaded = []
+
+    uploads = walk_folder_and_upload_files(
+        FakeUploader, context, str(folder), stream=stream, require_date_obs=True
+    )
+
+    assert sorted(FakeUploader.uploaded) == ["dated.fits", "notes.txt"]
+    assert [(Path(path).name, substatus) for path, substatus, _ in uploads.skipped] == [
+        ("undated.fits", Substatus.SKIPPED_NO_DATE_OBS)
+    ]
+    assert uploads.counts["succeeded"] == 2
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_resume_uploads_files_skipped_without_date_obs(tmp_path, stream):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    (folder / "dated.fits").write_bytes(make_fits(FITS_CARDS))
+    (folder / "undated.fits").write_bytes(FIXTURE_PATH.read_bytes())
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    FakeUploader.uploaded = []
+
+    with UploadJournal(tmp_path / "j.sqlite3", "main", None, "dataset:d1") as journal:
+        walk_folder_and_upload_files(
+            FakeUploader,
+            context,
+            str(folder),
+            stream=stream,
+            journal=journal,
+            require_date_obs=True,
+        )
+        undated = FileIndex.build(folder)[1]
+        # Recorded in both modes, but not as completed.
+        assert journal.get_result(undated.path, undated.size, undated.mtime) == (
+            Status.SKIPPED,
+            Substatus.SKIPPED_NO_DATE_OBS,
+        )
+
+        FakeUploader.uploaded = []
+        walk_folder_and_upload_files(
+            FakeUploader,
+            context,
+            str(folder),
+            stream=stream,
+            journal=journal,
+            resume=True,
+        )
+
+    assert FakeUploader.uploaded == ["undated.fits"]
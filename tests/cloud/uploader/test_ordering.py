@@ -0,0 +1,147 @@
+import os
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from arcsecond.cloud.uploader.index import FileIndex
+from arcsecond.cloud.uploader.metadata import HeaderTable
+from arcsecond.cloud.uploader.ordering import (
+    UPLOAD_ORDERS,
+    UploadOrder,
+    get_upload_order,
+)
+from arcsecond.cloud.uploader.walker import walk_folder_and_upload_files
+from tests.cloud.uploader.test_metadata import make_fits
+from tests.cloud.uploader.test_walker import FakeUploader
+
+# name -> (size, mtime)
+FILES = {
+    "a.fits": (30, 1_700_000_200),
+    "b.fits": (10, 1_700_000_300),
+    "c.fits": (20, 1_700_000_100),
+}
+
+
+@pytest.fixture(autouse=True)
+def reset_fake_uploader():
+    FakeUploader.uploaded = []
+
+
+def make_index(tmp_path):
+    for name, (size, mtime) in FILES.items():
+        path = tmp_path / name
+        path.write_bytes(b"x" * size)
+        os.utime(path, (mtime, mtime))
+    return FileIndex.build(tmp_path)
+
+
+def ordered_names(order, file_index, headers=None):
+    positions = order.iter_positions(
+        file_index, range(len(file_index)), headers=headers
+    )
+    return [file_index.get_name(position) for position in positions]
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("newest", ["b.fits", "a.fits", "c.fits"]),
+        ("oldest", ["c.fits", "a.fits", "b.fits"]),
+        ("smallest", ["b.fits", "c.fits", "a.fits"]),
+        ("largest", ["a.fits", "c.fits", "b.fits"]),
+    ],
+)
+def test_orders_by_file_attributes(tmp_path, name, expected):
+    file_index = make_index(tmp_path)
+    assert ordered_names(UPLOAD_ORDERS[name], file_index) == expected
+
+
+def test_orders_by_date_obs_with_files_without_it_last(tmp_path):
+    file_index = make_index(tmp_path)
+    headers = HeaderTable(
+        [
+            {"DATE-OBS": "2024-03-01T21:05:12"},
+            {},
+            {"DATE-OBS": "2024-03-02T01:00:00+00:00"},
+        ]
+    )
+
+    assert ordered_names(UPLOAD_ORDERS["newest-date-obs"], file_index, headers) == [
+        "c.fits",
+        "a.fits",
+        "b.fits",
+    ]
+    assert ordered_names(UPLOAD_ORDERS["oldest-date-obs"], file_index, headers) == [
+        "a.fits",
+        "c.fits",
+        "b.fits",
+    ]
+
+
+def test_custom_order_with_any_key(tmp_path):
+    file_index = make_index(tmp_path)
+    order = UploadOrder(lambda f, header: f.name.replace("b", "z"), reverse=True)
+
+    assert ordered_names(order, file_index) == ["b.fits", "c.fits", "a.fits"]
+    assert str(order) == "in a custom order"
+
+
+def test_get_upload_order():
+    assert get_upload_order(None) is None
+    assert get_upload_order("newest") is UPLOAD_ORDERS["newest"]
+    order = UploadOrder(lambda f, header: f.size)
+    assert get_upload_order(order) is order
+    with pytest.raises(ValueError):
+        get_upload_order("random")
+
+
+def test_walk_uploads_files_in_order(tmp_path):
+    make_index(tmp_path)
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+
+    walk_folder_and_upload_files(FakeUploader, context, str(tmp_path), order="newest")
+
+    assert FakeUploader.uploaded == ["b.fits", "a.fits", "c.fits"]
+
+
+def test_walk_reads_headers_for_date_obs_order(tmp_path):
+    (tmp_path / "first.fits").write_bytes(
+        make_fits(["DATE-OBS= '2024-03-01T21:00:00'"])
+    )
+    (tmp_path / "last.fits").write_bytes(make_fits(["DATE-OBS= '2024-03-02T03:00:00'"]))
+    (tmp_path / "notes.txt").write_text("notes")
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+
+    walk_folder_and_upload_files(
+        FakeUploader, context, str(tmp_path), order="newest-date-obs"
+    )
+
+    assert FakeUploader.uploaded == ["last.fits", "first.fits", "notes.txt"]
+
+
+class SlowFirstUploader(FakeUploader):
+    """Lets the other files queue up during the first upload."""
+
+    def upload_file(self, **kwargs):
+        if not FakeUploader.uploaded:
+            time.sleep(0.3)
+        return super().upload_file(**kwargs)
+
+
+def test_streamed_files_jump_the_line(tmp_path):
+    for size in [10, 50, 20, 40, 30]:
+        (tmp_path / f"{size}.fits").write_bytes(b"x" * size)
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+
+    walk_folder_and_upload_files(
+        SlowFirstUploader, context, str(tmp_path), stream=True, order="largest"
+    )
+
+    # The files found during the first upload are taken by size.
+    waiting = FakeUploader.uploaded[1:]
+    assert len(waiting) == 4
+    assert waiting == sorted(waiting, key=lambda name: -int(name.split(".")[0]))
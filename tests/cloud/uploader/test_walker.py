@@ -0,0 +1,236 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.cloud.uploader.errors import UploadRemoteFileError
+from arcsecond.cloud.uploader.index import FileIndex
+from arcsecond.cloud.uploader.journal import UploadJournal
+from arcsecond.cloud.uploader.walker import (
+    _walk_second_pass,
+    walk_folder_and_upload_files,
+)
+from arcsecond.errors import ArcsecondError
+
+
+class FakeUploader:
+    """Records concurrency instead of talking to the API."""
+
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+    uploaded = []
+
+    def __init__(self, context, file_path, display_progress=False):
+        self._file_path = file_path
+
+    def upload_file(self, **kwargs):
+        with FakeUploader.lock:
+            FakeUploader.uploaded.append(self._file_path.name)
+            FakeUploader.running += 1
+            FakeUploader.max_running = max(
+                FakeUploader.max_running, FakeUploader.running
+            )
+        time.sleep(0.02)
+        with FakeUploader.lock:
+            FakeUploader.running -= 1
+        if self._file_path.name.startswith("bad"):
+            raise UploadRemoteFileError("500 - boom")
+        if self._file_path.name.startswith("dup"):
+            return [Status.SKIPPED, Substatus.ALREADY_SYNCED, None]
+        return [Status.OK, Substatus.DONE, None]
+
+
+@pytest.fixture(autouse=True)
+def reset_fake_uploader():
+    FakeUploader.running = 0
+    FakeUploader.max_running = 0
+    FakeUploader.uploaded = []
+
+
+def make_files(tmp_path, names):
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(b"data")
+        paths.append(path)
+    return paths
+
+
+def test_second_pass_runs_workers_in_parallel(tmp_path):
+    make_files(tmp_path, [f"file{i}.fits" for i in range(8)])
+    uploads = _walk_second_pass(
+        FakeUploader, MagicMock(), tmp_path, FileIndex.build(tmp_path), max_workers=4
+    )
+    assert len(uploads["succeeded"]) == 8
+    assert FakeUploader.max_running > 1
+
+
+def test_second_pass_merges_results_of_all_workers(tmp_path):
+    make_files(tmp_path, ["ok.fits", "dup.fits", "bad.fits"])
+    uploads = _walk_second_pass(
+        FakeUploader, MagicMock(), tmp_path, FileIndex.build(tmp_path), max_workers=3
+    )
+    assert uploads["succeeded"] == [str(tmp_path / "ok.fits")]
+    assert uploads["skipped"] == [
+        (str(tmp_path / "dup.fits"), Substatus.ALREADY_SYNCED, None)
+    ]
+    assert len(uploads["failed"]) == 1
+    path, substatus, error = uploads["failed"][0]
+    assert path == str(tmp_path / "bad.fits")
+    assert substatus == Substatus.ERROR
+    assert "boom" in str(error)
+    assert uploads.counts == {"succeeded": 1, "skipped": 1, "failed": 1}
+
+
+def test_second_pass_only_uploads_pending_files(tmp_path):
+    make_files(tmp_path, [f"file{i}.fits" for i in range(5)])
+    file_index = FileIndex.build(tmp_path)
+    file_index.set_status(2, Status.SKIPPED, Substatus.ALREADY_SYNCED)
+    _walk_second_pass(FakeUploader, MagicMock(), tmp_path, file_index, max_workers=2)
+    assert sorted(FakeUploader.uploaded) == [
+        "file0.fits",
+        "file1.fits",
+        "file3.fits",
+        "file4.fits",
+    ]
+
+
+def test_walk_rejects_invalid_worker_count(tmp_path):
+    with pytest.raises(ValueError):
+        walk_folder_and_upload_files(
+            FakeUploader, MagicMock(), str(tmp_path), max_workers=0
+        )
+
+
+def test_walk_does_not_upload_files_known_to_be_synced(tmp_path):
+    make_files(tmp_path, ["ok.fits", "dup.fits", "remote.fits"])
+    context = MagicMock()
+    context.is_already_synced.side_effect = lambda path: path.name == "remote.fits"
+    uploads = walk_folder_and_upload_files(FakeUploader, context, str(tmp_path))
+
+    context.fetch_remote_manifest.assert_called_once()
+    assert sorted(FakeUploader.uploaded) == ["dup.fits", "ok.fits"]
+    assert (
+        str(tmp_path / "remote.fits"),
+        Substatus.ALREADY_SYNCED,
+        None,
+    ) in uploads["skipped"]
+
+
+def test_walk_goes_on_when_the_manifest_is_unavailable(tmp_path):
+    make_files(tmp_path, ["ok.fits"])
+    context = MagicMock()
+    context.fetch_remote_manifest.side_effect = ArcsecondError("down")
+    walk_folder_and_upload_files(FakeUploader, context, str(tmp_path))
+
+    assert FakeUploader.uploaded == ["ok.fits"]
+    context.is_already_synced.assert_not_called()
+
+
+def test_walk_reuses_a_prebuilt_file_index(tmp_path):
+    make_files(tmp_path, ["a.fits", "b.fits"])
+    file_index = FileIndex.build(tmp_path)
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    with patch("arcsecond.cloud.uploader.walker.FileIndex.build") as build:
+        uploads = walk_folder_and_upload_files(
+            FakeUploader, context, str(tmp_path), file_index=file_index
+        )
+
+    build.assert_not_called()
+    assert uploads.file_index is file_index
+    assert sorted(FakeUploader.uploaded) == ["a.fits", "b.fits"]
+
+
+def test_stream_uploads_files_while_walking(tmp_path):
+    make_files(tmp_path, [f"file{i}.fits" for i in range(6)])
+    (tmp_path / "sub").mkdir()
+    make_files(tmp_path / "sub", ["other.fits", ".hidden.fits"])
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    uploads = walk_folder_and_upload_files(
+        FakeUploader, context, str(tmp_path), max_workers=3, stream=True
+    )
+
+    assert len(FakeUploader.uploaded) == 7
+    assert uploads.counts == {"succeeded": 7, "skipped": 0, "failed": 0}
+    assert len(uploads.file_index) == 7
+
+
+def test_stream_skips_files_known_to_be_synced(tmp_path):
+    make_files(tmp_path, ["ok.fits", "remote.fits", "bad.fits"])
+    context = MagicMock()
+    context.is_already_synced.side_effect = lambda path: path.name == "remote.fits"
+    uploads = walk_folder_and_upload_files(
+        FakeUploader, context, str(tmp_path), max_workers=2, stream=True
+    )
+
+    context.fetch_remote_manifest.assert_called_once()
+    assert sorted(FakeUploader.uploaded) == ["bad.fits", "ok.fits"]
+    assert uploads.counts == {"succeeded": 1, "skipped": 1, "failed": 1}
+
+
+def test_stream_stops_on_duplicate_names(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    make_files(tmp_path / "a", ["same.fits"])
+    make_files(tmp_path / "b", ["same.fits", "zzz.fits"])
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    uploads = walk_folder_and_upload_files(
+        FakeUploader, context, str(tmp_path), stream=True
+    )
+
+    # The walk stops at the duplicate, so the files after it are never queued.
+    assert "zzz.fits" not in FakeUploader.uploaded
+    assert uploads.file_index.count_status(Status.NEW) >= 1
+
+
+def test_resume_skips_completed_files_without_requests(tmp_path):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    make_files(folder, ["done.fits", "failed.fits", "new.fits"])
+    journal = UploadJournal(tmp_path / "j.sqlite3", "main", None, "dataset:d1")
+    for indexed_file in FileIndex.build(folder):
+        if indexed_file.name == "new.fits":
+            continue
+        status = Status.OK if indexed_file.name == "done.fits" else Status.ERROR
+        journal.record(
+            indexed_file.path,
+            indexed_file.size,
+            indexed_file.mtime,
+            (status, Substatus.DONE, None),
+        )
+
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    uploads = walk_folder_and_upload_files(
+        FakeUploader, context, str(folder), journal=journal, resume=True
+    )
+    journal.close()
+
+    assert sorted(FakeUploader.uploaded) == ["failed.fits", "new.fits"]
+    assert uploads.counts == {"succeeded": 2, "skipped": 1, "failed": 0}
+    checked = [call.args[0].name for call in context.is_already_synced.mock_calls]
+    assert "done.fits" not in checked
+
+
+def test_walk_records_results_in_the_journal(tmp_path):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    make_files(folder, ["ok.fits", "bad.fits"])
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    with UploadJournal(tmp_path / "j.sqlite3", "main", None, "dataset:d1") as journal:
+        walk_folder_and_upload_files(
+            FakeUploader, context, str(folder), journal=journal
+        )
+        bad, ok = FileIndex.build(folder)
+        assert journal.is_completed(ok.path, ok.size, ok.mtime)
+        assert journal.get_result(bad.path, bad.size, bad.mtime) == (
+            Status.ERROR,
+            Substatus.ERROR,
+        )
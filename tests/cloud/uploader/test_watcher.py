@@ -0,0 +1,173 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from arcsecond.cloud.uploader.constants import Status, Substatus
+from arcsecond.cloud.uploader.walker import walk_folder_and_upload_files
+from arcsecond.cloud.uploader.watcher import (
+    InotifyWatcher,
+    PollingWatcher,
+    get_watcher,
+)
+from tests.cloud.uploader.test_walker import FakeUploader
+
+SETTLE_TIME = 0.1
+
+
+def make_inotify_watcher(root_path):
+    try:
+        return InotifyWatcher(root_path, settle_time=SETTLE_TIME)
+    except OSError as error:
+        pytest.skip(f"inotify unavailable: {error}")
+
+
+def make_polling_watcher(root_path):
+    return PollingWatcher(root_path, settle_time=SETTLE_TIME, poll_interval=0.05)
+
+
+def collect(watcher, duration=0.6):
+    with watcher:
+        return sorted(
+            p.relative_to(watcher.root_path).as_posix()
+            for p in watcher.watch(threading.Event(), duration)
+        )
+
+
+def write_later(path, content=b"data", delay=0.1):
+    def _write():
+        time.sleep(delay)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+    thread = threading.Thread(target=_write)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("make_watcher", [make_inotify_watcher, make_polling_watcher])
+def test_watcher_reports_new_files_once_written(tmp_path, make_watcher):
+    (tmp_path / "old.fits").write_bytes(b"old")
+    (tmp_path / "night").mkdir()
+    watcher = make_watcher(tmp_path)
+    threads = [
+        write_later(tmp_path / "new.fits"),
+        write_later(tmp_path / "night" / "frame.fits"),
+        write_later(tmp_path / "night" / "flats" / "flat.fits"),
+        write_later(tmp_path / ".hidden" / "frame.fits"),
+        write_later(tmp_path / ".partial.fits"),
+    ]
+
+    files = collect(watcher)
+    for thread in threads:
+        thread.join()
+
+    assert files == ["new.fits", "night/flats/flat.fits", "night/frame.fits"]
+
+
+def test_watcher_waits_for_files_to_settle(tmp_path):
+    watcher = make_polling_watcher(tmp_path)
+    path = tmp_path / "frame.fits"
+
+    def _write_slowly():
+        with open(path, "wb") as f:
+            for _ in range(4):
+                f.write(b"data")
+                f.flush()
+                time.sleep(0.04)
+
+    thread = threading.Thread(target=_write_slowly)
+    thread.start()
+    files = collect(watcher, duration=0.8)
+    thread.join()
+
+    assert files == ["frame.fits"]
+
+
+def test_watcher_stops_when_asked(tmp_path):
+    watcher = make_polling_watcher(tmp_path)
+    stop = threading.Event()
+    stop.set()
+
+    assert list(watcher.watch(stop)) == []
+
+
+def test_get_watcher_falls_back_to_polling(tmp_path):
+    with patch(
+        "arcsecond.cloud.uploader.watcher.InotifyWatcher",
+        side_effect=OSError("inotify watch limit reached"),
+    ):
+        watcher = get_watcher(tmp_path)
+    assert isinstance(watcher, PollingWatcher)
+
+
+def test_walk_uploads_new_files_while_watching(tmp_path):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    (folder / "old.fits").write_bytes(b"old")
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    FakeUploader.uploaded = []
+    threads = [
+        write_later(folder / "new.fits"),
+        write_later(folder / "other" / "old.fits", delay=0.2),
+    ]
+
+    with patch(
+        "arcsecond.cloud.uploader.walker.get_watcher",
+        side_effect=make_polling_watcher,
+    ):
+        uploads = walk_folder_and_upload_files(
+            FakeUploader, context, str(folder), watch=True, watch_duration=0.8
+        )
+    for thread in threads:
+        thread.join()
+
+    # The second old.fits has a duplicate name: it is not uploaded.
+    assert sorted(FakeUploader.uploaded) == ["new.fits", "old.fits"]
+    assert uploads.counts["succeeded"] == 2
+
+
+class SizeRecordingUploader(object):
+    sizes = {}
+
+    def __init__(self, context, file_path, display_progress=False):
+        self._file_path = file_path
+
+    def upload_file(self, **kwargs):
+        SizeRecordingUploader.sizes[self._file_path.name] = (
+            self._file_path.stat().st_size
+        )
+        return [Status.OK, Substatus.DONE, None]
+
+
+def test_walk_waits_for_files_being_written_when_the_watch_starts(tmp_path):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    path = folder / "frame.fits"
+    path.write_bytes(b"data")
+    context = MagicMock()
+    context.is_already_synced.return_value = False
+    SizeRecordingUploader.sizes = {}
+
+    def _write_slowly():
+        with open(path, "ab") as f:
+            for _ in range(8):
+                time.sleep(0.04)
+                f.write(b"data")
+                f.flush()
+
+    thread = threading.Thread(target=_write_slowly)
+    thread.start()
+    with patch(
+        "arcsecond.cloud.uploader.walker.get_watcher",
+        side_effect=make_polling_watcher,
+    ):
+        uploads = walk_folder_and_upload_files(
+            SizeRecordingUploader, context, str(folder), watch=True, watch_duration=1.0
+        )
+    thread.join()
+
+    assert SizeRecordingUploader.sizes == {"frame.fits": 36}
+    assert uploads.counts["succeeded"] == 1
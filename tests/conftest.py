@@ -3,10 +3,19 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from arcsecond import DatasetFileUploader
+from arcsecond.api.retry import reset_circuit_breakers
 from arcsecond.cloud.uploader import DatasetUploadContext
 from tests.utils import random_string
 
 
+@pytest.fixture(autouse=True)
+def circuit_breakers():
+    """Do not let failures of a test open the circuit of the next ones."""
+    reset_circuit_breakers()
+    yield
+    reset_circuit_breakers()
+
+
 @pytest.fixture
 def mock_config():
     """Create a mock ArcsecondConfig."""
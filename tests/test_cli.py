@@ -1,8 +1,12 @@
 import re
+import uuid
+from unittest.mock import patch
 
+import pytest
 from click.testing import CliRunner
 
 from arcsecond import cli
+from arcsecond.cloud.uploader import DatasetUploadContext
 from tests.utils import random_string
 
 
@@ -70,3 +74,39 @@ def test_cli_login_upload_key():
     runner = CliRunner()
     result = runner.invoke(cli.login, input="steve\nupload\n123")
     assert result.exit_code == 0 and not result.exception
+
+
+@pytest.mark.parametrize(
+    "option, content",
+    [("--rules", "[filters]\nHa = Ha\n"), ("--bandwidth-file", "fast\n")],
+)
+def test_cli_upload_data_checks_local_files_before_any_request(
+    tmp_path, option, content
+):
+    path = tmp_path / "options.ini"
+    path.write_text(content)
+    runner = CliRunner()
+    with patch.object(DatasetUploadContext, "validate") as validate:
+        result = runner.invoke(
+            cli.upload_data,
+            [str(tmp_path), "-d", "night", "-t", str(uuid.uuid4()), option, str(path)],
+        )
+    assert result.exit_code != 0 and result.exception
+    validate.assert_not_called()
+
+
+def test_cli_upload_data_rejects_resume_without_journal(tmp_path):
+    runner = CliRunner()
+    with (
+        patch.object(DatasetUploadContext, "validate"),
+        patch("arcsecond.cloud.uploads.get_upload_journal", return_value=None),
+        patch("arcsecond.cloud.uploads.walk_folder_and_upload_files") as walk,
+    ):
+        result = runner.invoke(
+            cli.upload_data,
+            [str(tmp_path), "-d", "night", "-t", str(uuid.uuid4()), "--resume"],
+            input="\n",
+        )
+    assert result.exit_code == 2
+    assert "--resume needs the local upload journal" in result.output
+    walk.assert_not_called()